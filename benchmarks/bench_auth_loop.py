@@ -0,0 +1,138 @@
+"""Compare /auth throughput and latency under each event loop.
+
+Starts `python -m lmgate` once per event loop (server.event_loop) on a
+temporary allow-list, drives GET /auth with a fixed concurrency and reports
+requests/s and p50/p99 latency.
+
+Usage:
+    python benchmarks/bench_auth_loop.py [--requests N] [--concurrency C]
+        [--loops asyncio,uvloop] [--json results.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import aiohttp
+
+ROOT = Path(__file__).resolve().parent.parent
+API_KEY = "sk-bench-key-000001"
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+
+def _start_server(loop_name: str, port: int, workdir: Path) -> subprocess.Popen:
+    allowlist = workdir / "allowlist.csv"
+    allowlist.write_text(f"id,api_key,owner,added\n1,{API_KEY},bench,2026-01-01\n")
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "LMGATE_SERVER__PORT": str(port),
+        "LMGATE_SERVER__EVENT_LOOP": loop_name,
+        "LMGATE_AUTH__ALLOWLIST_PATH": str(allowlist),
+        "LMGATE_STATS__OUTPUT_PATH": str(workdir / "stats.jsonl"),
+        # Keep access logging out of the measurement
+        "LMGATE_LOGGING__LEVEL": "WARNING",
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "lmgate"],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"lmgate ({loop_name}) did not become healthy")
+
+
+async def _drive(port: int, requests: int, concurrency: int) -> list[float]:
+    url = f"http://127.0.0.1:{port}/auth"
+    headers = {"Authorization": f"Bearer {API_KEY}"}
+    latencies: list[float] = []
+    remaining = requests
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            async with session.get(url, headers=headers) as resp:
+                await resp.read()
+                if resp.status != 200:
+                    raise RuntimeError(f"/auth returned {resp.status}")
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return latencies
+
+
+def run_one(loop_name: str, port: int, requests: int, concurrency: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="lmgate-bench-") as tmp:
+        proc = _start_server(loop_name, port, Path(tmp))
+        try:
+            asyncio.run(_drive(port, min(1000, requests), concurrency))  # warm-up
+            start = time.perf_counter()
+            latencies = asyncio.run(_drive(port, requests, concurrency))
+            elapsed = time.perf_counter() - start
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+    latencies.sort()
+    return {
+        "event_loop": loop_name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--loops", default="asyncio,uvloop")
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--json", type=Path, help="write results to this file")
+    args = parser.parse_args()
+
+    results = [
+        run_one(name, args.port, args.requests, args.concurrency)
+        for name in args.loops.split(",")
+    ]
+
+    print(f"{'loop':<10} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for r in results:
+        print(
+            f"{r['event_loop']:<10} {r['requests_per_second']:>10} "
+            f"{r['p50_ms']:>10} {r['p99_ms']:>10}"
+        )
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""Microbenchmarks for provider parsing on the /stats ingest path.
+
+Times detect_provider, extract_tokens, extract_model and build_stats_entry
+over a generated corpus: JSON and SSE response bodies for each provider,
+1 KB to 2 MB, with short streams (few large events) and long streams (many
+small events). Results are compared against a stored JSON baseline; the
+run fails if a case is slower than the baseline by more than the tolerance
+or if its parsed result changed.
+
+Baselines are machine-specific. Save one on the machine you compare on,
+e.g. from the main branch before a change:
+
+    python benchmarks/bench_providers.py --save-baseline
+    # ... change lmgate/providers.py ...
+    python benchmarks/bench_providers.py
+
+Usage:
+    python benchmarks/bench_providers.py [--baseline PATH] [--save-baseline]
+        [--tolerance 0.25] [--filter extract_tokens/openai] [--json out.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+from collections.abc import Callable, Iterator, Mapping
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from lmgate.providers import (  # noqa: E402
+    detect_provider,
+    extract_model,
+    extract_tokens,
+)
+from lmgate.stats import build_stats_entry  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "providers.json"
+
+SIZES = {"1KB": 1024, "16KB": 16 * 1024, "256KB": 256 * 1024, "2MB": 2 * 1024 * 1024}
+FORMATS = ("json", "sse-short", "sse-long")
+HOSTS = {
+    "openai": "api.openai.com",
+    "anthropic": "api.anthropic.com",
+    "google": "aiplatform.googleapis.com",
+}
+# Text per SSE event: short streams carry large deltas, long streams carry
+# roughly one token per event like real provider streams.
+_EVENT_TEXT = {"sse-short": 16 * 1024, "sse-long": 4}
+
+
+def _json_body(provider: str, text: str) -> dict[str, Any]:
+    if provider == "openai":
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "model": "gpt-4o",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": 100,
+                "completion_tokens": 200,
+                "total_tokens": 300,
+            },
+        }
+    if provider == "anthropic":
+        return {
+            "id": "msg_bench",
+            "type": "message",
+            "role": "assistant",
+            "model": "claude-sonnet-4-5-20250929",
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": 100, "output_tokens": 200},
+        }
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}],
+        "usageMetadata": {
+            "promptTokenCount": 100,
+            "candidatesTokenCount": 200,
+            "totalTokenCount": 300,
+        },
+        "modelVersion": "gemini-2.0-flash",
+    }
+
+
+def _delta_event(provider: str, text: str) -> dict[str, Any]:
+    if provider == "openai":
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "model": "gpt-4o",
+            "choices": [{"index": 0, "delta": {"content": text}}],
+        }
+    if provider == "anthropic":
+        return {
+            "type": "content_block_delta",
+            "index": 0,
+            "delta": {"type": "text_delta", "text": text},
+        }
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}],
+        "modelVersion": "gemini-2.0-flash",
+    }
+
+
+def _final_events(provider: str) -> list[str]:
+    if provider == "openai":
+        usage = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "model": "gpt-4o",
+            "choices": [],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 200},
+        }
+        return [json.dumps(usage), "[DONE]"]
+    if provider == "anthropic":
+        delta = {
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn"},
+            "usage": {"input_tokens": 100, "output_tokens": 200},
+        }
+        return [json.dumps(delta), json.dumps({"type": "message_stop"})]
+    final = {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": "."}]}}],
+        "usageMetadata": {"promptTokenCount": 100, "candidatesTokenCount": 200},
+        "modelVersion": "gemini-2.0-flash",
+    }
+    return [json.dumps(final)]
+
+
+def make_body(provider: str, fmt: str, size: int) -> str:
+    """Response body of roughly ``size`` bytes."""
+    if fmt == "json":
+        overhead = len(json.dumps(_json_body(provider, "")))
+        return json.dumps(_json_body(provider, "x" * max(0, size - overhead)))
+    chunk = "x" * _EVENT_TEXT[fmt]
+    event = f"data: {json.dumps(_delta_event(provider, chunk))}\n\n"
+    tail = "".join(f"data: {e}\n\n" for e in _final_events(provider))
+    count = max(1, (size - len(tail)) // len(event))
+    return event * count + tail
+
+
+def cases() -> Iterator[tuple[str, Callable[[], Any]]]:
+    """(name, zero-argument callable) for every benchmark case."""
+    hosts = [*HOSTS.values(), "unknown.example.com", ""]
+    yield "detect_provider", lambda: [detect_provider(h) for h in hosts]
+    for provider, host in HOSTS.items():
+        for fmt in FORMATS:
+            for label, size in SIZES.items():
+                body = make_body(provider, fmt, size)
+                payload = {
+                    "timestamp": "2026-03-01T10:00:00.000Z",
+                    "uri": f"/{provider}/v1/bench",
+                    "host": host,
+                    "status": 200,
+                    "auth_key_header": "Bearer sk-bench-key-000001",
+                    "lmgate_internal_id": "1",
+                    "upstream_response_time": "1.250",
+                    "request_time": "1.260",
+                    "response_body": body,
+                }
+                key = f"{provider}/{fmt}/{label}"
+                yield (
+                    f"extract_tokens/{key}",
+                    lambda p=provider, b=body: extract_tokens(p, b),
+                )
+                yield f"extract_model/{key}", lambda b=body: extract_model(b)
+                yield (
+                    f"build_stats_entry/{key}",
+                    lambda p=payload: build_stats_entry(p),
+                )
+
+
+# Fields of a stats entry that come from parsing the response; the rest
+# (timings, key masking, new fields) would change the digest without any
+# change to parsing.
+_PARSED_FIELDS = ("provider", "model", "input_tokens", "output_tokens")
+
+
+def _result_digest(result: Any) -> str:
+    """Stable summary of a case result, used to detect behaviour changes."""
+    if isinstance(result, Mapping):
+        result = {k: result.get(k) for k in _PARSED_FIELDS}
+    return json.dumps(result, sort_keys=True, default=str)
+
+
+def measure(fn: Callable[[], Any], repeat: int, min_time: float) -> float:
+    """Best seconds per call over ``repeat`` timed batches (GC off, as timeit)."""
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _measure(fn, repeat, min_time)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _measure(fn: Callable[[], Any], repeat: int, min_time: float) -> float:
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def run(name_filter: str, repeat: int, min_time: float) -> dict[str, dict[str, Any]]:
+    results = {}
+    for name, fn in cases():
+        if name_filter not in name:
+            continue
+        results[name] = {
+            "seconds": measure(fn, repeat, min_time),
+            "result": _result_digest(fn()),
+        }
+    return results
+
+
+def _machine() -> dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+    }
+
+
+def compare(
+    results: dict[str, dict[str, Any]], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Print a comparison table; return the names of failing cases."""
+    failures = []
+    ratios = []
+    base_cases = baseline["cases"]
+    print(f"{'case':<44} {'us/op':>11} {'base us':>11} {'ratio':>7}")
+    for name, r in results.items():
+        base = base_cases.get(name)
+        us = r["seconds"] * 1e6
+        if base is None:
+            print(f"{name:<44} {us:>11.2f} {'-':>11} {'new':>7}")
+            continue
+        ratio = r["seconds"] / base["seconds"]
+        ratios.append(ratio)
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  SLOWER"
+        if r["result"] != base["result"]:
+            flag += "  RESULT CHANGED"
+        if flag:
+            failures.append(name)
+        print(
+            f"{name:<44} {us:>11.2f} {base['seconds'] * 1e6:>11.2f} {ratio:>7.2f}{flag}"
+        )
+    if ratios:
+        print(f"\ngeometric mean ratio: {statistics.geometric_mean(ratios):.3f}")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="write results as the baseline"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed slowdown over the baseline (0.25 = 25%%)",
+    )
+    parser.add_argument("--filter", default="", help="only cases containing this")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument(
+        "--min-time", type=float, default=0.05, help="seconds per timed batch"
+    )
+    parser.add_argument("--json", type=Path, help="write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.filter, args.repeat, args.min_time)
+    document = {"machine": _machine(), "cases": results}
+    if args.json:
+        args.json.write_text(json.dumps(document, indent=2) + "\n")
+
+    if args.save_baseline:
+        if args.baseline.exists() and args.filter:
+            # Merge a partial run into the existing baseline.
+            existing = json.loads(args.baseline.read_text())
+            document["cases"] = {**existing["cases"], **results}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(document, indent=2) + "\n")
+        print(f"Saved {len(results)} cases to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+        return 1
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("machine") != document["machine"]:
+        print(
+            f"warning: baseline recorded on {baseline.get('machine')}, "
+            f"running on {document['machine']}; timings may not be comparable"
+        )
+    failures = compare(results, baseline, args.tolerance)
+    if failures:
+        print(f"{len(failures)} case(s) regressed: {', '.join(failures)}")
+        return 1
+    print(f"All {len(results)} cases within {args.tolerance:.0%} of baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
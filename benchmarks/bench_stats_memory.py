@@ -0,0 +1,158 @@
+"""Memory held by pending stats entries: StatsRecord and plain dicts.
+
+Fills a StatsWriter buffer with N entries (default 100k) built from
+realistic /stats payloads, as happens under burst load with a long flush
+interval, and reports the memory retained by the buffer (tracemalloc) and
+the time to flush it to disk. Build times include tracemalloc overhead and
+are only comparable between modes. Payloads are decoded from JSON per request,
+like the real handler, so field strings are fresh objects unless
+interned.
+
+Modes:
+    record  build_stats_entry() as shipped (slotted StatsRecord, interned
+            low-cardinality fields, encoded straight to bytes)
+    dict    the previous representation: one dict per entry with its own
+            string objects
+
+Usage:
+    python benchmarks/bench_stats_memory.py [--records 100000] [--json out.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from lmgate.stats import StatsWriter, build_stats_entry  # noqa: E402
+
+MODES = ("record", "dict")
+_MODELS = {
+    "api.openai.com": ("gpt-4o", "gpt-4o-mini", "o3-mini"),
+    "api.anthropic.com": ("claude-sonnet-4-5", "claude-haiku-4-5"),
+    "aiplatform.googleapis.com": ("gemini-2.5-pro", "gemini-2.5-flash"),
+}
+_URIS = {
+    "api.openai.com": "/v1/chat/completions",
+    "api.anthropic.com": "/v1/messages",
+    "aiplatform.googleapis.com": "/v1/projects/p/locations/us/publishers/google/"
+    "models/{model}:generateContent",
+}
+
+
+def payloads(count: int, seed: int = 1) -> list[bytes]:
+    """Serialized /stats payloads: 50 keys, three providers, unique times."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(count):
+        host = rng.choice(list(_MODELS))
+        model = rng.choice(_MODELS[host])
+        key = f"sk-bench-{rng.randrange(50):04d}-key"
+        body = {
+            "model": model,
+            "usage": {
+                "prompt_tokens": rng.randrange(10, 4000),
+                "completion_tokens": rng.randrange(1, 2000),
+            },
+        }
+        payload = {
+            "timestamp": f"2026-03-01T10:{i // 60000 % 60:02d}:{i // 1000 % 60:02d}."
+            f"{i % 1000:03d}Z",
+            "host": host,
+            "uri": _URIS[host].format(model=model),
+            "status": 200 if rng.random() > 0.02 else 500,
+            "lmgate_internal_id": str(rng.randrange(50)),
+            "auth_key_header": f"Bearer {key}",
+            "upstream_connect_time": "0.001",
+            "upstream_header_time": f"{rng.uniform(0.1, 2):.3f}",
+            "upstream_response_time": f"{rng.uniform(0.2, 20):.3f}",
+            "request_time": f"{rng.uniform(0.2, 20):.3f}",
+            "response_bytes": rng.randrange(200, 20000),
+            "content_type": "application/json",
+            "response_body": json.dumps(body),
+        }
+        out.append(json.dumps(payload).encode())
+    return out
+
+
+def _fresh(value: Any) -> Any:
+    # A new string object, as each request's own parse would produce.
+    return value.encode().decode() if isinstance(value, str) else value
+
+
+def _as_dict(payload: dict[str, Any]) -> dict[str, Any]:
+    return {k: _fresh(v) for k, v in build_stats_entry(payload).items()}
+
+
+def run(mode: str, raw_payloads: list[bytes], out_dir: Path) -> dict[str, Any]:
+    build = _as_dict if mode == "dict" else build_stats_entry
+    loads = json.loads
+    writer = StatsWriter(str(out_dir / f"{mode}.jsonl"))
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for raw in raw_payloads:
+        writer.write(build(loads(raw)))
+    build_seconds = time.perf_counter() - start
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    writer.close()
+    flush_seconds = time.perf_counter() - start
+    size = (out_dir / f"{mode}.jsonl").stat().st_size
+    return {
+        "mode": mode,
+        "records": len(raw_payloads),
+        "retained_bytes": retained,
+        "bytes_per_record": retained / len(raw_payloads),
+        "peak_bytes": peak,
+        "build_seconds": build_seconds,
+        "flush_seconds": flush_seconds,
+        "file_bytes": size,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--mode", choices=MODES, action="append")
+    parser.add_argument("--json", type=Path, help="also write results here")
+    args = parser.parse_args()
+
+    raw = payloads(args.records)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.mode or MODES:
+            results.append(run(mode, raw, Path(tmp)))
+        sizes = {r["file_bytes"] for r in results}
+
+    print(
+        f"{'mode':8} {'retained MB':>12} {'B/record':>9} {'peak MB':>8} "
+        f"{'build s':>8} {'flush s':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['mode']:8} {r['retained_bytes'] / 1e6:12.1f} "
+            f"{r['bytes_per_record']:9.0f} {r['peak_bytes'] / 1e6:8.1f} "
+            f"{r['build_seconds']:8.2f} {r['flush_seconds']:8.2f}"
+        )
+    if len(sizes) > 1:
+        print("warning: modes wrote different file sizes", file=sys.stderr)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
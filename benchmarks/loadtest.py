@@ -0,0 +1,320 @@
+"""Load test the nginx + lmgate stack against the streaming mock upstream.
+
+Drives a weighted mix of provider scenarios through the gateway and, for
+the baseline, directly against the mock upstream with the same concurrency.
+Reports throughput, p50/p99 latency per scenario for both paths (the
+difference is the gateway-added latency) and stats completeness: the
+number of lines the run added to the stats file versus the number of
+proxied gateway requests.
+
+Expects the load test stack to be running (scripts/run-load-tests.sh starts
+it and calls this script).
+
+Usage:
+    python benchmarks/loadtest.py [--requests N] [--concurrency C]
+        [--mix openai=4,anthropic-stream=2,...] [--stats-path PATH]
+        [--json results.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import aiohttp
+
+API_KEY = "sk-test-valid-key-123456"
+GOOGLE_PATH = "v1/projects/loadtest/locations/us-central1/publishers/google/models"
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """One request shape: provider prefix, upstream path, body and mock headers."""
+
+    provider: str
+    path: str
+    body: dict
+    mock_headers: dict[str, str] = field(default_factory=dict)
+    expected_status: int = 200
+
+
+def _openai(stream: bool = False) -> dict:
+    return {
+        "model": "gpt-4o",
+        "messages": [{"role": "user", "content": "load test"}],
+        "stream": stream,
+    }
+
+
+def _anthropic(stream: bool = False) -> dict:
+    return {
+        "model": "claude-sonnet-4-5-20250929",
+        "max_tokens": 256,
+        "messages": [{"role": "user", "content": "load test"}],
+        "stream": stream,
+    }
+
+
+_GOOGLE_BODY = {"contents": [{"role": "user", "parts": [{"text": "load test"}]}]}
+
+SCENARIOS = {
+    "openai": Scenario("openai", "v1/chat/completions", _openai()),
+    "openai-stream": Scenario("openai", "v1/chat/completions", _openai(True)),
+    "anthropic": Scenario("anthropic", "v1/messages", _anthropic()),
+    "anthropic-stream": Scenario("anthropic", "v1/messages", _anthropic(True)),
+    "google": Scenario(
+        "google", f"{GOOGLE_PATH}/gemini-2.0-flash:generateContent", _GOOGLE_BODY
+    ),
+    "google-stream": Scenario(
+        "google",
+        f"{GOOGLE_PATH}/gemini-2.0-flash:streamGenerateContent",
+        _GOOGLE_BODY,
+    ),
+    # Multi-MB body (beyond the njs 2 MB accumulation cap)
+    "large": Scenario(
+        "openai",
+        "v1/chat/completions",
+        _openai(),
+        {"X-Mock-Response-Bytes": str(3 * 1024 * 1024)},
+    ),
+    # Slow trickle: 20 SSE events, 50 ms apart
+    "trickle": Scenario(
+        "anthropic",
+        "v1/messages",
+        _anthropic(True),
+        {"X-Mock-Chunks": "20", "X-Mock-Chunk-Delay-Ms": "50"},
+    ),
+    "error": Scenario(
+        "openai",
+        "v1/chat/completions",
+        _openai(),
+        {"X-Mock-Status": "500"},
+        expected_status=500,
+    ),
+    "overloaded": Scenario(
+        "anthropic",
+        "v1/messages",
+        _anthropic(),
+        {"X-Mock-Status": "529"},
+        expected_status=529,
+    ),
+}
+
+DEFAULT_MIX = (
+    "openai=4,openai-stream=3,anthropic-stream=3,google-stream=2,"
+    "large=1,trickle=1,error=1"
+)
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    """Parse ``name=weight,...`` into scenario weights."""
+    weights: dict[str, int] = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario: {name!r}")
+        weights[name] = int(weight or 1)
+    return weights
+
+
+def plan(weights: dict[str, int], requests: int, seed: int) -> list[str]:
+    """Deterministic shuffled list of scenario names for one run."""
+    names = list(weights)
+    rng = random.Random(seed)
+    return rng.choices(names, weights=[weights[n] for n in names], k=requests)
+
+
+def _count_lines(path: Path) -> int:
+    try:
+        with path.open("rb") as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return 0
+
+
+async def _drive(
+    base_url: str, gateway: bool, schedule: list[str], concurrency: int
+) -> tuple[dict[str, list[float]], dict[str, int], float]:
+    """Send the schedule with ``concurrency`` workers.
+
+    Returns latencies per scenario, unexpected-status counts per scenario and
+    wall-clock seconds.
+    """
+    latencies: dict[str, list[float]] = {name: [] for name in set(schedule)}
+    failures: dict[str, int] = {}
+    queue = iter(schedule)
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        for name in queue:
+            scenario = SCENARIOS[name]
+            prefix = f"/{scenario.provider}" if gateway else ""
+            headers = {"Authorization": f"Bearer {API_KEY}", **scenario.mock_headers}
+            start = time.perf_counter()
+            async with session.post(
+                f"{base_url}{prefix}/{scenario.path}",
+                json=scenario.body,
+                headers=headers,
+            ) as resp:
+                # Read the full body: streamed latency is time to last byte.
+                async for _ in resp.content.iter_any():
+                    pass
+                if resp.status != scenario.expected_status:
+                    failures[name] = failures.get(name, 0) + 1
+            latencies[name].append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, failures, elapsed
+
+
+def _summarize(latencies: dict[str, list[float]]) -> dict[str, dict[str, float]]:
+    summary = {}
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        summary[name] = {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 50) * 1000, 3),
+            "p99_ms": round(_percentile(values, 99) * 1000, 3),
+        }
+    return summary
+
+
+def run(
+    gateway_url: str,
+    upstream_url: str,
+    stats_path: Path,
+    schedule: list[str],
+    concurrency: int,
+    stats_wait: float,
+) -> dict:
+    # Baseline: straight to the mock upstream.
+    direct, direct_failures, direct_elapsed = asyncio.run(
+        _drive(upstream_url, False, schedule, concurrency)
+    )
+
+    lines_before = _count_lines(stats_path)
+    gateway, gateway_failures, gateway_elapsed = asyncio.run(
+        _drive(gateway_url, True, schedule, concurrency)
+    )
+    # Stats are written after the response completes; give stragglers a moment.
+    deadline = time.monotonic() + stats_wait
+    while True:
+        stats_lines = _count_lines(stats_path) - lines_before
+        if stats_lines >= len(schedule) or time.monotonic() >= deadline:
+            break
+        time.sleep(0.2)
+
+    direct_summary = _summarize(direct)
+    gateway_summary = _summarize(gateway)
+    scenarios = {
+        name: {
+            "count": gateway_summary[name]["count"],
+            "direct_p50_ms": direct_summary[name]["p50_ms"],
+            "direct_p99_ms": direct_summary[name]["p99_ms"],
+            "gateway_p50_ms": gateway_summary[name]["p50_ms"],
+            "gateway_p99_ms": gateway_summary[name]["p99_ms"],
+            "added_p50_ms": round(
+                gateway_summary[name]["p50_ms"] - direct_summary[name]["p50_ms"], 3
+            ),
+            "added_p99_ms": round(
+                gateway_summary[name]["p99_ms"] - direct_summary[name]["p99_ms"], 3
+            ),
+            "unexpected_status": gateway_failures.get(name, 0),
+        }
+        for name in gateway_summary
+    }
+    return {
+        "requests": len(schedule),
+        "concurrency": concurrency,
+        "direct_requests_per_second": round(len(schedule) / direct_elapsed, 1),
+        "gateway_requests_per_second": round(len(schedule) / gateway_elapsed, 1),
+        "direct_unexpected_status": sum(direct_failures.values()),
+        "stats_lines": stats_lines,
+        "stats_completeness": round(stats_lines / len(schedule), 4),
+        "scenarios": scenarios,
+    }
+
+
+def _print(result: dict) -> None:
+    print(
+        f"requests={result['requests']} concurrency={result['concurrency']} "
+        f"direct={result['direct_requests_per_second']} req/s "
+        f"gateway={result['gateway_requests_per_second']} req/s"
+    )
+    print(
+        f"stats completeness: {result['stats_lines']}/{result['requests']} "
+        f"({result['stats_completeness']:.2%})"
+    )
+    print(
+        f"{'scenario':<18} {'count':>6} {'p50 ms':>9} {'+p50 ms':>9} "
+        f"{'p99 ms':>9} {'+p99 ms':>9} {'bad':>5}"
+    )
+    for name, s in result["scenarios"].items():
+        print(
+            f"{name:<18} {s['count']:>6} {s['gateway_p50_ms']:>9} "
+            f"{s['added_p50_ms']:>9} {s['gateway_p99_ms']:>9} "
+            f"{s['added_p99_ms']:>9} {s['unexpected_status']:>5}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--gateway-url", default="http://localhost:8080")
+    parser.add_argument("--upstream-url", default="http://localhost:8082")
+    parser.add_argument(
+        "--stats-path", type=Path, default=Path("tests/e2e/data/stats.jsonl")
+    )
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--stats-wait", type=float, default=10.0, help="seconds to wait for stats"
+    )
+    parser.add_argument(
+        "--min-completeness",
+        type=float,
+        default=1.0,
+        help="exit non-zero when stats completeness is below this ratio",
+    )
+    parser.add_argument("--json", type=Path, help="write results to this file")
+    args = parser.parse_args()
+
+    schedule = plan(parse_mix(args.mix), args.requests, args.seed)
+    result = run(
+        args.gateway_url,
+        args.upstream_url,
+        args.stats_path,
+        schedule,
+        args.concurrency,
+        args.stats_wait,
+    )
+    _print(result)
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2) + "\n")
+
+    unexpected = sum(s["unexpected_status"] for s in result["scenarios"].values())
+    if unexpected or result["stats_completeness"] < args.min_completeness:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,334 @@
+"""Capture anonymized traffic traces from stats files and replay them.
+
+capture: read stats JSONL segments (plain or .gz) and write a trace, one
+JSON record per line, ordered by request start time:
+
+    {"offset": 12.304, "provider": "openai", "endpoint": "/openai/v1/...",
+     "model": "gpt-4o", "status": 200, "streaming": true,
+     "response_bytes": 18342, "output_tokens": 412,
+     "upstream_header_time": 0.41, "upstream_response_time": 6.2}
+
+Keys, lmgate ids, query strings and Google project/location ids are
+dropped; only the traffic shape is kept.
+
+replay: fire a trace at the stack (scripts/run-load-tests.sh brings it up
+with the mock upstream) at 1x or Nx speed. Arrivals are open-loop: each
+request is sent at its scaled offset regardless of how earlier requests
+are doing. The mock reproduces each record's status, size, time to first
+byte and stream duration through X-Mock-* headers; upstream timings are
+not scaled by --speed, only arrival times are.
+
+Usage:
+    python benchmarks/traffic_trace.py capture data/stats.jsonl* -o trace.jsonl
+        [--since 2026-03-01T00:00:00Z] [--until ...] [--limit N]
+    python benchmarks/traffic_trace.py replay trace.jsonl [--speed 4]
+        [--gateway-url URL] [--stats-path PATH] [--json results.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import json
+import re
+import sys
+import time
+from collections.abc import Iterator
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any
+
+import aiohttp
+from loadtest import API_KEY, _count_lines, _percentile
+
+_PROVIDER_PREFIXES = ("openai", "anthropic", "google")
+# Google paths embed customer project and location ids.
+_GOOGLE_IDS = re.compile(r"/(projects|locations)/[^/]+")
+_MAX_STREAM_CHUNKS = 200
+
+
+def _open(path: Path) -> IO[str]:
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return path.open(encoding="utf-8")
+
+
+def _parse_time(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def _read_stats(paths: list[Path]) -> Iterator[dict[str, Any]]:
+    for path in paths:
+        with _open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(entry, dict) and entry.get("timestamp"):
+                    yield entry
+
+
+def anonymize_endpoint(endpoint: str | None, provider: str) -> str:
+    """Request path with the query string and account identifiers removed."""
+    path = (endpoint or "").split("?", 1)[0]
+    path = _GOOGLE_IDS.sub(lambda m: f"/{m.group(1)}/-", path)
+    if not path.startswith(f"/{provider}/"):
+        path = f"/{provider}{path}"
+    return path
+
+
+def capture(
+    paths: list[Path],
+    since: float | None = None,
+    until: float | None = None,
+    limit: int | None = None,
+) -> list[dict[str, Any]]:
+    """Build trace records from stats entries, ordered by request start."""
+    started = []
+    for entry in _read_stats(paths):
+        provider = entry.get("provider")
+        if provider not in _PROVIDER_PREFIXES:
+            continue
+        try:
+            finished = _parse_time(entry["timestamp"])
+        except ValueError:
+            continue
+        start = finished - (entry.get("request_time") or 0.0)
+        if (since is not None and start < since) or (
+            until is not None and start >= until
+        ):
+            continue
+        started.append((start, provider, entry))
+    started.sort(key=lambda item: item[0])
+    if limit is not None:
+        started = started[:limit]
+    origin = started[0][0] if started else 0.0
+    return [
+        {
+            "offset": round(start - origin, 3),
+            "provider": provider,
+            "endpoint": anonymize_endpoint(entry.get("endpoint"), provider),
+            "model": entry.get("model"),
+            "status": entry.get("status"),
+            "streaming": bool(entry.get("streaming")),
+            "response_bytes": entry.get("response_bytes"),
+            "output_tokens": entry.get("output_tokens"),
+            "upstream_header_time": entry.get("upstream_header_time"),
+            "upstream_response_time": entry.get("upstream_response_time"),
+        }
+        for start, provider, entry in started
+    ]
+
+
+def _request_body(record: dict[str, Any]) -> dict[str, Any]:
+    provider = record["provider"]
+    model = record.get("model") or "mock-model"
+    messages = [{"role": "user", "content": "replay"}]
+    if provider == "google":
+        return {"contents": [{"role": "user", "parts": [{"text": "replay"}]}]}
+    body: dict[str, Any] = {"model": model, "messages": messages}
+    if provider == "anthropic":
+        body["max_tokens"] = record.get("output_tokens") or 256
+    if record.get("streaming"):
+        body["stream"] = True
+    return body
+
+
+def mock_headers(record: dict[str, Any]) -> dict[str, str]:
+    """X-Mock-* headers that make the mock reproduce the recorded response."""
+    headers = {}
+    status = record.get("status") or 200
+    if status >= 400:
+        headers["X-Mock-Status"] = str(status)
+    if record.get("response_bytes"):
+        headers["X-Mock-Response-Bytes"] = str(record["response_bytes"])
+    header_time = record.get("upstream_header_time") or 0.0
+    response_time = record.get("upstream_response_time") or header_time
+    headers["X-Mock-Latency-Ms"] = str(int(header_time * 1000))
+    if record.get("streaming"):
+        chunks = max(
+            1, min(_MAX_STREAM_CHUNKS, (record.get("output_tokens") or 1) // 4)
+        )
+        delay = max(0.0, response_time - header_time) / chunks
+        headers["X-Mock-Chunks"] = str(chunks)
+        headers["X-Mock-Chunk-Delay-Ms"] = str(int(delay * 1000))
+    return headers
+
+
+async def _replay(
+    gateway_url: str, records: list[dict[str, Any]], speed: float
+) -> dict[str, Any]:
+    latencies: dict[str, list[float]] = {}
+    lags: list[float] = []
+    mismatched = 0
+    errors = 0
+
+    async def fire(session: aiohttp.ClientSession, record: dict[str, Any]) -> None:
+        nonlocal mismatched, errors
+        headers = {"Authorization": f"Bearer {API_KEY}", **mock_headers(record)}
+        start = time.perf_counter()
+        try:
+            async with session.post(
+                f"{gateway_url}{record['endpoint']}",
+                json=_request_body(record),
+                headers=headers,
+            ) as resp:
+                async for _ in resp.content.iter_any():
+                    pass
+                if resp.status != (record.get("status") or 200):
+                    mismatched += 1
+        except aiohttp.ClientError:
+            errors += 1
+            return
+        latencies.setdefault(record["provider"], []).append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=600)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = []
+        origin = time.perf_counter()
+        for record in records:
+            due = origin + record["offset"] / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(0.0, time.perf_counter() - due))
+            tasks.append(asyncio.create_task(fire(session, record)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - origin
+
+    lags.sort()
+    providers = {}
+    for provider, values in sorted(latencies.items()):
+        values.sort()
+        providers[provider] = {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 50) * 1000, 3),
+            "p99_ms": round(_percentile(values, 99) * 1000, 3),
+        }
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "schedule_lag_p99_ms": round(_percentile(lags, 99) * 1000, 3),
+        "unexpected_status": mismatched,
+        "connection_errors": errors,
+        "providers": providers,
+    }
+
+
+def replay(
+    gateway_url: str,
+    records: list[dict[str, Any]],
+    speed: float,
+    stats_path: Path,
+    stats_wait: float,
+) -> dict[str, Any]:
+    lines_before = _count_lines(stats_path)
+    result = asyncio.run(_replay(gateway_url, records, speed))
+    deadline = time.monotonic() + stats_wait
+    while True:
+        stats_lines = _count_lines(stats_path) - lines_before
+        if stats_lines >= len(records) or time.monotonic() >= deadline:
+            break
+        time.sleep(0.2)
+    duration = records[-1]["offset"] / speed if records else 0.0
+    return {
+        "requests": len(records),
+        "speed": speed,
+        "trace_seconds": round(duration, 3),
+        "offered_requests_per_second": round(len(records) / duration, 1)
+        if duration
+        else None,
+        **result,
+        "stats_lines": stats_lines,
+        "stats_completeness": round(stats_lines / len(records), 4) if records else 1.0,
+    }
+
+
+def _read_trace(path: Path) -> list[dict[str, Any]]:
+    with _open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _capture_main(args: argparse.Namespace) -> int:
+    records = capture(
+        args.paths,
+        since=_parse_time(args.since) if args.since else None,
+        until=_parse_time(args.until) if args.until else None,
+        limit=args.limit,
+    )
+    out = args.output.open("w") if args.output else sys.stdout
+    try:
+        for record in records:
+            out.write(json.dumps(record, separators=(",", ":")) + "\n")
+    finally:
+        if args.output:
+            out.close()
+    span = records[-1]["offset"] if records else 0.0
+    print(f"captured {len(records)} requests over {span:.1f}s", file=sys.stderr)
+    return 0
+
+
+def _replay_main(args: argparse.Namespace) -> int:
+    records = _read_trace(args.trace)
+    result = replay(
+        args.gateway_url, records, args.speed, args.stats_path, args.stats_wait
+    )
+    print(
+        f"requests={result['requests']} speed={result['speed']}x "
+        f"offered={result['offered_requests_per_second']} req/s "
+        f"elapsed={result['elapsed_seconds']}s "
+        f"schedule lag p99={result['schedule_lag_p99_ms']} ms"
+    )
+    print(
+        f"stats completeness: {result['stats_lines']}/{result['requests']} "
+        f"({result['stats_completeness']:.2%}), "
+        f"unexpected status: {result['unexpected_status']}, "
+        f"connection errors: {result['connection_errors']}"
+    )
+    print(f"{'provider':<12} {'count':>7} {'p50 ms':>10} {'p99 ms':>10}")
+    for provider, s in result["providers"].items():
+        print(f"{provider:<12} {s['count']:>7} {s['p50_ms']:>10} {s['p99_ms']:>10}")
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2) + "\n")
+    if result["unexpected_status"] or result["connection_errors"]:
+        return 1
+    return 0 if result["stats_completeness"] >= args.min_completeness else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cap = sub.add_parser("capture", help="build a trace from stats files")
+    cap.add_argument("paths", type=Path, nargs="+", help="stats JSONL segments")
+    cap.add_argument("-o", "--output", type=Path, help="trace file (default stdout)")
+    cap.add_argument("--since", help="ISO-8601 start (inclusive)")
+    cap.add_argument("--until", help="ISO-8601 end (exclusive)")
+    cap.add_argument("--limit", type=int)
+
+    rep = sub.add_parser("replay", help="replay a trace against the stack")
+    rep.add_argument("trace", type=Path)
+    rep.add_argument("--speed", type=float, default=1.0, help="arrival speed-up")
+    rep.add_argument("--gateway-url", default="http://localhost:8080")
+    rep.add_argument(
+        "--stats-path", type=Path, default=Path("tests/e2e/data/stats.jsonl")
+    )
+    rep.add_argument("--stats-wait", type=float, default=10.0)
+    rep.add_argument(
+        "--min-completeness",
+        type=float,
+        default=1.0,
+        help="exit non-zero when stats completeness is below this ratio",
+    )
+    rep.add_argument("--json", type=Path, help="write results to this file")
+
+    args = parser.parse_args()
+    if args.command == "capture":
+        return _capture_main(args)
+    return _replay_main(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
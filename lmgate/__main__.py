@@ -1,13 +1,28 @@
-"""LMGate entry point: start aiohttp server."""
+"""LMGate entry point: start aiohttp server, or run a subcommand.
+
+python -m lmgate                 start the server
+python -m lmgate query [...]     filter and aggregate stats files
+python -m lmgate render-nginx    render nginx.conf from the config
+"""
 
 import logging
 import sys
 
 from lmgate.config import load_config
+from lmgate.eventloop import new_event_loop
 from lmgate.server import create_app
 
 
 def main() -> None:
+    if sys.argv[1:2] == ["query"]:
+        from lmgate.query import main as query_main
+
+        sys.exit(query_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["render-nginx"]:
+        from lmgate.nginxconf import main as render_main
+
+        sys.exit(render_main(sys.argv[2:]))
+
     from aiohttp import web
 
     config = load_config()
@@ -18,8 +33,15 @@ def main() -> None:
         stream=sys.stderr,
     )
 
+    if config["server"]["workers"] > 1:
+        from lmgate.workers import run_workers
+
+        run_workers(config)
+        return
+
+    loop = new_event_loop(config["server"]["event_loop"])
     app = create_app(config)
-    web.run_app(app, port=config["server"]["port"])
+    web.run_app(app, port=config["server"]["port"], loop=loop)
 
 
 if __name__ == "__main__":
@@ -4,13 +4,23 @@ from __future__ import annotations
 
 import csv
 import logging
-from dataclasses import dataclass
+import marshal
+import os
+import time
+from dataclasses import astuple, dataclass
 from pathlib import Path
 
+from lmgate.metrics import REGISTRY
+
 log = logging.getLogger(__name__)
 
 REQUIRED_COLUMNS = {"id", "api_key", "owner", "added"}
 
+_ENTRIES = REGISTRY.gauge("lmgate_allowlist_entries", "Keys in the allow-list")
+_RELOAD_SECONDS = REGISTRY.histogram(
+    "lmgate_allowlist_reload_duration_seconds", "Time spent loading the allow-list"
+)
+
 
 @dataclass
 class AllowListEntry:
@@ -18,6 +28,9 @@ class AllowListEntry:
     api_key: str
     owner: str
     added: str
+    # Optional CSV columns; None means unlimited.
+    daily_token_budget: int | None = None
+    monthly_token_budget: int | None = None
 
 
 class AllowList:
@@ -28,24 +41,46 @@ class AllowList:
 
     def load(self) -> None:
         """Load the CSV file. Raises FileNotFoundError or ValueError on problems."""
-        entries = self._parse_csv(self._path)
+        start = time.perf_counter()
+        entries = self._read(self._path)
         self._entries = entries
         self._last_mtime = self._path.stat().st_mtime
+        _RELOAD_SECONDS.observe(time.perf_counter() - start)
+        _ENTRIES.set(len(entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
 
     def get(self, api_key: str) -> AllowListEntry | None:
         """O(1) lookup by api_key."""
         return self._entries.get(api_key)
 
-    def reload_if_changed(self) -> None:
-        """Check file mtime and reload if changed. Atomic swap of in-memory state."""
+    def reload_if_changed(self) -> bool:
+        """Check file mtime and reload if changed. Atomic swap of in-memory state.
+
+        Returns True if the allow-list was reloaded.
+        """
         try:
             current_mtime = self._path.stat().st_mtime
         except OSError:
             log.warning("Allow-list file not accessible: %s", self._path)
-            return
+            return False
         if current_mtime != self._last_mtime:
             log.info("Allow-list file changed, reloading: %s", self._path)
             self.load()
+            return True
+        return False
+
+    def save_snapshot(self, path: Path) -> None:
+        """Atomically write the parsed index as a snapshot for worker processes."""
+        data = {key: astuple(entry) for key, entry in self._entries.items()}
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            marshal.dump(data, f)
+        os.replace(tmp, path)
+
+    def _read(self, path: Path) -> dict[str, AllowListEntry]:
+        return self._parse_csv(path)
 
     @staticmethod
     def _parse_csv(path: Path) -> dict[str, AllowListEntry]:
@@ -64,6 +99,32 @@ class AllowList:
                     api_key=row["api_key"],
                     owner=row["owner"],
                     added=row["added"],
+                    daily_token_budget=_parse_budget(row, "daily_token_budget"),
+                    monthly_token_budget=_parse_budget(row, "monthly_token_budget"),
                 )
                 entries[entry.api_key] = entry
             return entries
+
+
+class SnapshotAllowList(AllowList):
+    """Allow-list backed by a snapshot written by the supervisor process.
+
+    Workers poll the snapshot instead of the CSV, so the CSV is parsed and
+    validated once per change rather than once per worker.
+    """
+
+    def _read(self, path: Path) -> dict[str, AllowListEntry]:
+        with open(path, "rb") as f:
+            data = marshal.load(f)
+        return {key: AllowListEntry(*fields) for key, fields in data.items()}
+
+
+def _parse_budget(row: dict[str, str], column: str) -> int | None:
+    """Parse an optional budget column. Raises ValueError on non-integer values."""
+    value = (row.get(column) or "").strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Invalid {column} for id={row['id']}: {value!r}") from None
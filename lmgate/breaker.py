@@ -0,0 +1,225 @@
+"""Circuit breaker per provider and model, driven by ingested stats.
+
+Each circuit counts the requests and upstream failures (status >= 500,
+including nginx's 502/504 for unreachable or timed-out upstreams and
+Anthropic's 529) of the last ``window_seconds``. When at least
+``min_requests`` were seen and the failure share reaches
+``error_rate_threshold``, the circuit opens: ``/auth`` rejects requests for
+it with 503 and ``Retry-After`` instead of letting them wait on a failing
+provider. After ``open_seconds`` the circuit is half-open and admits up to
+``half_open_probes`` requests; the first result of one of them closes it
+again (success) or reopens it (failure). Each probe gets a random tag, which
+``/auth`` returns in ``X-LMGate-Probe`` and nginx writes to the stats record
+(``probe``); other results arriving while half-open, such as those of
+requests admitted before the circuit opened, are ignored.
+
+Every provider has a circuit for all its traffic. Requests whose path names
+the model (``.../models/<model>:generateContent``) also have one per model,
+so one failing model does not shed the others. Models sent in the request
+body are invisible to ``/auth``, which does not receive the body.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import secrets
+import time
+from collections.abc import Callable, Mapping
+from typing import Any
+
+from lmgate.metrics import REGISTRY
+
+_STATE = REGISTRY.gauge(
+    "lmgate_breaker_state",
+    "Circuit state (0 closed, 1 open, 2 half-open); model * is the provider",
+    ("provider", "model"),
+)
+_OPENED = REGISTRY.counter(
+    "lmgate_breaker_opened_total",
+    "Times a circuit opened",
+    ("provider", "model"),
+)
+
+CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+ALL_MODELS = "*"
+_BUCKETS = 10
+_URI_MODEL = re.compile(r"/models/([^/:?]+)")
+
+
+def uri_model(uri: str | None) -> str | None:
+    """Model named in a request path, if any."""
+    if not uri:
+        return None
+    match = _URI_MODEL.search(uri)
+    return match.group(1) if match else None
+
+
+def is_failure(status: Any) -> bool:
+    """Whether a stats status counts against the circuit."""
+    return isinstance(status, int) and status >= 500
+
+
+class _Circuit:
+    """Failure counts in ``_BUCKETS`` time buckets, and the circuit state."""
+
+    __slots__ = (
+        "stamps",
+        "totals",
+        "failures",
+        "state",
+        "opened_at",
+        "probes",
+    )
+
+    def __init__(self) -> None:
+        self.stamps = [-1] * _BUCKETS
+        self.totals = [0] * _BUCKETS
+        self.failures = [0] * _BUCKETS
+        self.state = CLOSED
+        self.opened_at = 0.0
+        # Tags of the admitted half-open probes, and when they were admitted.
+        self.probes: dict[str, float] = {}
+
+    def add(self, bucket: int, failure: bool) -> tuple[int, int]:
+        """Count one result; returns (total, failures) in the window."""
+        slot = bucket % _BUCKETS
+        if self.stamps[slot] != bucket:
+            self.stamps[slot] = bucket
+            self.totals[slot] = self.failures[slot] = 0
+        self.totals[slot] += 1
+        self.failures[slot] += failure
+        oldest = bucket - _BUCKETS
+        total = failures = 0
+        for i in range(_BUCKETS):
+            if self.stamps[i] > oldest:
+                total += self.totals[i]
+                failures += self.failures[i]
+        return total, failures
+
+    def reset(self) -> None:
+        self.stamps = [-1] * _BUCKETS
+
+
+class CircuitBreaker:
+    """Circuits keyed by (provider, model); see the module docstring."""
+
+    def __init__(
+        self,
+        window_seconds: float = 30,
+        min_requests: int = 20,
+        error_rate_threshold: float = 0.5,
+        open_seconds: float = 30,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._bucket_seconds = window_seconds / _BUCKETS
+        self._min_requests = min_requests
+        self._threshold = error_rate_threshold
+        self._open_seconds = open_seconds
+        self._probes = half_open_probes
+        self._clock = clock
+        self._circuits: dict[tuple[str, str], _Circuit] = {}
+
+    def check(
+        self, provider: str, model: str | None = None
+    ) -> tuple[int | None, str | None]:
+        """(Retry-After in seconds, None) to reject a request, else (None, tag).
+
+        The tag is set when the request is a half-open probe; its stats
+        record must carry it (``probe``) for the result to count.
+        """
+        now = self._clock()
+        keys = [(provider, ALL_MODELS)]
+        if model:
+            keys.append((provider, model))
+        tag = None
+        probed: list[_Circuit] = []
+        for key in keys:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit.state == CLOSED:
+                continue
+            retry_after = self._admit(key, circuit, now)
+            if retry_after is not None:
+                # Rejected after all: free the slots this request took.
+                if tag is not None:
+                    for other in probed:
+                        del other.probes[tag]
+                return retry_after, None
+            tag = tag or secrets.token_hex(8)
+            circuit.probes[tag] = now
+            probed.append(circuit)
+        return None, tag
+
+    def _admit(self, key: tuple[str, str], circuit: _Circuit, now: float) -> int | None:
+        if circuit.state == OPEN:
+            remaining = circuit.opened_at + self._open_seconds - now
+            if remaining > 0:
+                return max(1, math.ceil(remaining))
+            self._set_state(key, circuit, HALF_OPEN)
+            circuit.probes.clear()
+        # Half-open. A probe whose result never arrives (aborted request)
+        # frees its slot after open_seconds.
+        for tag, admitted in list(circuit.probes.items()):
+            if now - admitted >= self._open_seconds:
+                del circuit.probes[tag]
+        if len(circuit.probes) >= self._probes:
+            return 1
+        return None
+
+    def record(self, entry: Mapping[str, Any]) -> None:
+        """Count an ingested stats entry against its circuits."""
+        provider = entry.get("provider")
+        if not provider or provider == "unknown":
+            return
+        probe = entry.get("probe")
+        if entry.get("cache_status") == "HIT":
+            # Says nothing about the upstream; frees the probe slot.
+            if probe:
+                self.release(probe)
+            return
+        failure = is_failure(entry.get("status"))
+        now = self._clock()
+        bucket = int(now // self._bucket_seconds)
+        model = uri_model(entry.get("endpoint")) or ALL_MODELS
+        keys = [(provider, ALL_MODELS)]
+        if model != ALL_MODELS:
+            keys.append((provider, model))
+        for key in keys:
+            circuit = self._circuits.get(key)
+            if circuit is None:
+                circuit = self._circuits[key] = _Circuit()
+            if circuit.state == HALF_OPEN:
+                # Only the results of this circuit's probes decide.
+                if probe not in circuit.probes:
+                    continue
+                circuit.probes.clear()
+                if failure:
+                    self._open(key, circuit, now)
+                else:
+                    circuit.reset()
+                    self._set_state(key, circuit, CLOSED)
+            elif circuit.state == CLOSED:
+                total, failures = circuit.add(bucket, failure)
+                if total >= self._min_requests and failures >= self._threshold * total:
+                    self._open(key, circuit, now)
+            # Open: results of requests admitted before it opened are ignored.
+
+    def release(self, probe: str) -> None:
+        """Free the slots of a probe that will not reach the upstream."""
+        for circuit in self._circuits.values():
+            circuit.probes.pop(probe, None)
+
+    def _open(self, key: tuple[str, str], circuit: _Circuit, now: float) -> None:
+        circuit.opened_at = now
+        circuit.reset()
+        self._set_state(key, circuit, OPEN)
+        _OPENED.inc(*key)
+
+    def _set_state(self, key: tuple[str, str], circuit: _Circuit, state: int) -> None:
+        circuit.state = state
+        _STATE.set(state, *key)
+
+    def state(self, provider: str, model: str | None = None) -> int:
+        circuit = self._circuits.get((provider, model or ALL_MODELS))
+        return CLOSED if circuit is None else circuit.state
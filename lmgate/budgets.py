@@ -0,0 +1,139 @@
+"""Daily/monthly token budgets per allow-list entry.
+
+Usage is accumulated from ingested stats records and checked at /auth.
+Counters live in memory and are persisted as a single compact JSON
+checkpoint, written periodically (only when changed) and on shutdown.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+from lmgate.allowlist import AllowListEntry
+
+log = logging.getLogger(__name__)
+
+
+def _day_key(now: datetime) -> str:
+    return now.strftime("%Y-%m-%d")
+
+
+def _month_key(now: datetime) -> str:
+    return now.strftime("%Y-%m")
+
+
+def _seconds_until_next_day(now: datetime) -> int:
+    tomorrow = (now + timedelta(days=1)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    return max(1, int((tomorrow - now).total_seconds()))
+
+
+def _seconds_until_next_month(now: datetime) -> int:
+    first = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    next_month = (first + timedelta(days=32)).replace(day=1)
+    return max(1, int((next_month - now).total_seconds()))
+
+
+class BudgetTracker:
+    """Per-id token usage for the current UTC day and month.
+
+    With multiple worker processes every worker reads all stats records, so
+    each one counts the usage of all workers (and checkpoints it to its own
+    file).
+    """
+
+    def __init__(self, checkpoint_path: Path) -> None:
+        self._path = checkpoint_path
+        now = datetime.now(UTC)
+        self._day = _day_key(now)
+        self._month = _month_key(now)
+        self._daily: dict[str, int] = {}
+        self._monthly: dict[str, int] = {}
+        self._dirty = False
+
+    def load(self) -> None:
+        """Restore counters from the checkpoint file, if present."""
+        data = _read_checkpoint(self._path)
+        if data is not None:
+            # Counters from an earlier period are discarded by _roll().
+            self._day = data.get("day", self._day)
+            self._month = data.get("month", self._month)
+            self._daily = {k: int(v) for k, v in data.get("daily", {}).items()}
+            self._monthly = {k: int(v) for k, v in data.get("monthly", {}).items()}
+            self._roll(datetime.now(UTC))
+
+    def record(self, lmgate_id: str | None, tokens: int) -> None:
+        """Add consumed tokens for lmgate_id to the current periods."""
+        if not lmgate_id or tokens <= 0:
+            return
+        self._roll(datetime.now(UTC))
+        self._daily[lmgate_id] = self._daily.get(lmgate_id, 0) + tokens
+        self._monthly[lmgate_id] = self._monthly.get(lmgate_id, 0) + tokens
+        self._dirty = True
+
+    def usage(self, lmgate_id: str) -> tuple[int, int]:
+        """Return (daily, monthly) tokens used by lmgate_id."""
+        self._roll(datetime.now(UTC))
+        return self._daily.get(lmgate_id, 0), self._monthly.get(lmgate_id, 0)
+
+    def retry_after(self, entry: AllowListEntry) -> int | None:
+        """Seconds until the exhausted budget resets, or None if within budget."""
+        if entry.daily_token_budget is None and entry.monthly_token_budget is None:
+            return None
+        now = datetime.now(UTC)
+        used_daily, used_monthly = self.usage(entry.id)
+        monthly = entry.monthly_token_budget
+        if monthly is not None and used_monthly >= monthly:
+            return _seconds_until_next_month(now)
+        daily = entry.daily_token_budget
+        if daily is not None and used_daily >= daily:
+            return _seconds_until_next_day(now)
+        return None
+
+    def checkpoint(self) -> None:
+        """Atomically write counters to disk if they changed since last time."""
+        if not self._dirty:
+            return
+        data = {
+            "day": self._day,
+            "month": self._month,
+            "daily": self._daily,
+            "monthly": self._monthly,
+        }
+        tmp = self._path.with_name(self._path.name + ".tmp")
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, self._path)
+        self._dirty = False
+
+    def _roll(self, now: datetime) -> None:
+        """Reset counters whose period has ended."""
+        day = _day_key(now)
+        if day != self._day:
+            self._day = day
+            self._daily = {}
+            self._dirty = True
+        month = _month_key(now)
+        if month != self._month:
+            self._month = month
+            self._monthly = {}
+            self._dirty = True
+
+
+def _read_checkpoint(path: Path) -> dict | None:
+    """Read a checkpoint file; None if missing or unreadable."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        log.warning("Budget checkpoint unreadable, ignoring: %s", path)
+        return None
+    return data if isinstance(data, dict) else None
@@ -7,6 +7,7 @@ Nesting convention: double underscore (e.g. LMGATE_SERVER__PORT)
 
 from __future__ import annotations
 
+import copy
 import os
 from pathlib import Path
 from typing import Any
@@ -18,6 +19,8 @@ _DEFAULT_CONFIG_PATH = Path("config/lmgate.yaml")
 _DEFAULTS: dict[str, Any] = {
     "server": {
         "port": 8081,
+        "workers": 1,
+        "event_loop": "auto",
     },
     "auth": {
         "allowlist_path": "/data/allowlist.csv",
@@ -25,7 +28,116 @@ _DEFAULTS: dict[str, Any] = {
     },
     "stats": {
         "output_path": "/data/stats.jsonl",
+        # Retry interval for entries POSTed to /stats that could not be
+        # written yet (each POST is written at once).
         "flush_interval_seconds": 10,
+        # How often lmgate reads the records nginx appended to output_path
+        # (lmgate.ingest); completions update in-flight slots from them.
+        "follow_interval_seconds": 0.2,
+        # Entries kept in memory while the stats file cannot be written
+        "max_buffered_entries": 100000,
+        # Extra sinks ({"type": "jsonl" | "sqlite" | "statsd" | "socket", ...},
+        # optionally with "spill": True); see lmgate.sinks.
+        "sinks": [],
+        # GET /stats/stream (live NDJSON feed)
+        "stream": {
+            "enabled": True,
+            "max_subscribers": 16,
+            "buffer_size": 1000,
+            "history_size": 10000,
+            "heartbeat_seconds": 15,
+        },
+    },
+    "limits": {
+        "max_in_flight_per_key": 0,
+        "in_flight_timeout_seconds": 600,
+    },
+    "budgets": {
+        # None: budgets.json next to stats.output_path
+        "checkpoint_path": None,
+        "checkpoint_interval_seconds": 60,
+    },
+    # Upstream LLM APIs, keyed by name. Also rendered into the nginx config
+    # (python -m lmgate render-nginx); see lmgate.providers for the fields
+    # and their defaults (model path, streaming formats, servers, pool).
+    "providers": {
+        "openai": {
+            "host": "api.openai.com",
+            "prefix": "/openai/",
+            "usage": {
+                "input": "usage.prompt_tokens",
+                "output": "usage.completion_tokens",
+            },
+        },
+        "anthropic": {
+            "host": "api.anthropic.com",
+            "prefix": "/anthropic/",
+            "usage": {
+                "input": "usage.input_tokens",
+                "output": "usage.output_tokens",
+            },
+        },
+        "google": {
+            "host": "aiplatform.googleapis.com",
+            "prefix": "/google/",
+            "usage": {
+                "input": "usageMetadata.promptTokenCount",
+                "output": "usageMetadata.candidatesTokenCount",
+            },
+            "streaming": ["sse", "json-array"],
+        },
+    },
+    # Response cache in nginx (proxy_cache); /auth opts keys in. The size
+    # and lifetime settings are rendered into the nginx config.
+    "cache": {
+        "enabled": False,
+        "max_size": "1g",
+        "inactive": "1h",
+        "valid": "1h",
+        "lock_timeout": "5m",
+    },
+    # Shed requests to failing providers/models at /auth (lmgate.breaker)
+    "circuit_breaker": {
+        "enabled": False,
+        "window_seconds": 30,
+        # Fewer results than this in the window never open the circuit
+        "min_requests": 20,
+        # Share of 5xx results that opens the circuit
+        "error_rate_threshold": 0.5,
+        "open_seconds": 30,
+        "half_open_probes": 1,
+    },
+    # Choice between a provider's targets (lmgate.routing)
+    "routing": {
+        # Weight of the newest stats record in the moving averages
+        "smoothing": 0.1,
+        # Error rate multiplier: 1 + error_penalty * error_rate
+        "error_penalty": 10.0,
+    },
+    # Settings of the generated nginx config (lmgate.nginxconf)
+    "nginx": {
+        "worker_connections": 1024,
+        "access_log": True,
+        "lmgate_server": "lmgate:8081",
+        "client_body_buffer_size": "1m",
+    },
+    "rollups": {
+        "enabled": False,
+        "interval_seconds": 60,
+        "grace_seconds": 120,
+    },
+    "monitoring": {
+        "loop_lag": {
+            "enabled": False,
+            "interval_seconds": 0.25,
+            "warn_threshold_seconds": 0.1,
+        },
+    },
+    "admin": {
+        "profiling_enabled": False,
+        "token": "",
+        "max_profile_seconds": 60,
+        "sample_interval_seconds": 0.005,
     },
     "logging": {
         "level": "INFO",
@@ -80,13 +192,17 @@ def _apply_env_overrides(config: dict) -> dict:
     return config
 
 
+def apply_defaults(config: dict[str, Any]) -> dict[str, Any]:
+    """Fill in missing settings from the built-in defaults."""
+    return _deep_merge(copy.deepcopy(_DEFAULTS), config)
+
+
 def load_config(config_path: Path | None = None) -> dict[str, Any]:
     """Load configuration from YAML file with env var overrides.
 
     Precedence (highest wins): env vars > YAML file > defaults.
     """
-    config = _DEFAULTS.copy()
-    config = {k: v.copy() if isinstance(v, dict) else v for k, v in config.items()}
+    config = copy.deepcopy(_DEFAULTS)
 
     path = config_path or _DEFAULT_CONFIG_PATH
     if path.exists():
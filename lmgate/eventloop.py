@@ -0,0 +1,36 @@
+"""Event loop selection for the aiohttp server (server.event_loop)."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+EVENT_LOOPS = ("asyncio", "uvloop", "auto")
+
+
+def new_event_loop(setting: str) -> asyncio.AbstractEventLoop:
+    """Create the event loop selected by ``setting``.
+
+    - asyncio: the default asyncio loop
+    - uvloop:  uvloop; raises RuntimeError if it is not installed
+    - auto:    uvloop if installed, asyncio otherwise
+    """
+    if setting not in EVENT_LOOPS:
+        raise ValueError(
+            f"Invalid server.event_loop {setting!r}, expected one of {EVENT_LOOPS}"
+        )
+    if setting != "asyncio":
+        try:
+            import uvloop
+        except ImportError:
+            if setting == "uvloop":
+                raise RuntimeError(
+                    "server.event_loop is 'uvloop' but uvloop is not installed"
+                ) from None
+        else:
+            log.info("Using uvloop event loop (uvloop %s)", uvloop.__version__)
+            return uvloop.new_event_loop()
+    log.info("Using asyncio event loop")
+    return asyncio.new_event_loop()
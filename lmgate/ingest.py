@@ -0,0 +1,108 @@
+"""Follow the stats file and hand new records to in-process consumers.
+
+nginx writes completed requests straight to the stats file (stats.js
+appends one JSON line per response); lmgate never sees them over HTTP.
+State that depends on completions (in-flight slots, ...) is therefore fed
+by tailing that file:
+
+- Following starts at the current end of the file; older records were
+  already accounted for by the previous process (or never will be).
+- The file is re-checked by inode on every poll. When it was rotated or
+  removed, the rest of the old file is read from the still-open descriptor
+  before the new file is opened from its start. A file that shrank in
+  place (truncated) is read again from its start.
+- A trailing partial line is kept until its newline arrives, so a record
+  is never parsed while nginx is still appending it.
+
+stats.js appends a record before sending the last chunk of the response,
+so by the time a client has seen a complete response, its record is
+already in the file.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import IO, Any
+
+log = logging.getLogger(__name__)
+
+_READ_BYTES = 1024 * 1024
+
+
+class StatsFollower:
+    """Incremental reader of newly appended stats records."""
+
+    def __init__(self, path: str | Path) -> None:
+        self._path = Path(path)
+        self._file: IO[bytes] | None = None
+        self._inode: int | None = None
+        self._partial = b""
+
+    def open(self) -> None:
+        """Start following at the current end of the file (if it exists)."""
+        if self._open_current():
+            assert self._file is not None
+            self._file.seek(0, os.SEEK_END)
+
+    def poll(self) -> list[dict[str, Any]]:
+        """Records appended since the last poll, oldest first."""
+        if self._file is None:
+            # Not created yet when following started: read it from the start.
+            if not self._open_current():
+                return []
+            return self._read()
+        try:
+            stat = self._path.stat()
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and stat.st_ino == self._inode:
+            if stat.st_size < self._file.tell():
+                log.info("Stats file %s was truncated; reading from start", self._path)
+                self._file.seek(0)
+                self._partial = b""
+            return self._read()
+        # Rotated or removed: drain the old file, then switch to the new one.
+        records = self._read()
+        self.close()
+        if self._open_current():
+            records.extend(self._read())
+        return records
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._inode = None
+        self._partial = b""
+
+    def _open_current(self) -> bool:
+        try:
+            self._file = open(self._path, "rb")
+        except FileNotFoundError:
+            return False
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        return True
+
+    def _read(self) -> list[dict[str, Any]]:
+        assert self._file is not None
+        records: list[dict[str, Any]] = []
+        while True:
+            chunk = self._file.read(_READ_BYTES)
+            if not chunk:
+                break
+            lines = (self._partial + chunk).split(b"\n")
+            self._partial = lines.pop()
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    log.debug("Skipping malformed stats line: %r", line[:200])
+                    continue
+                if isinstance(record, dict):
+                    records.append(record)
+        return records
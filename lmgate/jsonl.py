@@ -0,0 +1,205 @@
+"""Memory-mapped columnar reader for stats JSONL segments.
+
+Stats records are flat JSON objects (scalar values only), which allows a
+reader that never runs a full ``json.loads`` per line:
+
+- Segments are memory-mapped (``.gz`` segments are decompressed into
+  memory) and line boundaries are found with ``bytes.find``.
+- Equality filters are pushed down to the bytes: a compiled pattern such as
+  ``"lmgate_id":\\s?"7"`` is searched over the whole buffer, so lines
+  that cannot match are skipped without being sliced or decoded. Both the
+  compact (njs) and the ``": "`` (Python json) separators match.
+- Only the requested fields are extracted, with one regex pass per line,
+  and only their values are decoded.
+
+Rows are yielded in batches of columns (``{field: [values...]}``) ready for
+aggregation. Lines that are not complete JSON objects (e.g. a torn last
+line) are skipped.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import mmap
+import re
+from collections.abc import Collection, Iterator, Mapping, Sequence
+from pathlib import Path
+from typing import Any
+
+Columns = dict[str, list[Any]]
+
+BATCH_ROWS = 8192
+# Decoded values are cached per field until a field has this many distinct
+# values (providers, models, ids and statuses repeat; timestamps do not).
+_CACHE_LIMIT = 4096
+_MISSING = object()
+
+# A JSON scalar: string (with escapes), number, true, false or null.
+_VALUE = rb'("(?:[^"\\]|\\.)*"|[^,}\s]+)'
+
+
+def _decode(raw: bytes) -> Any:
+    if raw[:1] == b'"':
+        if b"\\" in raw:
+            return json.loads(raw)
+        return raw[1:-1].decode()
+    if raw == b"null":
+        return None
+    if raw == b"true":
+        return True
+    if raw == b"false":
+        return False
+    try:
+        return int(raw)
+    except ValueError:
+        return float(raw)
+
+
+def _encoded(value: Any) -> list[bytes]:
+    """Byte forms a value can take in a line (ASCII-escaped or raw UTF-8)."""
+    forms = [json.dumps(value).encode()]
+    raw = json.dumps(value, ensure_ascii=False).encode()
+    if raw != forms[0]:
+        forms.append(raw)
+    return forms
+
+
+def field_pattern(field: str, values: Collection[Any]) -> re.Pattern[bytes]:
+    """Pattern matching ``"field": <one of values>`` in a line."""
+    alternatives = b"|".join(
+        re.escape(form) for value in values for form in _encoded(value)
+    )
+    return re.compile(
+        rb'"'
+        + re.escape(field.encode())
+        + rb'":\s?(?:'
+        + alternatives
+        + rb")(?=[,}\s])"
+    )
+
+
+def _fields_pattern(fields: Sequence[str]) -> re.Pattern[bytes]:
+    names = b"|".join(re.escape(f.encode()) for f in fields)
+    return re.compile(rb'"(' + names + rb')":\s*' + _VALUE)
+
+
+def _load(path: Path) -> tuple[Any, Any]:
+    """(buffer, closer) for a segment; the buffer supports find/slicing."""
+    if path.suffix == ".gz":
+        with gzip.open(path, "rb") as compressed:
+            return compressed.read(), None
+    with open(path, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return b"", None
+    return buf, buf
+
+
+def _line_starts(buf: Any, start: int, end: int) -> Iterator[tuple[int, int]]:
+    """(start, end) of each line starting in [start, end)."""
+    pos = buf.find(b"\n", start - 1) + 1 if start else 0
+    if start and pos == 0:
+        return
+    while pos < end:
+        nl = buf.find(b"\n", pos)
+        if nl == -1:
+            nl = len(buf)
+        yield pos, nl
+        pos = nl + 1
+
+
+def _matching_lines(
+    buf: Any, start: int, end: int, pattern: re.Pattern[bytes]
+) -> Iterator[tuple[int, int]]:
+    """Lines starting in [start, end) that contain a match for ``pattern``."""
+    first = buf.find(b"\n", start - 1) + 1 if start else 0
+    if start and first == 0:
+        return
+    pos = first
+    while True:
+        match = pattern.search(buf, pos)
+        if match is None:
+            return
+        line_start = buf.rfind(b"\n", 0, match.start()) + 1
+        if line_start >= end:
+            return
+        line_end = buf.find(b"\n", match.end())
+        if line_end == -1:
+            line_end = len(buf)
+        yield line_start, line_end
+        pos = line_end + 1
+
+
+def read_columns(
+    path: str | Path,
+    fields: Sequence[str],
+    equals: Mapping[str, Collection[Any]] | None = None,
+    start: int = 0,
+    end: int | None = None,
+    batch_rows: int = BATCH_ROWS,
+) -> Iterator[Columns]:
+    """Yield column batches of ``fields`` for matching lines of a segment.
+
+    ``equals`` maps a field to the values it may take; all filters must
+    match. ``start``/``end`` restrict the scan to lines starting in that
+    byte range (for splitting one segment across processes); compressed
+    segments are always read whole. Missing fields are None.
+    """
+    filters = {f: v for f, v in (equals or {}).items() if v}
+    wanted = list(dict.fromkeys([*fields, *filters]))
+    extract = _fields_pattern(wanted)
+    patterns = [field_pattern(f, v) for f, v in filters.items()]
+    # Search the buffer for one filter; check the others per line.
+    driver = patterns[0] if patterns else None
+    others = patterns[1:]
+    allowed = [(f.encode(), set(v)) for f, v in filters.items()]
+    keys = [f.encode() for f in fields]
+    caches: dict[bytes, dict[bytes, Any]] = {f.encode(): {} for f in wanted}
+
+    buf, closer = _load(Path(path))
+    try:
+        if Path(path).suffix == ".gz":
+            start, stop = 0, len(buf)
+        else:
+            stop = len(buf) if end is None else min(end, len(buf))
+        lines = (
+            _matching_lines(buf, start, stop, driver)
+            if driver is not None
+            else _line_starts(buf, start, stop)
+        )
+        columns: Columns = {f: [] for f in fields}
+        rows = 0
+        for line_start, line_end in lines:
+            line = buf[line_start:line_end].rstrip()
+            if line[:1] != b"{" or line[-1:] != b"}":
+                continue
+            if others and not all(p.search(line) for p in others):
+                continue
+            record: dict[bytes, Any] = {}
+            try:
+                for key, raw in extract.findall(line):
+                    cache = caches[key]
+                    value = cache.get(raw, _MISSING)
+                    if value is _MISSING:
+                        value = _decode(raw)
+                        if len(cache) < _CACHE_LIMIT:
+                            cache[raw] = value
+                    record[key] = value
+            except ValueError:
+                continue
+            if allowed and not all(record.get(f) in v for f, v in allowed):
+                continue
+            for f, key in zip(fields, keys):
+                columns[f].append(record.get(key))
+            rows += 1
+            if rows >= batch_rows:
+                yield columns
+                columns = {f: [] for f in fields}
+                rows = 0
+        if rows:
+            yield columns
+    finally:
+        if closer is not None:
+            closer.close()
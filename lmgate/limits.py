@@ -0,0 +1,71 @@
+"""Per-key in-flight request tracking and concurrency limits.
+
+A slot is acquired at /auth and released when the matching stats record
+is read back from the stats file (lmgate.ingest), where nginx appends one
+record per completed request. Slots whose completion never arrives (client
+abort before the last chunk, a record that failed to write) are reclaimed
+after a timeout.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+class InFlightTracker:
+    """Count in-flight requests per lmgate_id with timeout-based reclaim.
+
+    ``max_in_flight`` of 0 disables the ceiling; slots are still tracked so
+    the in-flight count stays observable.
+    """
+
+    def __init__(self, max_in_flight: int, timeout_seconds: float) -> None:
+        self._max_in_flight = max_in_flight
+        self._timeout = timeout_seconds
+        # Slot start times (monotonic) per id, oldest first.
+        self._slots: dict[str, deque[float]] = {}
+
+    def acquire(self, lmgate_id: str) -> bool:
+        """Take a slot for lmgate_id. Returns False if the ceiling is reached."""
+        now = time.monotonic()
+        slots = self._slots.get(lmgate_id)
+        if slots is None:
+            slots = self._slots[lmgate_id] = deque()
+        else:
+            self._reclaim(lmgate_id, slots, now)
+        if self._max_in_flight and len(slots) >= self._max_in_flight:
+            return False
+        slots.append(now)
+        return True
+
+    def release(self, lmgate_id: str | None) -> None:
+        """Release the oldest slot held by lmgate_id, if any."""
+        if not lmgate_id:
+            return
+        slots = self._slots.get(lmgate_id)
+        if not slots:
+            return
+        slots.popleft()
+        if not slots:
+            del self._slots[lmgate_id]
+
+    def in_flight(self, lmgate_id: str) -> int:
+        """Current number of held slots for lmgate_id."""
+        slots = self._slots.get(lmgate_id)
+        return len(slots) if slots else 0
+
+    def _reclaim(self, lmgate_id: str, slots: deque[float], now: float) -> None:
+        """Drop slots older than the timeout (completion never arrived)."""
+        deadline = now - self._timeout
+        reclaimed = 0
+        while slots and slots[0] <= deadline:
+            slots.popleft()
+            reclaimed += 1
+        if reclaimed:
+            log.debug(
+                "Reclaimed %d stale in-flight slots for id=%s", reclaimed, lmgate_id
+            )
@@ -0,0 +1,125 @@
+"""Event loop lag sampling and blocked-loop detection.
+
+A sampler task sleeps for a fixed interval and records how late it wakes
+up; that delay is time the loop spent running something else. A watchdog
+thread notices when the sampler has not ticked for longer than the warning
+threshold and logs the loop thread's current stack, which names the
+callback or handler that is blocking /auth.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from lmgate.metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+_LAG_SECONDS = REGISTRY.histogram(
+    "lmgate_event_loop_lag_seconds",
+    "Delay between scheduled and actual wake-up of the loop lag sampler",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+_LAG_QUANTILES = REGISTRY.gauge(
+    "lmgate_event_loop_lag_quantile_seconds",
+    "Event loop lag percentiles over the recent sample window",
+    ("quantile",),
+)
+_SLOW = REGISTRY.counter(
+    "lmgate_event_loop_slow_total",
+    "Lag samples at or above the warning threshold",
+)
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+_QUANTILES = ((0.5, "0.5"), (0.9, "0.9"), (0.99, "0.99"))
+_QUANTILE_EVERY = 20  # recompute percentiles every N samples
+
+
+class LoopLagMonitor:
+    """Loop lag sampler plus a watchdog thread for blocked-loop stacks."""
+
+    def __init__(
+        self, interval: float, warn_threshold: float, window: int = 1000
+    ) -> None:
+        self._interval = interval
+        self._warn_threshold = warn_threshold
+        self._samples: deque[float] = deque(maxlen=window)
+        self._last_tick = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._stop = threading.Event()
+        self._watchdog: threading.Thread | None = None
+        self._reported_tick: float | None = None
+
+    def start(self) -> asyncio.Task[None]:
+        """Start the sampler on the running loop and the watchdog thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._watchdog = threading.Thread(
+            target=self._watch, name="lmgate-loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+        return asyncio.create_task(self._sample())
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._watchdog is not None:
+            self._watchdog.join()
+
+    def percentile(self, q: float) -> float:
+        """Lag percentile (0..1) over the recent sample window."""
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    async def _sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        count = 0
+        while True:
+            expected = loop.time() + self._interval
+            await asyncio.sleep(self._interval)
+            self._last_tick = time.monotonic()
+            lag = max(0.0, loop.time() - expected)
+            self._samples.append(lag)
+            _LAG_SECONDS.observe(lag)
+            if lag >= self._warn_threshold:
+                _SLOW.inc()
+                log.warning("Event loop lag %.3fs", lag)
+            count += 1
+            if count % _QUANTILE_EVERY == 0:
+                for q, label in _QUANTILES:
+                    _LAG_QUANTILES.set(self.percentile(q), label)
+
+    def _watch(self) -> None:
+        """Watchdog thread: dump the loop thread's stack while it is blocked."""
+        limit = self._interval + self._warn_threshold
+        while not self._stop.wait(self._interval):
+            last_tick = self._last_tick
+            blocked_for = time.monotonic() - last_tick
+            if blocked_for < limit or self._reported_tick == last_tick:
+                continue
+            self._reported_tick = last_tick
+            frame = sys._current_frames().get(self._loop_thread_id or 0)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            # Attribute the stall to the innermost lmgate frame if there is one.
+            origin = next(
+                (f for f in reversed(stack) if f.filename.startswith(_PACKAGE_DIR)),
+                stack[-1],
+            )
+            log.warning(
+                "Event loop blocked for %.3fs in %s (%s:%d)\n%s",
+                blocked_for,
+                origin.name,
+                origin.filename,
+                origin.lineno or 0,
+                "".join(traceback.format_list(stack)),
+            )
@@ -0,0 +1,418 @@
+"""Render the nginx config and the njs provider table from the LMGate config.
+
+    python -m lmgate render-nginx [--config config/lmgate.yaml]
+        [--output nginx/nginx.conf] [--providers-js nginx/scripts/providers.js]
+        [--check]
+
+Every provider in ``providers`` gets an upstream block with a keepalive pool
+(one per target for routed providers) and three locations: ``<prefix>``
+(auth, then cache.route), and the internal ``/_direct/<name>/`` and
+``/_cached/<name>/`` it redirects to. Providers with ``retry.tries`` above
+1 also get ``proxy_next_upstream`` settings, or with
+``retry.backoff_seconds`` an ``error_page`` to ``@lmgate_retry``, where
+scripts/retry.js retries after a delay (settings in ``$lmgate_retry``).
+``--check`` compares instead of writing and exits 1 when a file is out of
+date.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any
+
+from lmgate.config import load_config
+from lmgate.providers import Provider, load_providers
+
+_HEADER = """\
+# Generated by `python -m lmgate render-nginx` from {source}.
+# Do not edit; change the config and render again.
+"""
+
+_MAIN = """\
+load_module modules/ngx_http_js_module.so;
+
+worker_processes auto;
+error_log /var/log/nginx/error.log warn;
+
+events {{
+    worker_connections {worker_connections};
+}}
+
+http {{
+    js_path "/etc/nginx/scripts/";
+    js_import auth from scripts/auth.js;
+    js_import stats from scripts/stats.js;
+    js_import cache from scripts/cache.js;
+{retry_import}
+    # Set by cache.route: SHA-256 of the normalized body, "" when not cacheable
+    js_var $lmgate_body_hash;
+    # Set by cache.route: "1" when an identical request was already in flight
+    js_var $lmgate_follower;
+    # Set by cache.route for the first of identical requests; stats.js
+    # removes it from lmgate_inflight when the response completes
+    js_var $lmgate_inflight_key;
+
+    # Cache keys of requests being fetched upstream (singleflight). Entries
+    # of aborted requests expire after `timeout`.
+    js_shared_dict_zone zone=lmgate_inflight:1m timeout=10m evict;
+
+    # Exact-match response cache (see scripts/cache.js). max_size bounds the
+    # disk used (least recently used entries are evicted first); entries not
+    # read for `inactive` are removed even before proxy_cache_valid expires.
+    proxy_cache_path /var/cache/nginx/lmgate levels=1:2 keys_zone=lmgate_cache:10m
+                     max_size={max_size} inactive={inactive} use_temp_path=off;
+
+{access_log}
+    # Upstream: LMGate Python service
+    upstream lmgate {{
+        server {lmgate_server};
+    }}
+
+{upstreams}
+    server {{
+        listen 80;
+
+        # Keep request bodies in memory so cache.js can hash them.
+        client_body_buffer_size {client_body_buffer_size};
+        client_body_in_single_buffer on;
+
+        # Response cache settings, used by the /_cached/ locations.
+        proxy_cache_methods POST;
+        # $request_uri: the client path, the same for every routed target
+        proxy_cache_key "$request_uri|$lmgate_tenant|$lmgate_body_hash";
+        proxy_cache_valid 200 {valid};
+        proxy_cache_bypass $http_x_lmgate_cache_bypass;
+        proxy_ignore_headers Cache-Control Expires Set-Cookie Vary X-Accel-Expires;
+        # Singleflight: identical requests wait for the first one's response
+        # instead of going upstream. Waiters poll the cache every 500 ms.
+        proxy_cache_lock on;
+        proxy_cache_lock_timeout {lock_timeout};
+        proxy_cache_lock_age {lock_timeout};
+
+        # Auth subrequest endpoint (internal)
+        location = /_auth {{
+            internal;
+            proxy_pass http://lmgate/auth;
+            proxy_pass_request_body off;
+            proxy_set_header Content-Length "";
+            proxy_set_header X-Original-URI $request_uri;
+            proxy_set_header Authorization $http_authorization;
+            proxy_set_header X-Api-Key $http_x_api_key;
+        }}
+
+        # Stats endpoint (internal, used by njs)
+        location = /_stats {{
+            internal;
+            proxy_pass http://lmgate/stats;
+        }}
+{retry_location}{locations}
+        # Health check
+        location /healthz {{
+            proxy_pass http://lmgate/healthz;
+        }}
+
+        # JSON error responses
+        error_page 403 = @forbidden;
+        location @forbidden {{
+            default_type application/json;
+            return 403 '{{"error":"forbidden","message":"API key not authorized"}}';
+        }}
+
+        # Non-403 auth rejections (429 limits, 503 open circuits) surface as
+        # 500 from auth_request; map them back to the status /auth returned.
+        error_page 500 = @auth_error;
+        location @auth_error {{
+            default_type application/json;
+            add_header Retry-After $lmgate_retry_after always;
+            if ($lmgate_auth_status = 429) {{
+                return 429 '{{"error":"rate_limited","reason":"$lmgate_reason"}}';
+            }}
+            if ($lmgate_auth_status = 503) {{
+                return 503 '{{"error":"unavailable","reason":"$lmgate_reason"}}';
+            }}
+            return 500 '{auth_error}';
+        }}
+    }}
+}}
+"""
+
+_AUTH_ERROR = '{"error":"internal_error","message":"Authorization service error"}'
+
+_RETRY_IMPORT = "    js_import retry from scripts/retry.js;\n"
+
+_RETRY_LOCATION = """
+        # Failed attempts of providers with retry.backoff_seconds: wait,
+        # then send the request upstream again (scripts/retry.js)
+        location @lmgate_retry {
+            js_content retry.again;
+            js_body_filter stats.accumulate;
+        }
+"""
+
+# Response status of each retry condition, for error_page. Connection
+# failures and bad headers both surface as 502, timeouts as 504.
+_RETRY_STATUSES = {
+    "error": 502,
+    "timeout": 504,
+    "invalid_header": 502,
+    "http_500": 500,
+    "http_502": 502,
+    "http_503": 503,
+    "http_504": 504,
+    "http_429": 429,
+}
+
+_ACCESS_LOG = """\
+    log_format main '$remote_addr - $remote_user [$time_local] "$request" '
+                    '$status $body_bytes_sent "$http_referer" '
+                    '"$http_user_agent"';
+    access_log /var/log/nginx/access.log main;
+"""
+
+_NO_ACCESS_LOG = """\
+    # Access logging off
+    access_log off;
+"""
+
+_LOCATIONS = """
+        # {name} provider ({host})
+        location {prefix} {{
+            auth_request /_auth;
+            auth_request_set $lmgate_id $upstream_http_x_lmgate_id;
+            auth_request_set $lmgate_auth_status $upstream_status;
+            auth_request_set $lmgate_reason $upstream_http_x_lmgate_reason;
+            auth_request_set $lmgate_retry_after $upstream_http_retry_after;
+            auth_request_set $lmgate_cache $upstream_http_x_lmgate_cache;
+            auth_request_set $lmgate_tenant $upstream_http_x_lmgate_tenant;
+            auth_request_set $lmgate_target $upstream_http_x_lmgate_target;
+            auth_request_set $lmgate_target_host $upstream_http_x_lmgate_target_host;
+            auth_request_set $lmgate_probe $upstream_http_x_lmgate_probe;
+            set $upstream_host {host};
+
+            # Picks /_cached{prefix} or /_direct{prefix} (scripts/cache.js)
+            js_content cache.route;
+        }}
+
+        location /_direct{prefix} {{
+            internal;
+{direct}
+            proxy_buffering off;
+
+            js_body_filter stats.accumulate;
+        }}
+
+        # Cacheable requests; buffered, so a miss is sent when complete
+        location /_cached{prefix} {{
+            internal;
+{cached}            proxy_set_header X-LMGate-Cache-Bypass "";
+            proxy_hide_header Set-Cookie;
+
+            proxy_cache lmgate_cache;
+            add_header X-LMGate-Cache $upstream_cache_status always;
+
+            # Hits fetch nothing upstream, so they have no followers
+            js_header_filter cache.headers;
+            js_body_filter stats.accumulate;
+        }}
+"""
+
+
+def _delayed(provider: Provider) -> bool:
+    retry = provider.retry
+    return retry["tries"] > 1 and retry["backoff_seconds"] > 0
+
+
+def _upstreams(provider: Provider) -> str:
+    # Delayed retries pick a server again for every attempt.
+    tries = 1 if _delayed(provider) else provider.retry["tries"]
+    if not provider.targets:
+        return _upstream(
+            provider.name, provider.host, provider.servers, provider.pool, tries
+        )
+    return "".join(
+        _upstream(t.upstream(provider.name), t.host, t.servers, provider.pool, tries)
+        for t in provider.targets
+    )
+
+
+def _upstream(
+    name: str, host: str, servers: tuple[str, ...], pool: dict[str, Any], tries: int
+) -> str:
+    lines = [f"    # Upstream: {name} ({host})"]
+    lines.append(f"    upstream {name} {{")
+    if len(servers) < tries:
+        # nginx tries each server entry at most once per request, so list
+        # the servers again to allow `tries` attempts. max_fails=0: a
+        # failed attempt must not take the (only) host out of rotation.
+        repeats = -(-tries // len(servers))
+        lines.append(f"        # Listed {repeats} times for retries")
+        lines += [
+            f"        server {server} max_fails=0;" for server in servers * repeats
+        ]
+    else:
+        lines += [f"        server {server};" for server in servers]
+    if pool["keepalive"]:
+        lines.append(f"        keepalive {pool['keepalive']};")
+        lines.append(f"        keepalive_requests {pool['keepalive_requests']};")
+        lines.append(f"        keepalive_timeout {pool['keepalive_timeout_seconds']}s;")
+    lines.append("    }")
+    return "\n".join(lines) + "\n"
+
+
+def _proxy(provider: Provider, location: str) -> str:
+    pool = provider.pool
+    scheme = "https" if provider.tls else "http"
+    host = provider.host
+    retry = provider.retry
+    lines = []
+    if _delayed(provider):
+        # First: `set` after a `rewrite ... break` would not run.
+        settings = (
+            retry["tries"],
+            retry["timeout_seconds"],
+            retry["backoff_seconds"],
+            retry["max_backoff_seconds"],
+        )
+        lines.append("# tries, timeout, backoff, max backoff (scripts/retry.js)")
+        lines.append(f'set $lmgate_retry "{" ".join(f"{v:g}" for v in settings)}";')
+    if provider.targets:
+        # Target picked by /auth; proxy_pass with a variable does not
+        # replace the location prefix, so strip it first.
+        host = "$lmgate_target_host"
+        lines.append(f"rewrite ^{location}{provider.prefix}(.*)$ /$1 break;")
+        lines.append(f"proxy_pass {scheme}://{provider.name}__$lmgate_target;")
+    else:
+        lines.append(f"proxy_pass {scheme}://{provider.name}/;")
+    if pool["keepalive"]:
+        lines.append("# Reuse pooled upstream connections")
+        lines.append("proxy_http_version 1.1;")
+        lines.append('proxy_set_header Connection "";')
+    if provider.tls:
+        lines.append("proxy_ssl_server_name on;")
+        lines.append(f"proxy_ssl_name {host};")
+        reuse = "on" if pool["ssl_session_reuse"] else "off"
+        lines.append(f"proxy_ssl_session_reuse {reuse};")
+    lines.append(f"proxy_set_header Host {host};")
+    lines.append(f"proxy_connect_timeout {pool['connect_timeout_seconds']}s;")
+    lines.append(f"proxy_send_timeout {pool['send_timeout_seconds']}s;")
+    lines.append(f"proxy_read_timeout {pool['read_timeout_seconds']}s;")
+    if _delayed(provider):
+        # Failed responses are not sent to the client but handed to
+        # @lmgate_retry, which redirects back here after the backoff.
+        statuses = sorted({_RETRY_STATUSES[c] for c in retry["on"]})
+        lines.append("# Retry failed attempts after a backoff (scripts/retry.js)")
+        lines.append("proxy_intercept_errors on;")
+        lines.append("recursive_error_pages on;")
+        lines.append(f"error_page {' '.join(map(str, statuses))} = @lmgate_retry;")
+    elif retry["tries"] > 1:
+        # Only before any response byte reached the client. non_idempotent:
+        # LLM calls are POSTs, which nginx does not retry otherwise.
+        lines.append("# Retry failed attempts (provider retry settings)")
+        lines.append(f"proxy_next_upstream {' '.join(retry['on'])} non_idempotent;")
+        lines.append(f"proxy_next_upstream_tries {retry['tries']};")
+        lines.append(f"proxy_next_upstream_timeout {retry['timeout_seconds']}s;")
+    lines.append(
+        "# Disable compression: njs js_body_filter cannot handle binary gzip data"
+    )
+    lines.append('proxy_set_header Accept-Encoding "identity";')
+    return "".join(f"            {line}\n" for line in lines)
+
+
+def render_nginx(config: dict[str, Any], source: str = "config/lmgate.yaml") -> str:
+    """The nginx.conf for ``config`` (with defaults applied)."""
+    providers = load_providers(config)
+    nginx = config["nginx"]
+    cache = config["cache"]
+    locations = "".join(
+        _LOCATIONS.format(
+            name=p.name,
+            host=p.host,
+            prefix=p.prefix,
+            direct=_proxy(p, "/_direct"),
+            cached=_proxy(p, "/_cached"),
+        )
+        for p in providers
+    )
+    delayed = any(_delayed(p) for p in providers)
+    return _HEADER.format(source=source) + _MAIN.format(
+        worker_connections=nginx["worker_connections"],
+        retry_import=_RETRY_IMPORT if delayed else "",
+        retry_location=_RETRY_LOCATION if delayed else "",
+        auth_error=_AUTH_ERROR,
+        access_log=_ACCESS_LOG if nginx["access_log"] else _NO_ACCESS_LOG,
+        lmgate_server=nginx["lmgate_server"],
+        client_body_buffer_size=nginx["client_body_buffer_size"],
+        max_size=cache["max_size"],
+        inactive=cache["inactive"],
+        valid=cache["valid"],
+        lock_timeout=cache["lock_timeout"],
+        upstreams="".join(_upstreams(p) for p in providers),
+        locations=locations,
+    )
+
+
+def render_providers_js(
+    config: dict[str, Any], source: str = "config/lmgate.yaml"
+) -> str:
+    """The njs module mapping upstream hosts to response field paths."""
+    lines = [
+        _HEADER.format(source=source).replace("# ", "// "),
+        "// Upstream host -> provider name and response field paths (stats.js).",
+        "export default {",
+    ]
+    providers = load_providers(config)
+    for i, p in enumerate(providers):
+        entry = {
+            "name": p.name,
+            "input": list(p.input_path),
+            "output": list(p.output_path),
+            "model": list(p.model_path),
+            "streaming": list(p.streaming),
+        }
+        comma = "," if i < len(providers) - 1 else ""
+        lines.append(f"    {json.dumps(p.host)}: {json.dumps(entry)}{comma}")
+    lines.append("};")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m lmgate render-nginx",
+        description="Render nginx.conf and providers.js from the LMGate config.",
+    )
+    parser.add_argument("--config", type=Path, default=Path("config/lmgate.yaml"))
+    parser.add_argument(
+        "--output", type=Path, help="nginx.conf to write (default: stdout)"
+    )
+    parser.add_argument("--providers-js", type=Path, help="providers.js to write")
+    parser.add_argument(
+        "--check", action="store_true", help="exit 1 if the files are out of date"
+    )
+    args = parser.parse_args(argv)
+    if args.check and not (args.output or args.providers_js):
+        parser.error("--check needs --output or --providers-js")
+
+    try:
+        config = load_config(args.config)
+        rendered = {args.output: render_nginx(config, str(args.config))}
+        if args.providers_js:
+            rendered[args.providers_js] = render_providers_js(config, str(args.config))
+    except ValueError as e:
+        parser.error(str(e))
+
+    stale = []
+    for path, text in rendered.items():
+        if path is None:
+            if not args.check:
+                sys.stdout.write(text)
+        elif args.check:
+            if not path.exists() or path.read_text() != text:
+                stale.append(path)
+        else:
+            path.write_text(text)
+    for path in stale:
+        print(f"{path} is out of date; run render-nginx", file=sys.stderr)
+    return 1 if stale else 0
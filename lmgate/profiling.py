@@ -0,0 +1,77 @@
+"""On-demand profiling of the live process (admin.profiling_enabled).
+
+Two modes, both profiling the event loop thread for a fixed duration:
+
+- sampling:      a background thread samples the loop thread's stack at a
+                 fixed interval; output is collapsed stacks
+                 (``frame;frame;frame count`` per line, flamegraph input)
+- deterministic: cProfile on the loop thread; output is pstats text sorted
+                 by cumulative time
+"""
+
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+
+MODES = ("sampling", "deterministic")
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Sample one thread's stack at a fixed interval from another thread."""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stacks: Counter[str] = Counter()
+
+    def run(self, seconds: float) -> None:
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                labels = []
+                current: FrameType | None = frame
+                while current is not None:
+                    labels.append(_frame_label(current))
+                    current = current.f_back
+                self._stacks[";".join(reversed(labels))] += 1
+            time.sleep(self._interval)
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, most frequent first."""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self._stacks.most_common()
+        )
+
+
+async def profile_sampling(seconds: float, interval: float) -> str:
+    """Sample the calling (event loop) thread for ``seconds``."""
+    sampler = StackSampler(threading.get_ident(), interval)
+    await asyncio.to_thread(sampler.run, seconds)
+    return sampler.collapsed()
+
+
+async def profile_deterministic(seconds: float) -> str:
+    """Run cProfile on the event loop thread for ``seconds``."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats()
+    return out.getvalue()
@@ -1,24 +1,253 @@
-"""Provider detection and per-provider response parsing.
+"""Provider registry, detection and per-provider response parsing.
+
+Providers are declared under ``providers`` in the config (see
+``config._DEFAULTS``); each names the upstream host, the path prefix
+clients use, and dotted paths to the token counts and model in a response:
 
-Token extraction mapping per design document:
 - OpenAI:   usage.prompt_tokens / usage.completion_tokens
 - Anthropic: usage.input_tokens / usage.output_tokens
 - Google:   usageMetadata.promptTokenCount / usageMetadata.candidatesTokenCount
+
+The same declarations generate the nginx config and the njs parser table
+(``lmgate.nginxconf``), so a provider is added in one place.
 """
 
 from __future__ import annotations
 
 import json
 import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+from lmgate.config import apply_defaults
 
 log = logging.getLogger(__name__)
 
-_HOST_TO_PROVIDER = {
-    "api.openai.com": "openai",
-    "api.anthropic.com": "anthropic",
-    "aiplatform.googleapis.com": "google",
+STREAMING_FORMATS = ("sse", "json-array")
+
+_PROVIDER_DEFAULTS: dict[str, Any] = {
+    "model": "model",
+    "streaming": ["sse"],
+    # host:port entries; empty: the provider host on 443 (tls) or 80.
+    "servers": [],
+    "tls": True,
 }
 
+_POOL_DEFAULTS: dict[str, Any] = {
+    "keepalive": 32,
+    "keepalive_requests": 1000,
+    "keepalive_timeout_seconds": 60,
+    "ssl_session_reuse": True,
+    "connect_timeout_seconds": 10,
+    "send_timeout_seconds": 60,
+    "read_timeout_seconds": 600,
+}
+
+# Retries of a failed upstream attempt; only possible before any of the
+# response has been sent to the client. Immediate (nginx
+# proxy_next_upstream) without backoff_seconds, delayed by njs with it.
+_RETRY_DEFAULTS: dict[str, Any] = {
+    "tries": 1,
+    # http_429 is opt-in: an immediate retry would hit the limit again.
+    "on": ["error", "http_502", "http_503"],
+    "timeout_seconds": 30,
+    "backoff_seconds": 0,
+    "max_backoff_seconds": 10,
+}
+# Each delayed retry costs nginx two internal redirects, of which a request
+# may make 10 in all.
+MAX_DELAYED_TRIES = 5
+RETRY_CONDITIONS = (
+    "error",
+    "timeout",
+    "invalid_header",
+    "http_500",
+    "http_502",
+    "http_503",
+    "http_504",
+    "http_429",
+)
+
+_NAME_RE = re.compile(r"^[a-z][a-z0-9_]*$")
+
+
+@dataclass(frozen=True)
+class Target:
+    """One of several equivalent endpoints of a provider (``targets``)."""
+
+    name: str
+    host: str
+    servers: tuple[str, ...]
+    weight: float
+
+    def upstream(self, provider: str) -> str:
+        """Name of the nginx upstream block for this target."""
+        return f"{provider}__{self.name}"
+
+
+@dataclass(frozen=True)
+class Provider:
+    """One upstream LLM API, as declared in the config."""
+
+    name: str
+    host: str
+    prefix: str
+    input_path: tuple[str, ...]
+    output_path: tuple[str, ...]
+    model_path: tuple[str, ...]
+    streaming: tuple[str, ...]
+    servers: tuple[str, ...]
+    tls: bool
+    pool: dict[str, Any] = field(default_factory=dict)
+    # Routed providers: lmgate picks one per request (lmgate.routing).
+    targets: tuple[Target, ...] = ()
+    # tries (1: no retries), on (RETRY_CONDITIONS), timeout_seconds,
+    # backoff_seconds (0: immediate retries), max_backoff_seconds
+    retry: dict[str, Any] = field(default_factory=dict)
+
+
+def _path(value: Any, what: str) -> tuple[str, ...]:
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"{what} must be a dotted field path")
+    return tuple(value.split("."))
+
+
+def _as_list(value: Any) -> list[str]:
+    # Env overrides arrive as "a,b" strings.
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    return list(value or [])
+
+
+def _servers(spec: dict[str, Any], host: str, tls: bool) -> tuple[str, ...]:
+    return tuple(_as_list(spec.get("servers")) or [f"{host}:{443 if tls else 80}"])
+
+
+def _targets(what: str, raw: Any, tls: bool) -> tuple[Target, ...]:
+    targets = []
+    for name, spec in (raw or {}).items():
+        if spec is None:
+            continue
+        if not _NAME_RE.match(name):
+            raise ValueError(f"{what}: target name must match {_NAME_RE.pattern}")
+        host = spec.get("host")
+        if not host or not isinstance(host, str):
+            raise ValueError(f"{what}: target {name!r} needs a 'host'")
+        weight = float(spec.get("weight", 1))
+        if weight <= 0:
+            raise ValueError(f"{what}: target {name!r} weight must be positive")
+        targets.append(Target(name, host, _servers(spec, host, tls), weight))
+    return tuple(targets)
+
+
+def _retry(what: str, raw: Any) -> dict[str, Any]:
+    raw = dict(raw or {})
+    if True in raw:
+        # YAML 1.1 reads an unquoted `on:` key as true.
+        raw["on"] = raw.pop(True)
+    retry = {**_RETRY_DEFAULTS, **raw}
+    tries = int(retry["tries"])
+    if tries < 1:
+        raise ValueError(f"{what}: retry.tries must be at least 1")
+    on = _as_list(retry["on"])
+    unknown = set(on) - set(RETRY_CONDITIONS)
+    if unknown:
+        raise ValueError(f"{what}: unknown retry condition {sorted(unknown)}")
+    backoff = float(retry["backoff_seconds"])
+    max_backoff = float(retry["max_backoff_seconds"])
+    if backoff < 0 or max_backoff < backoff:
+        raise ValueError(
+            f"{what}: retry.backoff_seconds must be between 0 and max_backoff_seconds"
+        )
+    if backoff and tries > MAX_DELAYED_TRIES:
+        raise ValueError(
+            f"{what}: retry.tries above {MAX_DELAYED_TRIES} needs backoff_seconds 0"
+        )
+    return {
+        **retry,
+        "tries": tries,
+        "on": on,
+        "backoff_seconds": backoff,
+        "max_backoff_seconds": max_backoff,
+    }
+
+
+def load_providers(config: dict[str, Any]) -> list[Provider]:
+    """Validate ``config["providers"]``; raises ValueError on a bad entry.
+
+    A provider set to null is left out, so a config file can drop a default.
+    """
+    providers = []
+    hosts: set[str] = set()
+    prefixes: set[str] = set()
+    for name, raw in (config.get("providers") or {}).items():
+        if raw is None:
+            continue
+        what = f"provider {name!r}"
+        if not _NAME_RE.match(name):
+            raise ValueError(f"{what}: name must match {_NAME_RE.pattern}")
+        spec = {**_PROVIDER_DEFAULTS, **raw}
+        host = spec.get("host")
+        if not host or not isinstance(host, str):
+            raise ValueError(f"{what}: 'host' is required")
+        prefix = spec.get("prefix") or f"/{name}/"
+        if not (prefix.startswith("/") and prefix.endswith("/")) or prefix == "/":
+            raise ValueError(f"{what}: prefix must look like /name/")
+        if host in hosts or prefix in prefixes:
+            raise ValueError(f"{what}: host and prefix must be unique")
+        hosts.add(host)
+        prefixes.add(prefix)
+        usage = spec.get("usage") or {}
+        streaming = _as_list(spec["streaming"])
+        unknown = set(streaming) - set(STREAMING_FORMATS)
+        if unknown:
+            raise ValueError(f"{what}: unknown streaming format {sorted(unknown)}")
+        tls = bool(spec["tls"])
+        providers.append(
+            Provider(
+                name=name,
+                host=host,
+                prefix=prefix,
+                input_path=_path(usage.get("input"), f"{what}: usage.input"),
+                output_path=_path(usage.get("output"), f"{what}: usage.output"),
+                model_path=_path(spec["model"], f"{what}: model"),
+                streaming=tuple(streaming),
+                servers=_servers(spec, host, tls),
+                tls=tls,
+                pool={**_POOL_DEFAULTS, **(spec.get("pool") or {})},
+                targets=_targets(what, spec.get("targets"), tls),
+                retry=_retry(what, spec.get("retry")),
+            )
+        )
+    return providers
+
+
+_BY_NAME: dict[str, Provider] = {}
+_HOST_TO_PROVIDER: dict[str, str] = {}
+
+
+def configure(providers: list[Provider]) -> None:
+    """Make ``providers`` the set used for detection and parsing."""
+    _BY_NAME.clear()
+    _BY_NAME.update((p.name, p) for p in providers)
+    _HOST_TO_PROVIDER.clear()
+    _HOST_TO_PROVIDER.update((p.host, p.name) for p in providers)
+
+
+configure(load_providers(apply_defaults({})))
+
+
+def provider_for_uri(uri: str) -> Provider | None:
+    """The provider whose prefix starts a client request URI."""
+    best = None
+    for provider in _BY_NAME.values():
+        if uri.startswith(provider.prefix) and (
+            best is None or len(provider.prefix) > len(best.prefix)
+        ):
+            best = provider
+    return best
+
 
 def detect_provider(host: str) -> str:
     """Detect LLM provider from the upstream host string."""
@@ -27,15 +256,26 @@ def detect_provider(host: str) -> str:
     return _HOST_TO_PROVIDER.get(host, "unknown")
 
 
-def _parse_json(body: str) -> dict | None:
-    """Try to parse body as JSON. For SSE, try to find JSON in the last data: line."""
+def _parse_json(body: str, streaming: tuple[str, ...] = ("sse",)) -> Any:
+    """Parse body as JSON, or the last event of a streamed body.
+
+    ``sse``: the last ``data: {...}`` line. ``json-array``: a JSON array of
+    chunks (Google's non-SSE streaming), of which the last object counts.
+    """
     if not body:
         return None
     # Try direct JSON parse first
     try:
-        return json.loads(body)
+        parsed = json.loads(body)
     except (json.JSONDecodeError, ValueError):
-        pass
+        parsed = None
+    else:
+        if isinstance(parsed, list) and "json-array" in streaming:
+            chunks = [c for c in parsed if isinstance(c, dict)]
+            return chunks[-1] if chunks else None
+        return parsed
+    if "sse" not in streaming:
+        return None
     # Try SSE: find last `data: {...}` line
     last_json = None
     for line in body.split("\n"):
@@ -48,40 +288,32 @@ def _parse_json(body: str) -> dict | None:
     return last_json
 
 
+def _get(obj: Any, path: tuple[str, ...]) -> Any:
+    for part in path:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(part)
+    return obj
+
+
 def extract_tokens(provider: str, response_body: str) -> tuple[int | None, int | None]:
     """Extract input/output token counts from a response body for the given provider."""
-    parsed = _parse_json(response_body)
+    spec = _BY_NAME.get(provider)
+    if spec is None:
+        return None, None
+    parsed = _parse_json(response_body, spec.streaming)
     if parsed is None:
         return None, None
+    return _get(parsed, spec.input_path), _get(parsed, spec.output_path)
 
-    try:
-        if provider == "openai":
-            usage = parsed.get("usage")
-            if not usage:
-                return None, None
-            return usage.get("prompt_tokens"), usage.get("completion_tokens")
-
-        if provider == "anthropic":
-            usage = parsed.get("usage")
-            if not usage:
-                return None, None
-            return usage.get("input_tokens"), usage.get("output_tokens")
-
-        if provider == "google":
-            meta = parsed.get("usageMetadata")
-            if not meta:
-                return None, None
-            return meta.get("promptTokenCount"), meta.get("candidatesTokenCount")
-
-    except (AttributeError, TypeError):
-        log.debug("Failed to extract tokens for provider=%s", provider)
 
-    return None, None
+def extract_model(response_body: str, provider: str | None = None) -> str | None:
+    """Extract the model name from a response body.
 
-
-def extract_model(response_body: str) -> str | None:
-    """Extract model name from a response body (common field across providers)."""
-    parsed = _parse_json(response_body)
-    if parsed is None:
-        return None
-    return parsed.get("model")
+    Without a known ``provider``, the top-level ``model`` field is used.
+    """
+    spec = _BY_NAME.get(provider) if provider else None
+    if spec is None:
+        parsed = _parse_json(response_body)
+        return parsed.get("model") if isinstance(parsed, dict) else None
+    return _get(_parse_json(response_body, spec.streaming), spec.model_path)
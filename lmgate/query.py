@@ -0,0 +1,502 @@
+"""`python -m lmgate query`: filter and aggregate stats JSONL segments.
+
+Segments are the live stats file, its rotations (``stats.jsonl.<ts>``)
+and gzip-compressed copies of any of them (``*.gz``). Work is planned in three steps:
+
+1. Segment skipping: when a time range is given, each segment's first and
+   last timestamps are read (first/last line for plain files; first line
+   and the rotation suffix for .gz) and segments outside the range are
+   never opened for scanning.
+2. Splitting: plain segments are cut into newline-aligned byte ranges so a
+   single large file is scanned by several processes. Compressed segments
+   are one task each.
+3. Parallel scan: tasks run in a process pool and read only the needed
+   columns through ``lmgate.jsonl`` (id/provider/model filters are pushed
+   down to byte patterns); each returns partial aggregates per group,
+   which are merged in the parent.
+
+With ``--rollup 1m|1h`` the minute/hour rollup files written by
+``lmgate.rollups`` are read instead: each row carries a request count for
+its bucket, so long ranges aggregate thousands of rows rather than
+millions of raw records. Grouping is then limited to the rollup key
+fields and time buckets. With ``--db`` the query runs as indexed SQL
+against the SQLite stats database (``lmgate.statsdb``), touching only the
+month tables in range.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import sys
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import IO, Any
+
+from lmgate.config import load_config
+from lmgate.jsonl import read_columns
+from lmgate.rollups import KEY_FIELDS, RESOLUTIONS, ROLLUP_DIR
+from lmgate.statsdb import month_tables, table_name
+
+GROUP_FIELDS = (
+    "provider",
+    "model",
+    "lmgate_id",
+    "masked_key",
+    "endpoint",
+    "status",
+    "cache_status",
+    "target",
+    "hour",
+    "day",
+    "month",
+)
+# Timestamp prefix lengths for time buckets ("2026-02-16T12:00:00.000Z").
+_TIME_BUCKETS = {"hour": 13, "day": 10, "month": 7}
+METRICS = ("requests", "input_tokens", "output_tokens", "errors")
+ROLLUP_GROUP_FIELDS = (*KEY_FIELDS, *_TIME_BUCKETS)
+_ERROR_CLASSES = frozenset({"4xx", "5xx"})
+
+_CHUNK_BYTES = 32 * 1024 * 1024
+_TAIL_BYTES = 64 * 1024
+# Rotation suffixes are written in the server's local time; widen the bound
+# so a UTC offset can never cause a segment to be skipped wrongly.
+_SUFFIX_MARGIN = timedelta(days=1).total_seconds()
+
+
+@dataclass(frozen=True)
+class Query:
+    """Filters and grouping for one query."""
+
+    since: float | None = None
+    until: float | None = None
+    lmgate_ids: frozenset[str] = frozenset()
+    providers: frozenset[str] = frozenset()
+    models: frozenset[str] = frozenset()
+    group_by: tuple[str, ...] = ()
+    # Rollup resolution ("1m"/"1h") when reading rollup files.
+    rollup: str | None = None
+
+    @property
+    def time_field(self) -> str:
+        return "bucket" if self.rollup else "timestamp"
+
+
+@dataclass(frozen=True)
+class Task:
+    """A byte range of a plain segment, or a whole compressed segment."""
+
+    path: str
+    start: int = 0
+    end: int | None = None
+
+
+@dataclass
+class Plan:
+    tasks: list[Task] = field(default_factory=list)
+    scanned: list[Path] = field(default_factory=list)
+    skipped: list[Path] = field(default_factory=list)
+
+
+def parse_time(value: str) -> float:
+    """ISO-8601 timestamp or date to epoch seconds; naive values are UTC."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=UTC)
+    return parsed.timestamp()
+
+
+def _entry_time(entry: dict[str, Any]) -> float | None:
+    try:
+        return parse_time(entry["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _open_text(path: Path) -> IO[str]:
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def default_segments(stats_path: str | Path) -> list[Path]:
+    """The stats file plus its rotations, worker files and compressed copies."""
+    path = Path(stats_path)
+    return sorted(
+        p for p in path.parent.glob(f"{path.stem}*{path.suffix}*") if p.is_file()
+    )
+
+
+def rollup_segments(stats_path: str | Path, resolution: str) -> list[Path]:
+    """Rollup files of one resolution for the stats file and worker files."""
+    path = Path(stats_path)
+    return sorted(
+        p
+        for p in (path.parent / ROLLUP_DIR).glob(f"{path.stem}*.{resolution}.jsonl")
+        if p.is_file()
+    )
+
+
+def _first_timestamp(path: Path) -> float | None:
+    with _open_text(path) as f:
+        for line in f:
+            if line.strip():
+                try:
+                    return _entry_time(json.loads(line))
+                except json.JSONDecodeError:
+                    return None
+    return None
+
+
+def _last_timestamp(path: Path) -> float | None:
+    """Timestamp of the last complete line of a plain segment."""
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - _TAIL_BYTES))
+        lines = f.read().splitlines()
+    for line in reversed(lines):
+        try:
+            return _entry_time(json.loads(line))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+    return None
+
+
+def _suffix_time(path: Path) -> float | None:
+    """Rotation time from a ``stats.jsonl.<YYYYmmddHHMMSS>[.gz]`` name."""
+    name = path.name.removesuffix(".gz")
+    suffix = name.rsplit(".", 1)[-1]
+    try:
+        rotated = datetime.strptime(suffix, "%Y%m%d%H%M%S").replace(tzinfo=UTC)
+    except ValueError:
+        return None
+    return rotated.timestamp() + _SUFFIX_MARGIN
+
+
+def segment_bounds(path: Path) -> tuple[float | None, float | None]:
+    """First and last timestamps of a segment (None when unknown)."""
+    first = _first_timestamp(path)
+    if path.suffix == ".gz":
+        return first, _suffix_time(path)
+    return first, _last_timestamp(path)
+
+
+def _split(path: Path, chunk_bytes: int) -> list[Task]:
+    size = path.stat().st_size
+    if size <= chunk_bytes:
+        return [Task(str(path))]
+    return [
+        Task(str(path), start, min(start + chunk_bytes, size))
+        for start in range(0, size, chunk_bytes)
+    ]
+
+
+def plan(
+    segments: Iterable[Path], query: Query, chunk_bytes: int = _CHUNK_BYTES
+) -> Plan:
+    """Skip segments outside the query's time range and split the rest."""
+    result = Plan()
+    # Rollup files are small, and a late row can leave an older bucket on
+    # the last line, so they are never skipped.
+    timed = query.rollup is None and (
+        query.since is not None or query.until is not None
+    )
+    for path in segments:
+        if timed:
+            first, last = segment_bounds(path)
+            if (
+                query.until is not None and first is not None and first >= query.until
+            ) or (query.since is not None and last is not None and last < query.since):
+                result.skipped.append(path)
+                continue
+        result.scanned.append(path)
+        if path.suffix == ".gz":
+            result.tasks.append(Task(str(path)))
+        else:
+            result.tasks.extend(_split(path, chunk_bytes))
+    return result
+
+
+def _columns_for(query: Query) -> list[str]:
+    ts = query.time_field
+    names = [ts if name in _TIME_BUCKETS else name for name in query.group_by]
+    if query.since is not None or query.until is not None:
+        names.append(ts)
+    counts = ["requests", "status_class"] if query.rollup else ["status"]
+    return list(dict.fromkeys([*names, "input_tokens", "output_tokens", *counts]))
+
+
+def _in_range(ts: Any, query: Query) -> bool:
+    try:
+        t = parse_time(ts)
+    except (TypeError, ValueError):
+        return False
+    if query.since is not None and t < query.since:
+        return False
+    return query.until is None or t < query.until
+
+
+def scan(task: Task, query: Query) -> dict[tuple, list[int]]:
+    """Aggregate one task: group key -> [requests, input, output, errors]."""
+    fields = _columns_for(query)
+    equals = {
+        "lmgate_id": query.lmgate_ids,
+        "provider": query.providers,
+        "model": query.models,
+    }
+    timed = query.since is not None or query.until is not None
+    key_getters = [
+        (fields.index(query.time_field), _TIME_BUCKETS[name])
+        if name in _TIME_BUCKETS
+        else (fields.index(name), None)
+        for name in query.group_by
+    ]
+    ts_index = fields.index(query.time_field) if timed else -1
+    input_index = fields.index("input_tokens")
+    output_index = fields.index("output_tokens")
+    requests_index = fields.index("requests") if query.rollup else -1
+    status_index = fields.index("status_class" if query.rollup else "status")
+    groups: dict[tuple, list[int]] = {}
+    for columns in read_columns(task.path, fields, equals, task.start, task.end):
+        for row in zip(*(columns[f] for f in fields)):
+            if timed and not _in_range(row[ts_index], query):
+                continue
+            key = tuple(
+                str(row[i] or "")[:prefix] if prefix is not None else row[i]
+                for i, prefix in key_getters
+            )
+            totals = groups.get(key)
+            if totals is None:
+                totals = groups[key] = [0, 0, 0, 0]
+            totals[1] += row[input_index] or 0
+            totals[2] += row[output_index] or 0
+            status = row[status_index]
+            if query.rollup:
+                requests = row[requests_index] or 0
+                totals[0] += requests
+                if status in _ERROR_CLASSES:
+                    totals[3] += requests
+            else:
+                totals[0] += 1
+                if isinstance(status, int) and status >= 400:
+                    totals[3] += 1
+    return groups
+
+
+def _merge(into: dict[tuple, list[int]], part: dict[tuple, list[int]]) -> None:
+    for key, totals in part.items():
+        current = into.get(key)
+        if current is None:
+            into[key] = totals
+        else:
+            for i, value in enumerate(totals):
+                current[i] += value
+
+
+def run_query(tasks: list[Task], query: Query, jobs: int) -> dict[tuple, list[int]]:
+    """Scan all tasks, in a process pool when ``jobs`` > 1."""
+    groups: dict[tuple, list[int]] = {}
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            _merge(groups, scan(task, query))
+        return groups
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+        for part in pool.map(scan, tasks, [query] * len(tasks)):
+            _merge(groups, part)
+    return groups
+
+
+def run_sql_query(db_path: str | Path, query: Query) -> dict[tuple, list[int]]:
+    """Aggregate from the SQLite stats database, one month table at a time."""
+    select = [
+        f"substr(timestamp, 1, {_TIME_BUCKETS[name]})"
+        if name in _TIME_BUCKETS
+        else name
+        for name in query.group_by
+    ]
+    select += [
+        "COUNT(*)",
+        "SUM(input_tokens)",
+        "SUM(output_tokens)",
+        "SUM(status >= 400)",
+    ]
+    where: list[str] = []
+    params: list[Any] = []
+    if query.since is not None:
+        where.append("ts >= ?")
+        params.append(query.since)
+    if query.until is not None:
+        where.append("ts < ?")
+        params.append(query.until)
+    for column, values in (
+        ("lmgate_id", query.lmgate_ids),
+        ("provider", query.providers),
+        ("model", query.models),
+    ):
+        if values:
+            where.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(sorted(values))
+    sql = f"SELECT {', '.join(select)} FROM {{table}}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if query.group_by:
+        sql += " GROUP BY " + ", ".join(str(i + 1) for i in range(len(select) - 4))
+
+    first = table_name(query.since) if query.since is not None else None
+    last = table_name(query.until - 0.001) if query.until is not None else None
+    groups: dict[tuple, list[int]] = {}
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        for table in month_tables(conn):
+            if (first and table < first) or (last and table > last):
+                continue
+            for row in conn.execute(sql.format(table=table), params):
+                n = len(query.group_by)
+                totals = [row[n], *(value or 0 for value in row[n + 1 :])]
+                if totals[0]:
+                    _merge(groups, {tuple(row[:n]): totals})
+    finally:
+        conn.close()
+    return groups
+
+
+def _rows(groups: dict[tuple, list[int]], group_by: tuple[str, ...]) -> list[dict]:
+    rows = []
+    for key in sorted(
+        groups, key=lambda k: tuple("" if v is None else str(v) for v in k)
+    ):
+        row: dict[str, Any] = dict(zip(group_by, key))
+        row.update(zip(METRICS, groups[key]))
+        rows.append(row)
+    return rows
+
+
+def _print_table(rows: list[dict], columns: list[str], out: IO[str]) -> None:
+    cells = [[("" if r[c] is None else str(r[c])) for c in columns] for r in rows]
+    widths = [
+        max([len(c), *(len(row[i]) for row in cells)]) for i, c in enumerate(columns)
+    ]
+    out.write("  ".join(c.ljust(w) for c, w in zip(columns, widths)).rstrip() + "\n")
+    for row in cells:
+        out.write("  ".join(v.ljust(w) for v, w in zip(row, widths)).rstrip() + "\n")
+
+
+def _write_rows(
+    rows: list[dict], group_by: tuple[str, ...], fmt: str, out: IO[str]
+) -> None:
+    columns = [*group_by, *METRICS]
+    if fmt == "json":
+        out.write(json.dumps(rows, indent=2) + "\n")
+    elif fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        _print_table(rows, columns, out)
+
+
+def _csv_set(value: str | None) -> frozenset[str]:
+    return frozenset(v.strip() for v in (value or "").split(",") if v.strip())
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m lmgate query",
+        description="Filter and aggregate LMGate stats files.",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        type=Path,
+        help="stats segments (default: stats.output_path and its rotations)",
+    )
+    parser.add_argument("--since", help="ISO-8601 date or time, inclusive (UTC)")
+    parser.add_argument("--until", help="ISO-8601 date or time, exclusive (UTC)")
+    parser.add_argument("--id", dest="lmgate_ids", help="lmgate_id(s), comma-separated")
+    parser.add_argument("--provider", help="provider(s), comma-separated")
+    parser.add_argument("--model", help="model(s), comma-separated")
+    parser.add_argument(
+        "--group-by",
+        default="",
+        help=f"comma-separated fields: {', '.join(GROUP_FIELDS)}",
+    )
+    parser.add_argument(
+        "--rollup",
+        choices=tuple(RESOLUTIONS),
+        help="read minute/hour rollup files instead of raw stats "
+        f"(group-by limited to {', '.join(ROLLUP_GROUP_FIELDS)})",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        help="query a SQLite stats database (sqlite sink) instead of files",
+    )
+    parser.add_argument("--format", choices=("table", "json", "csv"), default="table")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="scanner processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="report scanned/skipped segments"
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None, out: IO[str] = sys.stdout) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    group_by = tuple(f for f in args.group_by.split(",") if f)
+    if args.db and (args.rollup or args.paths):
+        parser.error("--db cannot be combined with --rollup or paths")
+    allowed = ROLLUP_GROUP_FIELDS if args.rollup else GROUP_FIELDS
+    unknown = [f for f in group_by if f not in allowed]
+    if unknown:
+        parser.error(f"unknown --group-by field(s): {', '.join(unknown)}")
+    try:
+        query = Query(
+            since=parse_time(args.since) if args.since else None,
+            until=parse_time(args.until) if args.until else None,
+            lmgate_ids=_csv_set(args.lmgate_ids),
+            providers=_csv_set(args.provider),
+            models=_csv_set(args.model),
+            group_by=group_by,
+            rollup=args.rollup,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.db:
+        try:
+            groups = run_sql_query(args.db, query)
+        except sqlite3.Error as e:
+            parser.error(f"{args.db}: {e}")
+        _write_rows(_rows(groups, group_by), group_by, args.format, out)
+        return 0
+
+    if args.paths:
+        segments = args.paths
+    elif args.rollup:
+        stats_path = load_config()["stats"]["output_path"]
+        segments = rollup_segments(stats_path, args.rollup)
+    else:
+        segments = default_segments(load_config()["stats"]["output_path"])
+    work = plan(segments, query)
+    if args.verbose:
+        print(
+            f"{len(work.scanned)} segment(s) scanned in {len(work.tasks)} task(s), "
+            f"{len(work.skipped)} skipped",
+            file=sys.stderr,
+        )
+    rows = _rows(run_query(work.tasks, query, args.jobs), group_by)
+    _write_rows(rows, group_by, args.format, out)
+    return 0
@@ -0,0 +1,209 @@
+"""Compact stats record: a slotted, read-only mapping that encodes to bytes.
+
+Each ingested request becomes one ``StatsRecord`` instead of a dict with
+one key per field (``FIELDS``), which keeps the memory held by buffers and
+queues under burst load small: a record is a fixed set of slots, and the
+low-cardinality string fields (lmgate_id, provider, endpoint, model,
+masked_key, cache_status, target) are interned, so repeated values share
+one string object. Interning is bounded; once the table is full, new
+values are stored as they are. An endpoint is interned only when it is
+already a template, without a query string or an object ID in its path
+(``/v1/files/file-abc123...``), so one-off URIs do not fill the table.
+
+Records behave like a read-only ``Mapping`` (``record["model"]``,
+``record.get(...)``, ``dict(record)``, ``{**record}``), so consumers that
+expect a dict keep working. ``to_json_bytes`` produces the same bytes as
+``json.dumps(dict(record))``, reusing the encoded form of interned values.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import operator
+import re
+from collections.abc import Iterator, Mapping
+from json.encoder import encode_basestring_ascii as _encode_str
+from typing import Any
+
+# Field order is the JSONL field order.
+FIELDS = (
+    "timestamp",
+    "lmgate_id",
+    "provider",
+    "endpoint",
+    "model",
+    "status",
+    "input_tokens",
+    "output_tokens",
+    "masked_key",
+    "error_type",
+    "upstream_connect_time",
+    "upstream_header_time",
+    "upstream_response_time",
+    "request_time",
+    "output_tokens_per_second",
+    "response_bytes",
+    "streaming",
+    "cache_status",
+    "coalesced",
+    "target",
+    "attempts",
+    "wasted_input_tokens",
+    "probe",
+)
+_FIELD_SET = frozenset(FIELDS)
+INTERNED_FIELDS = (
+    "lmgate_id",
+    "provider",
+    "endpoint",
+    "model",
+    "masked_key",
+    "cache_status",
+    "target",
+)
+
+# Distinct interned strings kept (and their encoded JSON form).
+INTERN_LIMIT = 65536
+_interned: dict[str, str] = {}
+_encoded: dict[str, str] = {}
+_KEY_PREFIXES = [
+    ("{" if i == 0 else ", ") + json.dumps(f) + ": " for i, f in enumerate(FIELDS)
+]
+_values = operator.attrgetter(*FIELDS)
+# Object IDs in request paths: long letter+digit runs (file-..., resp_...)
+# and UUIDs. Model names and project numbers do not match.
+_ID_SEGMENT = re.compile(
+    r"(?=[a-z0-9]*[0-9])(?=[a-z0-9]*[a-z])[a-z0-9]{16,}"
+    r"|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}",
+    re.IGNORECASE,
+)
+
+
+def intern(value: Any) -> Any:
+    """Shared instance of a string value (bounded); other values unchanged."""
+    if type(value) is not str:
+        return value
+    shared = _interned.get(value)
+    if shared is not None:
+        return shared
+    if len(_interned) < INTERN_LIMIT:
+        _interned[value] = value
+    return value
+
+
+def _intern_endpoint(value: Any) -> Any:
+    """Intern endpoint templates only; URIs unique to one request stay as is."""
+    if type(value) is not str:
+        return value
+    shared = _interned.get(value)
+    if shared is not None:
+        return shared
+    if "?" in value or _ID_SEGMENT.search(value):
+        return value
+    return intern(value)
+
+
+def _encode_value(value: Any) -> str:
+    if value is None:
+        return "null"
+    if type(value) is str:
+        cached = _encoded.get(value)
+        if cached is not None:
+            return cached
+        encoded = _encode_str(value)
+        if _interned.get(value) is value and len(_encoded) < INTERN_LIMIT:
+            _encoded[value] = encoded
+        return encoded
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if type(value) is int:
+        return int.__repr__(value)
+    if type(value) is float and math.isfinite(value):
+        return float.__repr__(value)
+    return json.dumps(value)
+
+
+class StatsRecord(Mapping[str, Any]):
+    """One stats entry; fields are fixed (see ``FIELDS``) and read-only."""
+
+    __slots__ = FIELDS
+
+    timestamp: Any
+    lmgate_id: Any
+    provider: Any
+    endpoint: Any
+    model: Any
+    status: Any
+    input_tokens: int | None
+    output_tokens: int | None
+    masked_key: Any
+    error_type: Any
+    upstream_connect_time: float | None
+    upstream_header_time: float | None
+    upstream_response_time: float | None
+    request_time: float | None
+    output_tokens_per_second: float | None
+    response_bytes: int | None
+    streaming: bool
+    cache_status: str | None
+    coalesced: bool
+    target: str | None
+    attempts: int | None
+    wasted_input_tokens: int | None
+    probe: str | None
+
+    def __init__(self, **fields: Any) -> None:
+        unknown = fields.keys() - _FIELD_SET
+        if unknown:
+            raise TypeError(f"unknown stats fields: {', '.join(sorted(unknown))}")
+        setter = object.__setattr__
+        for name in FIELDS:
+            value = fields.get(name)
+            if name == "endpoint":
+                value = _intern_endpoint(value)
+            elif name in INTERNED_FIELDS:
+                value = intern(value)
+            setter(self, name, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("StatsRecord is read-only")
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def __repr__(self) -> str:
+        return f"StatsRecord({dict(self)!r})"
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (_rebuild, (dict(self),))
+
+    def to_json_bytes(self) -> bytes:
+        """The record as a JSON object, byte-identical to ``json.dumps``."""
+        parts = []
+        for prefix, value in zip(_KEY_PREFIXES, _values(self)):
+            parts.append(prefix)
+            parts.append(_encode_value(value))
+        parts.append("}")
+        return "".join(parts).encode()
+
+
+def _rebuild(fields: dict[str, Any]) -> StatsRecord:
+    return StatsRecord(**fields)
+
+
+def to_json_line(entry: Mapping[str, Any]) -> bytes:
+    """One JSONL line for a StatsRecord or a plain dict."""
+    if isinstance(entry, StatsRecord):
+        return entry.to_json_bytes() + b"\n"
+    return json.dumps(entry).encode() + b"\n"
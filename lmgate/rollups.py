@@ -0,0 +1,247 @@
+"""Incremental per-minute and per-hour rollups of the stats file.
+
+A periodic pass reads the stats lines appended since the last pass and
+aggregates them by (bucket, lmgate_id, provider, model, status_class) into
+requests and input/output token totals. Buckets are written once they are
+closed, i.e. once a record at least ``grace_seconds`` past the bucket end
+has been seen, to ``rollups/<stats stem>.1m.jsonl`` and ``.1h.jsonl`` next
+to the stats file:
+
+    {"bucket":"2026-03-01T10:05:00Z","lmgate_id":"1","provider":"openai",
+     "model":"gpt-4o","status_class":"2xx","requests":12,
+     "input_tokens":1840,"output_tokens":960}
+
+Progress is checkpointed as (inode, offset) of the stats file plus the
+still-open buckets, so each pass only reads new lines and a restart loses
+nothing (a crash between writing rows and the checkpoint can repeat those
+rows). When the stats file was rotated since the last pass, the rest of
+the rotated segment (found by inode) is read before the new file. A record
+arriving after its bucket was written produces a second row for the same
+key; consumers sum rows by key.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+from lmgate.jsonl import read_columns
+
+log = logging.getLogger(__name__)
+
+RESOLUTIONS = {"1m": 60, "1h": 3600}
+ROLLUP_DIR = "rollups"
+KEY_FIELDS = ("lmgate_id", "provider", "model", "status_class")
+_FIELDS = [
+    "timestamp",
+    "lmgate_id",
+    "provider",
+    "model",
+    "status",
+    "input_tokens",
+    "output_tokens",
+]
+
+# (bucket start, lmgate_id, provider, model, status_class)
+BucketKey = tuple[int, Any, Any, Any, str]
+
+
+def rollup_path(stats_path: str | Path, resolution: str) -> Path:
+    """rollups/<stem>.<resolution>.jsonl next to the stats file."""
+    path = Path(stats_path)
+    return path.parent / ROLLUP_DIR / f"{path.stem}.{resolution}.jsonl"
+
+
+def status_class(status: Any) -> str:
+    if isinstance(status, int) and 100 <= status < 600:
+        return f"{status // 100}xx"
+    return "unknown"
+
+
+def _parse_time(value: Any) -> float | None:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=UTC)
+    return parsed.timestamp()
+
+
+def _format_bucket(start: int) -> str:
+    return datetime.fromtimestamp(start, UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _complete_length(path: Path) -> int:
+    """Offset just past the last newline (partial last lines are left)."""
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        pos = size
+        while pos > 0:
+            step = min(64 * 1024, pos)
+            f.seek(pos - step)
+            chunk = f.read(step)
+            nl = chunk.rfind(b"\n")
+            if nl != -1:
+                return pos - step + nl + 1
+            pos -= step
+    return 0
+
+
+class Rollup:
+    """Incremental minute/hour aggregation of one stats file."""
+
+    def __init__(self, stats_path: str | Path, grace_seconds: float = 120) -> None:
+        self._stats_path = Path(stats_path)
+        self._grace = grace_seconds
+        self._checkpoint_path = (
+            self._stats_path.parent
+            / ROLLUP_DIR
+            / f"{self._stats_path.stem}.checkpoint.json"
+        )
+        self._inode: int | None = None
+        self._offset = 0
+        self._watermark = 0.0
+        self._open: dict[str, dict[BucketKey, list[int]]] = {
+            res: {} for res in RESOLUTIONS
+        }
+        # run_once is called from a worker thread and at shutdown.
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Restore progress and open buckets from the checkpoint, if present."""
+        try:
+            with open(self._checkpoint_path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            log.warning(
+                "Ignoring unreadable rollup checkpoint %s", self._checkpoint_path
+            )
+            return
+        self._inode = data.get("inode")
+        self._offset = data.get("offset", 0)
+        self._watermark = data.get("watermark", 0.0)
+        for res in RESOLUTIONS:
+            self._open[res] = {
+                (row[0], row[1], row[2], row[3], row[4]): row[5:]
+                for row in data.get("open", {}).get(res, [])
+            }
+
+    def run_once(self) -> int:
+        """Process new stats lines, write closed buckets; return lines read."""
+        with self._lock:
+            return self._run()
+
+    def _run(self) -> int:
+        try:
+            stat = self._stats_path.stat()
+        except FileNotFoundError:
+            return 0
+        processed = 0
+        if self._inode is not None and self._inode != stat.st_ino:
+            rotated = self._find_rotated(self._inode)
+            if rotated is not None:
+                processed += self._consume(rotated, self._offset)
+            else:
+                log.warning(
+                    "Rotated stats segment for inode %s not found; "
+                    "rollups may miss its last lines",
+                    self._inode,
+                )
+            self._offset = 0
+        elif stat.st_size < self._offset:
+            # Truncated in place: start over.
+            self._offset = 0
+        self._inode = stat.st_ino
+        end = _complete_length(self._stats_path)
+        processed += self._consume(self._stats_path, self._offset, end)
+        self._offset = max(self._offset, end)
+        self._emit_closed()
+        self._save()
+        return processed
+
+    def _find_rotated(self, inode: int) -> Path | None:
+        pattern = f"{self._stats_path.name}.*"
+        for path in self._stats_path.parent.glob(pattern):
+            try:
+                if path.stat().st_ino == inode and path.suffix != ".gz":
+                    return path
+            except OSError:
+                continue
+        return None
+
+    def _consume(self, path: Path, start: int, end: int | None = None) -> int:
+        if end is None:
+            end = _complete_length(path)
+        if end <= start:
+            return 0
+        count = 0
+        for columns in read_columns(path, _FIELDS, start=start, end=end):
+            rows = zip(*(columns[f] for f in _FIELDS))
+            for ts, lmgate_id, provider, model, status, input_t, output_t in rows:
+                t = _parse_time(ts)
+                if t is None:
+                    continue
+                count += 1
+                self._watermark = max(self._watermark, t)
+                cls = status_class(status)
+                for res, seconds in RESOLUTIONS.items():
+                    bucket = int(t // seconds * seconds)
+                    key = (bucket, lmgate_id, provider, model, cls)
+                    totals = self._open[res].get(key)
+                    if totals is None:
+                        totals = self._open[res][key] = [0, 0, 0]
+                    totals[0] += 1
+                    totals[1] += input_t or 0
+                    totals[2] += output_t or 0
+        return count
+
+    def _emit_closed(self) -> None:
+        for res, seconds in RESOLUTIONS.items():
+            open_buckets = self._open[res]
+            closed = sorted(
+                (
+                    key
+                    for key in open_buckets
+                    if key[0] + seconds + self._grace <= self._watermark
+                ),
+                key=lambda k: tuple("" if v is None else str(v) for v in k),
+            )
+            if not closed:
+                continue
+            path = rollup_path(self._stats_path, res)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a") as f:
+                for key in closed:
+                    requests, input_t, output_t = open_buckets.pop(key)
+                    row = {
+                        "bucket": _format_bucket(key[0]),
+                        **dict(zip(KEY_FIELDS, key[1:])),
+                        "requests": requests,
+                        "input_tokens": input_t,
+                        "output_tokens": output_t,
+                    }
+                    f.write(json.dumps(row, separators=(",", ":")) + "\n")
+
+    def _save(self) -> None:
+        data = {
+            "inode": self._inode,
+            "offset": self._offset,
+            "watermark": self._watermark,
+            "open": {
+                res: [[*key, *totals] for key, totals in buckets.items()]
+                for res, buckets in self._open.items()
+            },
+        }
+        self._checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._checkpoint_path.with_name(self._checkpoint_path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, self._checkpoint_path)
@@ -0,0 +1,148 @@
+"""Latency- and error-aware choice between a provider's upstream targets.
+
+Providers with ``targets`` (see lmgate.providers) are routed per request:
+``/auth`` picks a target and returns it in ``X-LMGate-Target`` /
+``X-LMGate-Target-Host``, and nginx proxies to that target's upstream block.
+Every ingested stats record with a ``target`` updates the target's score:
+an exponentially weighted moving average of its time to first byte
+(``upstream_header_time``) and of its error rate (5xx, 429 and connection
+failures).
+
+A target is chosen at random with probability proportional to::
+
+    weight / (latency * (1 + error_penalty * error_rate))
+
+so a target twice as slow gets half the traffic of its peer and a failing
+target is drained without being cut off entirely, which keeps measuring it.
+Targets without a latency sample yet are scored with the fastest known
+latency so they receive traffic and get measured.
+"""
+
+from __future__ import annotations
+
+import random
+from collections.abc import Mapping
+from typing import Any
+
+from lmgate.metrics import REGISTRY
+from lmgate.providers import Provider, Target
+
+_DECISIONS = REGISTRY.counter(
+    "lmgate_routing_decisions_total",
+    "Requests routed per provider target",
+    ("provider", "target"),
+)
+_LATENCY = REGISTRY.gauge(
+    "lmgate_routing_target_latency_seconds",
+    "Smoothed time to first byte per provider target",
+    ("provider", "target"),
+)
+_ERROR_RATE = REGISTRY.gauge(
+    "lmgate_routing_target_error_rate",
+    "Smoothed error rate per provider target",
+    ("provider", "target"),
+)
+
+
+def is_upstream_error(status: Any) -> bool:
+    """Whether a stats status counts as a failure of the upstream."""
+    if not isinstance(status, int):
+        return False
+    return status >= 500 or status == 429
+
+
+class _Score:
+    __slots__ = ("latency", "error_rate")
+
+    def __init__(self) -> None:
+        self.latency: float | None = None
+        self.error_rate = 0.0
+
+
+class Router:
+    """Per-target scores and weighted random target selection."""
+
+    def __init__(
+        self,
+        providers: list[Provider],
+        smoothing: float = 0.1,
+        error_penalty: float = 10.0,
+        rng: random.Random | None = None,
+    ) -> None:
+        self._smoothing = smoothing
+        self._error_penalty = error_penalty
+        self._rng = rng or random.Random()
+        # Longest prefix first, so /openai/eu/ wins over /openai/.
+        self._routed = sorted(
+            (p for p in providers if p.targets),
+            key=lambda p: len(p.prefix),
+            reverse=True,
+        )
+        self._targets: dict[str, dict[str, Target]] = {
+            p.name: {t.name: t for t in p.targets} for p in self._routed
+        }
+        self._scores: dict[tuple[str, str], _Score] = {
+            (p.name, t.name): _Score() for p in self._routed for t in p.targets
+        }
+
+    def __bool__(self) -> bool:
+        return bool(self._routed)
+
+    def choose(self, uri: str) -> tuple[str, Target] | None:
+        """(provider, target) for a client request URI; None if not routed."""
+        for provider in self._routed:
+            if uri.startswith(provider.prefix):
+                break
+        else:
+            return None
+        targets = provider.targets
+        if len(targets) == 1:
+            target = targets[0]
+        else:
+            target = self._rng.choices(
+                targets, weights=self._weights(provider.name, targets)
+            )[0]
+        _DECISIONS.inc(provider.name, target.name)
+        return provider.name, target
+
+    def _weights(self, provider: str, targets: tuple[Target, ...]) -> list[float]:
+        scores = [self._scores[provider, t.name] for t in targets]
+        known = [s.latency for s in scores if s.latency is not None]
+        fallback = min(known) if known else 1.0
+        weights = []
+        for target, score in zip(targets, scores, strict=True):
+            latency = max(score.latency or fallback, 0.001)
+            penalty = 1 + self._error_penalty * score.error_rate
+            weights.append(target.weight / (latency * penalty))
+        return weights
+
+    def record(self, entry: Mapping[str, Any]) -> None:
+        """Update the target's score from an ingested stats entry."""
+        key = (str(entry.get("provider")), str(entry.get("target")))
+        score = self._scores.get(key)
+        if score is None or entry.get("cache_status") == "HIT":
+            return
+        alpha = self._smoothing
+        error = is_upstream_error(entry.get("status"))
+        score.error_rate += alpha * ((1.0 if error else 0.0) - score.error_rate)
+        latency = entry.get("upstream_header_time")
+        if latency is not None and not error:
+            if score.latency is None:
+                score.latency = latency
+            else:
+                score.latency += alpha * (latency - score.latency)
+            _LATENCY.set(score.latency, *key)
+        _ERROR_RATE.set(score.error_rate, *key)
+
+    def scores(self) -> dict[str, dict[str, dict[str, float | None]]]:
+        """Current scores by provider and target (for inspection and tests)."""
+        return {
+            provider: {
+                name: {
+                    "latency": self._scores[provider, name].latency,
+                    "error_rate": self._scores[provider, name].error_rate,
+                }
+                for name in targets
+            }
+            for provider, targets in self._targets.items()
+        }
@@ -1,9 +1,13 @@
-"""aiohttp application: /auth, /stats, /healthz endpoints."""
+"""aiohttp application: /auth, /stats, /healthz, /metrics endpoints."""
 
 from __future__ import annotations
 
 import asyncio
+import functools
+import hashlib
+import hmac
 import logging
+import time
 from pathlib import Path
 from typing import Any
 
@@ -11,38 +15,254 @@ from aiohttp import web
 
 from lmgate.allowlist import AllowList
 from lmgate.auth import extract_key
+from lmgate.breaker import CircuitBreaker, uri_model
+from lmgate.budgets import BudgetTracker
+from lmgate.config import apply_defaults
+from lmgate.ingest import StatsFollower
+from lmgate.limits import InFlightTracker
+from lmgate.looplag import LoopLagMonitor
+from lmgate.metrics import REGISTRY
+from lmgate.profiling import MODES, profile_deterministic, profile_sampling
+from lmgate.providers import configure as configure_providers
+from lmgate.providers import load_providers, provider_for_uri
+from lmgate.rollups import Rollup
+from lmgate.routing import Router
+from lmgate.sinks import build_sinks
 from lmgate.stats import StatsWriter, build_stats_entry
+from lmgate.tail import StatsFeed, stats_stream
 
 log = logging.getLogger(__name__)
 
+_AUTH_SECONDS = REGISTRY.histogram(
+    "lmgate_auth_duration_seconds", "Time spent handling /auth"
+)
+_AUTH_RESULTS = REGISTRY.counter(
+    "lmgate_auth_requests_total", "/auth decisions by result", ("result",)
+)
+_INGEST_SECONDS = REGISTRY.histogram(
+    "lmgate_stats_ingest_duration_seconds",
+    "Time spent accounting one record read back from the stats file",
+    ("provider",),
+)
+_FOLLOWED_RECORDS = REGISTRY.counter(
+    "lmgate_stats_followed_records_total",
+    "Stats records read back from the stats file",
+)
+_PARSE_SECONDS = REGISTRY.histogram(
+    "lmgate_stats_parse_duration_seconds",
+    "Time spent building a stats entry from the payload",
+    ("provider", "body_size"),
+)
+
+# Upper bounds (bytes) and labels for response body size buckets.
+_BODY_SIZE_BUCKETS = (
+    (1024, "1KB"),
+    (16 * 1024, "16KB"),
+    (256 * 1024, "256KB"),
+    (2 * 1024 * 1024, "2MB"),
+)
+
+
+_RESPONSE_BYTES = REGISTRY.histogram(
+    "lmgate_stats_response_bytes",
+    "Response body size of records read back from the stats file",
+    ("provider",),
+    tuple(float(bound) for bound, _ in _BODY_SIZE_BUCKETS),
+)
+
+
+def _body_size_label(size: int) -> str:
+    for bound, label in _BODY_SIZE_BUCKETS:
+        if size <= bound:
+            return label
+    return "+Inf"
+
 
 async def healthz(request: web.Request) -> web.Response:
     return web.Response(text="ok")
 
 
+async def metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        body=REGISTRY.render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
 async def auth(request: web.Request) -> web.Response:
+    start = time.perf_counter()
+    result, response = _authorize(request)
+    _AUTH_SECONDS.observe(time.perf_counter() - start)
+    _AUTH_RESULTS.inc(result)
+    return response
+
+
+@functools.lru_cache(maxsize=4096)
+def _tenant_hash(tenant: str) -> str:
+    """Opaque tenant id for the response cache key (keys of one owner share)."""
+    return hashlib.sha256(tenant.encode()).hexdigest()[:16]
+
+
+def _authorize(request: web.Request) -> tuple[str, web.Response]:
+    """Decide /auth. Returns (result label, response)."""
     allowlist: AllowList = request.app["allowlist"]
     key = extract_key(dict(request.headers))
     if key is None:
-        return web.Response(status=403, text="forbidden")
+        return "forbidden", web.Response(status=403, text="forbidden")
     entry = allowlist.get(key)
     if entry is None:
-        return web.Response(status=403, text="forbidden")
-    return web.Response(status=200, text="ok", headers={"X-LMGate-ID": entry.id})
+        return "forbidden", web.Response(status=403, text="forbidden")
+    budgets: BudgetTracker = request.app["budgets"]
+    retry_after = budgets.retry_after(entry)
+    if retry_after is not None:
+        return "token_budget_exhausted", web.Response(
+            status=429,
+            text="token budget exhausted",
+            headers={
+                "Retry-After": str(retry_after),
+                "X-LMGate-Reason": "token_budget_exhausted",
+            },
+        )
+    breaker: CircuitBreaker | None = request.app.get("breaker")
+    uri = request.headers.get("X-Original-URI", "")
+    probe = None
+    if breaker is not None:
+        provider = provider_for_uri(uri)
+        if provider is not None:
+            retry_after, probe = breaker.check(provider.name, uri_model(uri))
+            if retry_after is not None:
+                return "circuit_open", web.Response(
+                    status=503,
+                    text="provider unavailable",
+                    headers={
+                        "Retry-After": str(retry_after),
+                        "X-LMGate-Reason": "circuit_open",
+                    },
+                )
+    in_flight: InFlightTracker = request.app["in_flight"]
+    if not in_flight.acquire(entry.id) and not _retry_acquire(request.app, entry.id):
+        if probe:
+            request.app["breaker"].release(probe)
+        return "concurrency_limit", web.Response(
+            status=429,
+            text="too many requests",
+            headers={"Retry-After": "1", "X-LMGate-Reason": "concurrency_limit"},
+        )
+    headers = {"X-LMGate-ID": entry.id}
+    if probe:
+        # Half-open circuit probe; returned in the stats record.
+        headers["X-LMGate-Probe"] = probe
+    if request.app["config"]["cache"]["enabled"]:
+        headers["X-LMGate-Cache"] = "1"
+        headers["X-LMGate-Tenant"] = _tenant_hash(entry.owner or entry.id)
+    router: Router = request.app["router"]
+    if router:
+        choice = router.choose(uri)
+        if choice is not None:
+            headers["X-LMGate-Target"] = choice[1].name
+            headers["X-LMGate-Target-Host"] = choice[1].host
+    return "allowed", web.Response(status=200, text="ok", headers=headers)
+
+
+def _retry_acquire(app: web.Application, lmgate_id: str) -> bool:
+    """Catch up on completions not read yet, then try the slot again."""
+    _poll_stats(app)
+    in_flight: InFlightTracker = app["in_flight"]
+    return in_flight.acquire(lmgate_id)
+
+
+def _poll_stats(app: web.Application) -> None:
+    """Feed records appended to the stats file since the last poll."""
+    follower: StatsFollower = app["stats_follower"]
+    try:
+        records = follower.poll()
+    except OSError:
+        log.warning("Reading the stats file failed", exc_info=True)
+        return
+    if not records:
+        return
+    _FOLLOWED_RECORDS.inc(amount=len(records))
+    for record in records:
+        start = time.perf_counter()
+        try:
+            _ingest(app, record)
+        except Exception:
+            log.debug("Skipping unusable stats record", exc_info=True)
+            continue
+        provider = str(record.get("provider") or "unknown")
+        _INGEST_SECONDS.observe(time.perf_counter() - start, provider)
+        size = record.get("response_bytes")
+        if isinstance(size, int):
+            _RESPONSE_BYTES.observe(size, provider)
+
+
+def _ingest(app: web.Application, record: dict[str, Any]) -> None:
+    """Account one completed request (a stats record) in in-process state."""
+    lmgate_id = record.get("lmgate_id")
+    app["in_flight"].release(lmgate_id)
+    app["router"].record(record)
+    if "breaker" in app:
+        app["breaker"].record(record)
+    for sink in app["stats_sinks"]:
+        sink.submit(record)
+    if "stats_feed" in app:
+        app["stats_feed"].publish(record)
+    app["budgets"].record(
+        lmgate_id,
+        (record.get("input_tokens") or 0) + (record.get("output_tokens") or 0),
+    )
 
 
 async def stats(request: web.Request) -> web.Response:
     writer: StatsWriter = request.app["stats_writer"]
     try:
         payload = await request.json()
+        start = time.perf_counter()
         entry = build_stats_entry(payload)
+        _PARSE_SECONDS.observe(
+            time.perf_counter() - start,
+            entry["provider"],
+            _body_size_label(len(payload.get("response_body") or "")),
+        )
         writer.write(entry)
         writer.flush()
+        _poll_stats(request.app)
     except Exception:
         log.debug("Stats ingestion error", exc_info=True)
     return web.Response(status=200, text="ok")
 
 
+async def admin_profile(request: web.Request) -> web.Response:
+    """Profile the live process for ?seconds=N (?mode=sampling|deterministic)."""
+    admin = request.app["config"]["admin"]
+    token = request.headers.get("X-LMGate-Admin-Token", "")
+    if not hmac.compare_digest(token.encode(), admin["token"].encode()):
+        return web.Response(status=403, text="forbidden")
+    try:
+        seconds = float(request.query.get("seconds", "10"))
+    except ValueError:
+        return web.Response(status=400, text="invalid seconds")
+    if not 0 < seconds <= admin["max_profile_seconds"]:
+        return web.Response(
+            status=400,
+            text=f"seconds must be in (0, {admin['max_profile_seconds']}]",
+        )
+    mode = request.query.get("mode", "sampling")
+    if mode not in MODES:
+        return web.Response(status=400, text=f"mode must be one of {MODES}")
+
+    lock: asyncio.Lock = request.app["profile_lock"]
+    if lock.locked():
+        return web.Response(status=409, text="profile already running")
+    async with lock:
+        log.info("Profiling for %.1fs (mode=%s)", seconds, mode)
+        if mode == "sampling":
+            text = await profile_sampling(seconds, admin["sample_interval_seconds"])
+        else:
+            text = await profile_deterministic(seconds)
+    return web.Response(text=text)
+
+
 async def _poll_allowlist(allowlist: AllowList, interval: int) -> None:
     """Periodically check allow-list file for changes and reload."""
     while True:
@@ -53,31 +273,179 @@ async def _poll_allowlist(allowlist: AllowList, interval: int) -> None:
             log.warning("Allow-list reload failed", exc_info=True)
 
 
-def create_app(config: dict[str, Any]) -> web.Application:
+async def _flush_stats(writer: StatsWriter, interval: float) -> None:
+    """Periodically retry writing entries a failed flush left pending."""
+    while True:
+        await asyncio.sleep(interval)
+        writer.flush()
+
+
+async def _follow_stats(app: web.Application, interval: float) -> None:
+    """Periodically read the records nginx appended to the stats file."""
+    while True:
+        await asyncio.sleep(interval)
+        _poll_stats(app)
+
+
+async def _checkpoint_budgets(budgets: BudgetTracker, interval: int) -> None:
+    """Periodically persist token budget counters."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            budgets.checkpoint()
+        except Exception:
+            log.warning("Budget checkpoint failed", exc_info=True)
+
+
+async def _run_rollups(rollup: Rollup, interval: int) -> None:
+    """Periodically fold new stats lines into minute/hour rollups."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(rollup.run_once)
+        except Exception:
+            log.warning("Stats rollup failed", exc_info=True)
+
+
+def check_worker_config(config: dict[str, Any]) -> None:
+    """Reject settings that cannot work with ``server.workers`` > 1."""
+    if config["server"]["workers"] > 1 and config["limits"]["max_in_flight_per_key"]:
+        # Slots are per process, and a worker cannot tell which of its peers
+        # admitted a completed request.
+        raise ValueError("limits.max_in_flight_per_key requires server.workers: 1")
+
+
+def create_app(
+    config: dict[str, Any],
+    allowlist: AllowList | None = None,
+) -> web.Application:
+    """Build the application.
+
+    Worker processes pass a pre-built ``allowlist`` (a snapshot maintained by
+    the supervisor).
+    """
+    config = apply_defaults(config)
+    check_worker_config(config)
     app = web.Application()
     app["config"] = config
+    providers = load_providers(config)
+    configure_providers(providers)
+    breaker = config["circuit_breaker"]
+    if breaker["enabled"]:
+        app["breaker"] = CircuitBreaker(
+            window_seconds=breaker["window_seconds"],
+            min_requests=breaker["min_requests"],
+            error_rate_threshold=breaker["error_rate_threshold"],
+            open_seconds=breaker["open_seconds"],
+            half_open_probes=breaker["half_open_probes"],
+        )
+    app["router"] = Router(
+        providers,
+        smoothing=config["routing"]["smoothing"],
+        error_penalty=config["routing"]["error_penalty"],
+    )
 
-    allowlist = AllowList(Path(config["auth"]["allowlist_path"]))
+    if allowlist is None:
+        allowlist = AllowList(Path(config["auth"]["allowlist_path"]))
     allowlist.load()
     app["allowlist"] = allowlist
 
-    stats_writer = StatsWriter(config["stats"]["output_path"])
-    app["stats_writer"] = stats_writer
+    stats_config = config["stats"]
+    app["stats_writer"] = StatsWriter(
+        stats_config["output_path"],
+        max_buffered=stats_config["max_buffered_entries"],
+        # Workers append to the same file.
+        shared=config["server"]["workers"] > 1,
+    )
+    follower = StatsFollower(stats_config["output_path"])
+    follower.open()
+    app["stats_follower"] = follower
+
+    app["stats_sinks"] = build_sinks(config)
+    if config["stats"]["stream"]["enabled"]:
+        app["stats_feed"] = StatsFeed(config["stats"]["stream"]["history_size"])
+
+    limits = config["limits"]
+    app["in_flight"] = InFlightTracker(
+        limits["max_in_flight_per_key"], limits["in_flight_timeout_seconds"]
+    )
+
+    checkpoint_path = config["budgets"]["checkpoint_path"] or Path(
+        config["stats"]["output_path"]
+    ).with_name("budgets.json")
+    budgets = BudgetTracker(Path(checkpoint_path))
+    budgets.load()
+    app["budgets"] = budgets
+
+    if config["rollups"]["enabled"]:
+        rollup = Rollup(
+            config["stats"]["output_path"], config["rollups"]["grace_seconds"]
+        )
+        rollup.load()
+        app["rollup"] = rollup
 
     async def on_startup(app: web.Application) -> None:
+        for sink in app["stats_sinks"]:
+            sink.start()
+        app["_stats_follow_task"] = asyncio.create_task(
+            _follow_stats(app, config["stats"]["follow_interval_seconds"])
+        )
+        app["_stats_flush_task"] = asyncio.create_task(
+            _flush_stats(app["stats_writer"], config["stats"]["flush_interval_seconds"])
+        )
         interval = config["auth"]["poll_interval_seconds"]
         app["_allowlist_poll_task"] = asyncio.create_task(
             _poll_allowlist(app["allowlist"], interval)
         )
+        app["_budget_checkpoint_task"] = asyncio.create_task(
+            _checkpoint_budgets(
+                app["budgets"], config["budgets"]["checkpoint_interval_seconds"]
+            )
+        )
+        loop_lag = config["monitoring"]["loop_lag"]
+        if loop_lag["enabled"]:
+            monitor = LoopLagMonitor(
+                loop_lag["interval_seconds"], loop_lag["warn_threshold_seconds"]
+            )
+            app["loop_lag_monitor"] = monitor
+            app["_loop_lag_task"] = monitor.start()
+        if "rollup" in app:
+            app["_rollup_task"] = asyncio.create_task(
+                _run_rollups(app["rollup"], config["rollups"]["interval_seconds"])
+            )
 
     async def on_cleanup(app: web.Application) -> None:
-        app["_allowlist_poll_task"].cancel()
-        try:
-            await app["_allowlist_poll_task"]
-        except asyncio.CancelledError:
-            pass
+        for name in (
+            "_stats_follow_task",
+            "_stats_flush_task",
+            "_allowlist_poll_task",
+            "_budget_checkpoint_task",
+            "_rollup_task",
+        ):
+            if name not in app:
+                continue
+            app[name].cancel()
+            try:
+                await app[name]
+            except asyncio.CancelledError:
+                pass
+        if "loop_lag_monitor" in app:
+            app["_loop_lag_task"].cancel()
+            app["loop_lag_monitor"].stop()
         log.info("Shutting down: flushing stats writer")
         app["stats_writer"].close()
+        app["stats_follower"].close()
+        for sink in app["stats_sinks"]:
+            sink.close()
+        try:
+            app["budgets"].checkpoint()
+        except OSError:
+            log.warning("Final budget checkpoint failed", exc_info=True)
+        if "rollup" in app:
+            try:
+                app["rollup"].run_once()
+            except Exception:
+                log.warning("Final stats rollup failed", exc_info=True)
 
     app.on_startup.append(on_startup)
     app.on_cleanup.append(on_cleanup)
@@ -85,4 +453,14 @@ def create_app(config: dict[str, Any]) -> web.Application:
     app.router.add_get("/auth", auth)
     app.router.add_post("/stats", stats)
     app.router.add_get("/healthz", healthz)
+    app.router.add_get("/metrics", metrics)
+    if "stats_feed" in app:
+        app.router.add_get("/stats/stream", stats_stream)
+    if config["admin"]["profiling_enabled"]:
+        if not config["admin"]["token"]:
+            raise ValueError(
+                "admin.token must be set when admin.profiling_enabled is true"
+            )
+        app["profile_lock"] = asyncio.Lock()
+        app.router.add_post("/admin/profile", admin_profile)
     return app
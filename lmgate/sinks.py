@@ -0,0 +1,408 @@
+"""Fan-out stats sinks with independent bounded queues.
+
+Besides the primary JSONL file, each record read back from it
+(``lmgate.ingest``) can be delivered to any number of sinks configured
+under ``stats.sinks``. The record is shared by reference across all sinks
+and must not be modified.
+
+Every sink owns a bounded queue and a background thread that sends
+batches of up to ``batch_size`` records as soon as a batch is full, or
+every ``flush_interval_seconds`` otherwise. ``submit`` never blocks: when
+a queue is full the record is dropped for that sink only and counted, so a
+slow or unreachable consumer cannot stall ingestion or the other sinks. A
+batch that fails to send is put back at the head of the queue (as far as
+it fits) and retried after the flush interval.
+
+With ``spill``, a sink also appends every queued record to its own spill
+ring (``lmgate.spill``) and releases it once the batch holding it was sent.
+Records queued but not yet sent when the process dies (or left over by a
+failed last batch at shutdown) are queued again on the next start, so a
+long ``flush_interval_seconds`` does not cost durability.
+"""
+
+from __future__ import annotations
+
+import abc
+import json
+import logging
+import socket
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any
+
+from lmgate.metrics import REGISTRY
+from lmgate.records import to_json_line
+from lmgate.rollups import status_class
+from lmgate.spill import SpillRing
+
+log = logging.getLogger(__name__)
+
+_QUEUED = REGISTRY.gauge(
+    "lmgate_stats_sink_queued_entries",
+    "Stats entries waiting in a sink queue",
+    ("sink",),
+)
+_SENT = REGISTRY.counter(
+    "lmgate_stats_sink_sent_total", "Stats entries delivered by a sink", ("sink",)
+)
+_DROPPED = REGISTRY.counter(
+    "lmgate_stats_sink_dropped_total",
+    "Stats entries dropped by a sink (queue_full or error at shutdown)",
+    ("sink", "reason"),
+)
+_ERRORS = REGISTRY.counter(
+    "lmgate_stats_sink_errors_total", "Failed sink batch deliveries", ("sink",)
+)
+_SPILL_FULL = REGISTRY.counter(
+    "lmgate_stats_sink_spill_full_total",
+    "Stats entries queued without a spill copy because the ring was full",
+    ("sink",),
+)
+_RECOVERED = REGISTRY.counter(
+    "lmgate_stats_sink_recovered_total",
+    "Stats entries queued again from a sink's spill file at startup",
+    ("sink",),
+)
+_FLUSH_SECONDS = REGISTRY.histogram(
+    "lmgate_stats_sink_flush_duration_seconds",
+    "Time spent delivering one sink batch",
+    ("sink",),
+)
+
+_SINK_DEFAULTS = {
+    "queue_size": 10000,
+    "batch_size": 500,
+    "flush_interval_seconds": 1.0,
+    # Write-ahead ring of queued entries; spill_path defaults to
+    # <stats stem>.<sink name>.spill next to stats.output_path.
+    "spill": False,
+    "spill_bytes": 64 * 1024 * 1024,
+}
+
+
+class Sink(abc.ABC):
+    """Bounded queue of stats entries drained by a background thread.
+
+    Subclasses implement ``send`` (raise to have the batch retried) and
+    optionally ``open``/``shutdown``.
+    """
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        spill_path: str | Path | None = None,
+        spill_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        self.name = name
+        self._queue_size = queue_size
+        self._batch_size = max(1, batch_size)
+        self._flush_interval = flush_interval
+        self._queue: deque[Mapping[str, Any]] = deque()
+        self._spill = SpillRing(spill_path, spill_bytes) if spill_path else None
+        # Spill ring offset after each queued entry (with a spill ring).
+        self._ends: deque[int] = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def open(self) -> None:
+        """Acquire resources; called by ``start`` before the thread runs."""
+
+    @abc.abstractmethod
+    def send(self, batch: list[Mapping[str, Any]]) -> None:
+        """Deliver one batch; raise to have it retried."""
+
+    def shutdown(self) -> None:
+        """Release resources; called by ``close`` after the last batch."""
+
+    def submit(self, entry: Mapping[str, Any]) -> bool:
+        """Queue an entry without blocking; False if it was dropped."""
+        line = to_json_line(entry) if self._spill is not None else b""
+        with self._cond:
+            if len(self._queue) >= self._queue_size:
+                _DROPPED.inc(self.name, "queue_full")
+                return False
+            if self._spill is not None:
+                if not self._spill.append(line):
+                    _SPILL_FULL.inc(self.name)
+                self._ends.append(self._spill.tail)
+            self._queue.append(entry)
+            if len(self._queue) >= self._batch_size:
+                self._cond.notify()
+        return True
+
+    def start(self) -> None:
+        self.open()
+        if self._spill is not None:
+            self._replay()
+        self._thread = threading.Thread(
+            target=self._run, name=f"stats-sink-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def close(self) -> None:
+        """Send what is queued, then stop; gives up after a failed batch."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.shutdown()
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def _replay(self) -> None:
+        """Queue the entries a previous run left in the spill ring."""
+        assert self._spill is not None
+        count = 0
+        for data, end in self._spill.pending():
+            try:
+                entry = json.loads(data)
+            except ValueError:
+                continue
+            self._queue.append(entry)
+            self._ends.append(end)
+            count += 1
+        if count:
+            log.info("Stats sink %s: replaying %d spilled entries", self.name, count)
+            _RECOVERED.inc(self.name, amount=count)
+            _QUEUED.set(len(self._queue), self.name)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._queue) < self._batch_size:
+                    self._cond.wait(self._flush_interval)
+                if not self._queue:
+                    if self._stopping:
+                        return
+                    continue
+                count = min(self._batch_size, len(self._queue))
+                batch = [self._queue.popleft() for _ in range(count)]
+                ends = []
+                if self._spill is not None:
+                    ends = [self._ends.popleft() for _ in range(count)]
+                _QUEUED.set(len(self._queue), self.name)
+            if self._deliver(batch):
+                if ends:
+                    with self._cond:
+                        assert self._spill is not None
+                        self._spill.commit(ends[-1])
+                continue
+            with self._cond:
+                if self._stopping:
+                    # Do not retry at shutdown: drop what is left (a spill
+                    # ring keeps it for the next start).
+                    lost = len(batch) + len(self._queue)
+                    self._queue.clear()
+                    self._ends.clear()
+                    if self._spill is None:
+                        _DROPPED.inc(self.name, "error", amount=lost)
+                    return
+                room = self._queue_size - len(self._queue)
+                if room < len(batch):
+                    _DROPPED.inc(self.name, "queue_full", amount=len(batch) - room)
+                    batch = batch[:room]
+                    ends = ends[:room]
+                self._queue.extendleft(reversed(batch))
+                self._ends.extendleft(reversed(ends))
+                _QUEUED.set(len(self._queue), self.name)
+            # Back off before retrying; close() cuts the wait short.
+            self._stop_event.wait(self._flush_interval)
+
+    def _deliver(self, batch: list[Mapping[str, Any]]) -> bool:
+        start = time.perf_counter()
+        try:
+            self.send(batch)
+        except Exception:
+            _ERRORS.inc(self.name)
+            log.warning(
+                "Stats sink %s failed to send a batch", self.name, exc_info=True
+            )
+            return False
+        _SENT.inc(self.name, amount=len(batch))
+        _FLUSH_SECONDS.observe(time.perf_counter() - start, self.name)
+        return True
+
+
+class JsonlSink(Sink):
+    """Appends entries to another JSONL file."""
+
+    def __init__(self, path: str | Path, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._path = Path(path)
+
+    def open(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+
+    def send(self, batch: list[Mapping[str, Any]]) -> None:
+        data = b"".join(to_json_line(entry) for entry in batch)
+        with open(self._path, "ab") as f:
+            f.write(data)
+
+
+def _metric_part(value: Any) -> str:
+    text = str(value) if value not in (None, "") else "unknown"
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in text)
+
+
+class StatsdSink(Sink):
+    """Sends request counters, token counters and timings over UDP.
+
+    Per record: ``<prefix>.requests.<provider>.<status class>`` (counter),
+    ``<prefix>.input_tokens.<provider>`` and ``.output_tokens.<provider>``
+    (counters) and ``<prefix>.request_time.<provider>`` (timer, ms). Lines
+    are packed into datagrams of at most ``max_packet`` bytes.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8125,
+        prefix: str = "lmgate",
+        max_packet: int = 1432,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self._address = (host, port)
+        self._prefix = prefix
+        self._max_packet = max_packet
+        self._sock: socket.socket | None = None
+
+    def open(self) -> None:
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def shutdown(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def lines(self, entry: Mapping[str, Any]) -> list[str]:
+        provider = _metric_part(entry.get("provider"))
+        cls = status_class(entry.get("status"))
+        lines = [f"{self._prefix}.requests.{provider}.{cls}:1|c"]
+        for field in ("input_tokens", "output_tokens"):
+            if entry.get(field):
+                lines.append(f"{self._prefix}.{field}.{provider}:{entry[field]}|c")
+        if entry.get("request_time") is not None:
+            ms = round(entry["request_time"] * 1000)
+            lines.append(f"{self._prefix}.request_time.{provider}:{ms}|ms")
+        return lines
+
+    def send(self, batch: list[Mapping[str, Any]]) -> None:
+        assert self._sock is not None
+        packet = b""
+        for entry in batch:
+            for line in self.lines(entry):
+                data = line.encode()
+                if packet and len(packet) + 1 + len(data) > self._max_packet:
+                    self._sock.sendto(packet, self._address)
+                    packet = b""
+                packet = packet + b"\n" + data if packet else data
+        if packet:
+            self._sock.sendto(packet, self._address)
+
+
+class SocketSink(Sink):
+    """Streams entries as NDJSON to a Unix or TCP socket.
+
+    ``address`` is ``unix:/path/to.sock`` or ``tcp:host:port``. The
+    connection is opened lazily and re-opened after a failure.
+    """
+
+    def __init__(self, address: str, timeout: float = 5.0, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        kind, _, target = address.partition(":")
+        if kind not in ("unix", "tcp") or not target:
+            raise ValueError("socket sink address must be unix:PATH or tcp:HOST:PORT")
+        self._kind = kind
+        self._target = target
+        self._timeout = timeout
+        self._sock: socket.socket | None = None
+
+    def _connect(self) -> socket.socket:
+        if self._kind == "unix":
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self._timeout)
+            sock.connect(self._target)
+            return sock
+        host, _, port = self._target.rpartition(":")
+        return socket.create_connection((host, int(port)), timeout=self._timeout)
+
+    def send(self, batch: list[Mapping[str, Any]]) -> None:
+        data = b"".join(to_json_line(entry) for entry in batch)
+        if self._sock is None:
+            self._sock = self._connect()
+        try:
+            self._sock.sendall(data)
+        except OSError:
+            self.shutdown()
+            raise
+
+    def shutdown(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+def _require(spec: dict[str, Any], key: str) -> Any:
+    if not spec.get(key):
+        raise ValueError(f"stats sink {spec['name']!r} requires {key!r}")
+    return spec[key]
+
+
+def build_sinks(config: dict[str, Any]) -> list[Sink]:
+    """Sinks from ``stats.sinks``; raises ValueError for invalid entries."""
+    sinks: list[Sink] = []
+    stats_path = Path(config["stats"]["output_path"])
+    for raw in config["stats"]["sinks"] or []:
+        spec = {**_SINK_DEFAULTS, **raw}
+        kind = spec.get("type")
+        spec["name"] = spec.get("name") or kind
+        spill_path = None
+        if spec["spill"]:
+            spill_path = spec.get("spill_path") or stats_path.with_name(
+                f"{stats_path.stem}.{spec['name']}.spill"
+            )
+        common = {
+            "name": spec["name"],
+            "queue_size": spec["queue_size"],
+            "batch_size": spec["batch_size"],
+            "flush_interval": spec["flush_interval_seconds"],
+            "spill_path": spill_path,
+            "spill_bytes": spec["spill_bytes"],
+        }
+        sink: Sink
+        if kind == "jsonl":
+            sink = JsonlSink(_require(spec, "path"), **common)
+        elif kind == "statsd":
+            sink = StatsdSink(
+                spec.get("host", "127.0.0.1"),
+                spec.get("port", 8125),
+                spec.get("prefix", "lmgate"),
+                **common,
+            )
+        elif kind == "socket":
+            sink = SocketSink(_require(spec, "address"), **common)
+        elif kind == "sqlite":
+            from lmgate.statsdb import SQLiteStatsSink
+
+            path = spec.get("path") or stats_path.with_name("stats.db")
+            sink = SQLiteStatsSink(path, spec.get("retention_months", 0), **common)
+        else:
+            raise ValueError(f"unknown stats sink type: {kind!r}")
+        if any(s.name == sink.name for s in sinks):
+            raise ValueError(f"duplicate stats sink name: {sink.name!r}")
+        sinks.append(sink)
+    return sinks
@@ -0,0 +1,150 @@
+"""Write-ahead spill ring for stats records that are not yet delivered.
+
+A stats sink (``lmgate.sinks``) appends every encoded record it queues to a
+fixed-size ring file that is memory-mapped, so an append is a memory copy
+rather than a system call. A successfully sent batch advances the ring's
+head past its records. Records still in the ring when the process dies are
+queued again on the next start.
+
+File layout: a 64-byte header (magic, capacity, head, tail) followed by
+``capacity`` data bytes. ``head`` and ``tail`` are ever-increasing logical
+offsets; the data lives at ``offset % capacity`` and may wrap around the
+end. Each record is framed as ``<length u32><crc32 u32><payload>``. The
+payload is written before the header's tail is updated, so a killed
+process leaves either the whole record or none of it. Pages reach the disk
+when the kernel writes them back, so a machine crash (rather than a process
+crash) can still lose the newest records. A record whose checksum does not
+match ends the replay.
+
+Delivery is at least once: a crash between sending a batch and advancing
+the head replays those records again.
+"""
+
+from __future__ import annotations
+
+import logging
+import mmap
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Any
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"LMGSPIL1"
+_HEADER = struct.Struct("<8sQQQ")
+HEADER_SIZE = 64
+_FRAME = struct.Struct("<II")
+_HEAD_OFFSET = 16
+_TAIL_OFFSET = 24
+
+
+def _valid(stored: tuple[Any, ...], size: int) -> bool:
+    magic, capacity, head, tail = stored
+    return (
+        magic == MAGIC
+        and size == HEADER_SIZE + capacity
+        and 0 <= tail - head <= capacity
+    )
+
+
+class SpillRing:
+    """Append-only ring of byte records in a memory-mapped file."""
+
+    def __init__(self, path: str | Path, capacity: int = 64 * 1024 * 1024) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            header = os.pread(fd, _HEADER.size, 0) if size >= HEADER_SIZE else b""
+            stored = _HEADER.unpack(header) if len(header) == _HEADER.size else None
+            if stored is not None and _valid(stored, size):
+                _, stored_capacity, head, tail = stored
+                if tail != head and stored_capacity != capacity:
+                    # Keep the old size until its records have been replayed.
+                    log.info("Spill file %s keeps its size until drained", path)
+                    capacity = stored_capacity
+                elif stored_capacity != capacity:
+                    head = tail = 0
+            else:
+                if size:
+                    log.warning("Discarding unreadable spill file %s", path)
+                head = tail = 0
+            os.ftruncate(fd, HEADER_SIZE + capacity)
+            self._mm = mmap.mmap(fd, HEADER_SIZE + capacity)
+        finally:
+            os.close(fd)
+        self.capacity = capacity
+        self._head = head
+        self._tail = tail
+        _HEADER.pack_into(self._mm, 0, MAGIC, capacity, head, tail)
+
+    @property
+    def used(self) -> int:
+        """Bytes held by records not yet committed."""
+        return self._tail - self._head
+
+    @property
+    def tail(self) -> int:
+        """Offset after the newest record; ``commit`` it to release all."""
+        return self._tail
+
+    def append(self, data: bytes) -> bool:
+        """Add one record; False (nothing written) if the ring is full."""
+        size = _FRAME.size + len(data)
+        if size > self.capacity - self.used:
+            return False
+        self._put(self._tail, _FRAME.pack(len(data), zlib.crc32(data)) + data)
+        self._tail += size
+        struct.pack_into("<Q", self._mm, _TAIL_OFFSET, self._tail)
+        return True
+
+    def pending(self) -> list[tuple[bytes, int]]:
+        """Uncommitted records, each with the offset to ``commit`` once sent."""
+        records = []
+        offset = self._head
+        while offset < self._tail:
+            if self._tail - offset < _FRAME.size:
+                break
+            length, crc = _FRAME.unpack(self._get(offset, _FRAME.size))
+            if length > self._tail - offset - _FRAME.size:
+                break
+            data = self._get(offset + _FRAME.size, length)
+            if zlib.crc32(data) != crc:
+                break
+            offset += _FRAME.size + length
+            records.append((data, offset))
+        if offset != self._tail:
+            log.warning(
+                "Spill file %s: dropping %d unreadable bytes",
+                self._path,
+                self._tail - offset,
+            )
+        return records
+
+    def commit(self, offset: int) -> None:
+        """Release records up to ``offset`` (from ``pending`` or ``tail``)."""
+        self._head = offset
+        struct.pack_into("<Q", self._mm, _HEAD_OFFSET, offset)
+
+    def close(self) -> None:
+        self._mm.flush()
+        self._mm.close()
+
+    def _put(self, offset: int, data: bytes) -> None:
+        start = offset % self.capacity
+        first = min(len(data), self.capacity - start)
+        self._mm[HEADER_SIZE + start : HEADER_SIZE + start + first] = data[:first]
+        if first < len(data):
+            rest = len(data) - first
+            self._mm[HEADER_SIZE : HEADER_SIZE + rest] = data[first:]
+
+    def _get(self, offset: int, length: int) -> bytes:
+        start = offset % self.capacity
+        first = min(length, self.capacity - start)
+        data = self._mm[HEADER_SIZE + start : HEADER_SIZE + start + first]
+        if first < length:
+            data += self._mm[HEADER_SIZE : HEADER_SIZE + length - first]
+        return data
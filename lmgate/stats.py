@@ -2,17 +2,39 @@
 
 from __future__ import annotations
 
-import json
+import fcntl
 import logging
 import os
 import time
+from collections import deque
+from collections.abc import Mapping
 from pathlib import Path
 from typing import Any
 
+from lmgate.metrics import REGISTRY
 from lmgate.providers import detect_provider, extract_model, extract_tokens
+from lmgate.records import StatsRecord, to_json_line
 
 log = logging.getLogger(__name__)
 
+_BUFFERED = REGISTRY.gauge(
+    "lmgate_stats_writer_buffered_entries", "Stats entries waiting to be flushed"
+)
+_FLUSH_SECONDS = REGISTRY.histogram(
+    "lmgate_stats_writer_flush_duration_seconds", "Time spent flushing stats to disk"
+)
+_ROTATIONS = REGISTRY.counter(
+    "lmgate_stats_writer_rotations_total", "Stats file rotations"
+)
+_FLUSH_ERRORS = REGISTRY.counter(
+    "lmgate_stats_writer_flush_errors_total", "Failed stats file writes"
+)
+_DROPPED = REGISTRY.counter(
+    "lmgate_stats_writer_dropped_total",
+    "Stats entries dropped while the stats file could not be written",
+    ("reason",),
+)
+
 
 def _mask_key(raw_key: str) -> str:
     """Return last 6 characters of the key for debugging."""
@@ -32,60 +54,237 @@ def _extract_raw_key(payload: dict[str, Any]) -> str:
     return payload.get("auth_x_api_key", "")
 
 
-def build_stats_entry(payload: dict[str, Any]) -> dict[str, Any]:
+def _parse_nginx_time(value: Any) -> float | None:
+    """Parse an nginx timing variable (seconds) such as $upstream_response_time.
+
+    nginx reports one value per upstream attempt ("0.120, 0.340") and "-" when
+    no time is available; attempts are summed.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, int | float):
+        return float(value)
+    total = None
+    for part in str(value).replace(":", ",").split(","):
+        part = part.strip()
+        if not part or part == "-":
+            continue
+        try:
+            total = (total or 0.0) + float(part)
+        except ValueError:
+            return None
+    return round(total, 3) if total is not None else None
+
+
+def _count_attempts(value: Any) -> int | None:
+    """Upstream attempts from $upstream_status ("502, 200"), as for timings."""
+    if isinstance(value, int):
+        return value
+    if not value:
+        return None
+    parts = str(value).replace(":", ",").split(",")
+    return sum(1 for part in parts if part.strip()) or None
+
+
+def _wasted_input_tokens(input_tokens: int | None, connect_times: Any) -> int | None:
+    """Input tokens sent again by retries, from $upstream_connect_time.
+
+    Each earlier attempt that connected (a value other than "-") sent the
+    same prompt; None unless the request was retried.
+    """
+    if not isinstance(connect_times, str):
+        return None
+    parts = connect_times.replace(":", ",").split(",")
+    if not input_tokens or len(parts) < 2:
+        return None
+    return input_tokens * sum(1 for part in parts[:-1] if part.strip() not in ("", "-"))
+
+
+def _response_bytes(payload: dict[str, Any], response_body: str) -> int | None:
+    """Response size as counted by njs, or the length of the captured body."""
+    size = payload.get("response_bytes")
+    if isinstance(size, int):
+        return size
+    return len(response_body.encode()) if response_body else None
+
+
+def _is_streaming(payload: dict[str, Any], response_body: str) -> bool:
+    content_type = payload.get("content_type") or ""
+    if content_type:
+        return content_type.startswith("text/event-stream")
+    return response_body.lstrip().startswith(("data:", "event:"))
+
+
+def _tokens_per_second(tokens: int | None, seconds: float | None) -> float | None:
+    if not tokens or not seconds:
+        return None
+    return round(tokens / seconds, 2)
+
+
+def build_stats_entry(payload: dict[str, Any]) -> StatsRecord:
     """Build a stats JSONL entry from the njs POST payload."""
     host = payload.get("host", "")
     provider = detect_provider(host)
     response_body = payload.get("response_body", "")
 
     input_tokens, output_tokens = extract_tokens(provider, response_body)
-    model = extract_model(response_body)
+    model = extract_model(response_body, provider)
     raw_key = _extract_raw_key(payload)
+    upstream_response_time = _parse_nginx_time(payload.get("upstream_response_time"))
+    # $upstream_cache_status: HIT, MISS, BYPASS, ... (None when not cacheable)
+    cache_status = payload.get("cache_status") or None
+    if cache_status == "HIT":
+        # Served from the response cache: no upstream tokens were used.
+        input_tokens = output_tokens = 0
 
-    return {
-        "timestamp": payload.get("timestamp"),
-        "lmgate_id": payload.get("lmgate_internal_id"),
-        "provider": provider,
-        "endpoint": payload.get("uri"),
-        "model": model,
-        "status": payload.get("status"),
-        "input_tokens": input_tokens,
-        "output_tokens": output_tokens,
-        "masked_key": _mask_key(raw_key),
-        "error_type": None,
-    }
+    return StatsRecord(
+        timestamp=payload.get("timestamp"),
+        lmgate_id=payload.get("lmgate_internal_id"),
+        provider=provider,
+        endpoint=payload.get("uri"),
+        model=model,
+        status=payload.get("status"),
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        masked_key=_mask_key(raw_key),
+        error_type=None,
+        upstream_connect_time=_parse_nginx_time(payload.get("upstream_connect_time")),
+        upstream_header_time=_parse_nginx_time(payload.get("upstream_header_time")),
+        upstream_response_time=upstream_response_time,
+        request_time=_parse_nginx_time(payload.get("request_time")),
+        output_tokens_per_second=_tokens_per_second(
+            output_tokens, upstream_response_time
+        ),
+        response_bytes=_response_bytes(payload, response_body),
+        streaming=_is_streaming(payload, response_body),
+        cache_status=cache_status,
+        # Waited for an identical in-flight request (cache singleflight).
+        coalesced=bool(payload.get("coalesced")),
+        # Routed providers: the target /auth picked (lmgate.routing).
+        target=payload.get("target") or None,
+        # More than 1 when nginx retried the upstream (provider retry).
+        attempts=_count_attempts(payload.get("attempts")),
+        wasted_input_tokens=_wasted_input_tokens(
+            input_tokens, payload.get("upstream_connect_time")
+        ),
+        # Half-open circuit probe tag from /auth (lmgate.breaker).
+        probe=payload.get("probe") or None,
+    )
 
 
 class StatsWriter:
-    """Append-only JSONL writer with size-based rotation."""
+    """Append-only JSONL writer with size-based rotation.
+
+    Accepts ``StatsRecord`` objects (encoded straight to bytes) as well as
+    plain dicts. Pending entries are held in memory; a failed flush keeps
+    the entries that were not written for the next attempt. At most
+    ``max_buffered`` entries are kept, and the oldest are dropped beyond
+    that.
+
+    nginx appends to the same file without taking any lock, so a write
+    that fails halfway is never cut back: the entries written in full are
+    done, and a torn last line is left in place and ended by a newline on
+    the next flush. Readers skip it as a malformed line.
 
-    def __init__(self, path: str, max_bytes: int = 100 * 1024 * 1024) -> None:
+    With ``shared`` (several worker processes writing the same file), each
+    flush holds an exclusive ``flock`` on ``.<name>.lock`` next to the file,
+    so only one process checks the size and rotates at a time.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 100 * 1024 * 1024,
+        max_buffered: int = 100_000,
+        shared: bool = False,
+    ) -> None:
         self._path = path
+        self._lock_path = (
+            Path(path).with_name(f".{Path(path).name}.lock") if shared else None
+        )
         self._max_bytes = max_bytes
-        self._buffer: list[dict[str, Any]] = []
+        self._max_buffered = max_buffered
+        self._buffer: deque[Mapping[str, Any]] = deque()
+        # A failed write ended in the middle of a line.
+        self._torn = False
+        self._written = 0
         self._ensure_dir()
 
     def _ensure_dir(self) -> None:
         Path(self._path).parent.mkdir(parents=True, exist_ok=True)
 
-    def write(self, entry: dict[str, Any]) -> None:
+    def write(self, entry: Mapping[str, Any]) -> None:
         """Buffer a stats entry."""
+        if len(self._buffer) >= self._max_buffered:
+            self._buffer.popleft()
+            _DROPPED.inc("buffer_full")
         self._buffer.append(entry)
+        _BUFFERED.set(len(self._buffer))
 
     def flush(self) -> None:
-        """Write buffered entries to disk and rotate if needed."""
+        """Write pending entries to disk and rotate if needed.
+
+        Errors are logged and counted; the entries not written stay pending.
+        """
         if not self._buffer:
             return
-        self._rotate_if_needed()
-        with open(self._path, "a") as f:
-            for entry in self._buffer:
-                f.write(json.dumps(entry) + "\n")
+        lines = [to_json_line(entry) for entry in self._buffer]
+        prefix = b"\n" if self._torn else b""
+        data = prefix + b"".join(lines)
+        start = time.perf_counter()
+        self._written = 0
+        try:
+            if self._lock_path is None:
+                self._rotate_if_needed()
+                self._append(data)
+            else:
+                self._locked_append(data)
+        except OSError:
+            _FLUSH_ERRORS.inc()
+            log.warning("Failed to write stats to %s", self._path, exc_info=True)
+            if self._written >= len(prefix):
+                self._drop_written(lines, self._written - len(prefix))
+            return
+        self._torn = False
         self._buffer.clear()
+        _BUFFERED.set(0)
+        _FLUSH_SECONDS.observe(time.perf_counter() - start)
+
+    def _drop_written(self, lines: list[bytes], written: int) -> None:
+        """Forget the entries of a failed flush that reached the file."""
+        for line in lines:
+            if written < len(line):
+                break
+            written -= len(line)
+            self._buffer.popleft()
+        self._torn = written > 0
+        _BUFFERED.set(len(self._buffer))
 
     def close(self) -> None:
         """Flush remaining entries."""
         self.flush()
 
+    def _append(self, data: bytes) -> None:
+        # Unbuffered, so self._written tells how much reached the file.
+        fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            view = memoryview(data)
+            while self._written < len(data):
+                self._written += os.write(fd, view[self._written :])
+        finally:
+            os.close(fd)
+
+    def _locked_append(self, data: bytes) -> None:
+        assert self._lock_path is not None
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            self._rotate_if_needed()
+            self._append(data)
+        finally:
+            # Closing the descriptor releases the lock.
+            os.close(fd)
+
     def _rotate_if_needed(self) -> None:
         """Rotate the file if it exceeds max_bytes."""
         try:
@@ -96,4 +295,5 @@ class StatsWriter:
             suffix = time.strftime("%Y%m%d%H%M%S")
             rotated = f"{self._path}.{suffix}"
             os.rename(self._path, rotated)
+            _ROTATIONS.inc()
             log.info("Rotated stats file to %s", rotated)
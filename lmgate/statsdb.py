@@ -0,0 +1,202 @@
+"""Optional SQLite sink for stats records.
+
+Configured as a ``stats.sinks`` entry of type ``sqlite`` (see
+``lmgate.sinks`` for queueing and batching); each batch is written with one
+``executemany`` per month into a database in WAL mode (readers never block
+the writer). Rows are partitioned into one table per UTC month
+(``stats_202603``), each indexed on time and on (lmgate_id, time), so
+retention is a ``DROP TABLE`` and a query only touches the months it
+covers. The ``stats`` view is the union of all month tables for ad-hoc
+SQL:
+
+    sqlite3 /data/stats.db "SELECT model, SUM(output_tokens) FROM stats
+                            WHERE lmgate_id = '3' GROUP BY model"
+
+Several worker processes may share one database; writes are serialized by
+SQLite's file lock (``busy_timeout`` waits for it).
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import sqlite3
+import time
+from collections.abc import Mapping
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+from lmgate.sinks import Sink
+
+log = logging.getLogger(__name__)
+
+# (column, SQL type) in insert order; ``ts`` is the timestamp in epoch
+# seconds, derived on insert and used by the indexes.
+COLUMNS = (
+    ("ts", "REAL"),
+    ("timestamp", "TEXT"),
+    ("lmgate_id", "TEXT"),
+    ("provider", "TEXT"),
+    ("endpoint", "TEXT"),
+    ("model", "TEXT"),
+    ("status", "INTEGER"),
+    ("input_tokens", "INTEGER"),
+    ("output_tokens", "INTEGER"),
+    ("masked_key", "TEXT"),
+    ("error_type", "TEXT"),
+    ("upstream_connect_time", "REAL"),
+    ("upstream_header_time", "REAL"),
+    ("upstream_response_time", "REAL"),
+    ("request_time", "REAL"),
+    ("output_tokens_per_second", "REAL"),
+    ("response_bytes", "INTEGER"),
+    ("streaming", "INTEGER"),
+    ("cache_status", "TEXT"),
+    ("coalesced", "INTEGER"),
+    ("target", "TEXT"),
+    ("attempts", "INTEGER"),
+    ("wasted_input_tokens", "INTEGER"),
+)
+_ENTRY_FIELDS = [name for name, _ in COLUMNS[1:]]
+_TABLE_RE = re.compile(r"^stats_(\d{6})$")
+
+
+def table_name(ts: float) -> str:
+    """Month table for an epoch timestamp: stats_YYYYMM (UTC)."""
+    return "stats_" + datetime.fromtimestamp(ts, UTC).strftime("%Y%m")
+
+
+def _entry_time(entry: Mapping[str, Any]) -> float:
+    try:
+        parsed = datetime.fromisoformat(entry["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=UTC)
+    return parsed.timestamp()
+
+
+def _month_index(month: str) -> int:
+    """YYYYMM -> months since year 0, for retention arithmetic."""
+    return int(month[:4]) * 12 + int(month[4:]) - 1
+
+
+def connect(path: str | Path) -> sqlite3.Connection:
+    """Open the stats database in WAL mode."""
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def month_tables(conn: sqlite3.Connection) -> list[str]:
+    """Existing month tables, oldest first."""
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'stats_%'"
+    ).fetchall()
+    return sorted(name for (name,) in rows if _TABLE_RE.match(name))
+
+
+class SQLiteStatsSink(Sink):
+    """Inserts batches of stats entries into monthly tables."""
+
+    def __init__(
+        self, path: str | Path, retention_months: int = 0, **kwargs: Any
+    ) -> None:
+        kwargs.setdefault("name", "sqlite")
+        super().__init__(**kwargs)
+        self._path = Path(path)
+        self._retention_months = retention_months
+        self._conn: sqlite3.Connection | None = None
+        self._tables: set[str] = set()
+        self._retention_checked: str | None = None
+
+    def open(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = connect(self._path)
+        self._tables = set(month_tables(self._conn))
+        self._add_missing_columns()
+
+    def shutdown(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def send(self, batch: list[Mapping[str, Any]]) -> None:
+        """Insert a batch in one transaction (one executemany per month)."""
+        assert self._conn is not None
+        by_table: dict[str, list[tuple[Any, ...]]] = {}
+        for entry in batch:
+            ts = _entry_time(entry)
+            row = (ts, *(entry.get(f) for f in _ENTRY_FIELDS))
+            by_table.setdefault(table_name(ts), []).append(row)
+        placeholders = ", ".join("?" * len(COLUMNS))
+        with self._conn:
+            for table, rows in by_table.items():
+                self._ensure_table(table)
+                self._conn.executemany(
+                    f"INSERT INTO {table} VALUES ({placeholders})", rows
+                )
+        self._apply_retention()
+
+    def _ensure_table(self, table: str) -> None:
+        if table in self._tables:
+            return
+        assert self._conn is not None
+        columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS)
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_ts ON {table} (ts)")
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_id_ts ON {table} (lmgate_id, ts)"
+        )
+        self._tables = set(month_tables(self._conn)) | {table}
+        self._create_view()
+
+    def _add_missing_columns(self) -> None:
+        """Add columns introduced after a month table was created."""
+        assert self._conn is not None
+        added = False
+        with self._conn:
+            for table in sorted(self._tables):
+                existing = {
+                    row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")
+                }
+                for name, kind in COLUMNS:
+                    if name not in existing:
+                        self._conn.execute(
+                            f"ALTER TABLE {table} ADD COLUMN {name} {kind}"
+                        )
+                        added = True
+            if added:
+                self._create_view()
+
+    def _create_view(self) -> None:
+        assert self._conn is not None
+        self._conn.execute("DROP VIEW IF EXISTS stats")
+        union = " UNION ALL ".join(f"SELECT * FROM {t}" for t in sorted(self._tables))
+        self._conn.execute(f"CREATE VIEW stats AS {union}")
+
+    def _apply_retention(self) -> None:
+        """Drop month tables older than ``retention_months`` (once a month)."""
+        current = datetime.now(UTC).strftime("%Y%m")
+        if not self._retention_months or self._retention_checked == current:
+            return
+        assert self._conn is not None
+        oldest = _month_index(current) - self._retention_months + 1
+        expired = [
+            t
+            for t in month_tables(self._conn)
+            if _month_index(t.removeprefix("stats_")) < oldest
+        ]
+        if expired:
+            with self._conn:
+                for table in expired:
+                    self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self._tables = set(month_tables(self._conn))
+                if self._tables:
+                    self._create_view()
+                else:
+                    self._conn.execute("DROP VIEW IF EXISTS stats")
+            log.info("Dropped expired stats tables: %s", ", ".join(expired))
+        self._retention_checked = current
@@ -0,0 +1,192 @@
+"""Live stats feed: ``GET /stats/stream`` pushes records as NDJSON.
+
+Every record read back from the stats file (``lmgate.ingest``) gets a
+sequence number and is kept in a bounded history ring. Numbering starts
+at the process start time in microseconds, so offsets handed out after a
+restart are always above any offset a client saw before it. Subscribers
+receive records that match their filters, one JSON object per line with an
+``offset`` field added. A client that reconnects with
+``?after=<last offset seen>`` first gets the matching records it missed
+from the ring; if some of them have already left the ring, or the offset
+is from before a restart, a ``{"gap": {"after": N, "next": M}}`` line says
+so. Offsets are not shared
+between worker processes, so ``?after=`` is rejected with several workers.
+
+Publishing never waits on a subscriber: each one has a bounded queue of
+pending lines, and a subscriber whose queue overflows (a client reading
+slower than records arrive), or that does not accept a write within the
+heartbeat interval, is disconnected.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import deque
+from collections.abc import Collection, Mapping
+from typing import Any
+
+from aiohttp import web
+
+from lmgate.metrics import REGISTRY
+
+_SUBSCRIBERS = REGISTRY.gauge(
+    "lmgate_stats_stream_subscribers", "Connected /stats/stream subscribers"
+)
+_DISCONNECTS = REGISTRY.counter(
+    "lmgate_stats_stream_slow_disconnects_total",
+    "Subscribers disconnected because their buffer overflowed",
+)
+
+
+def _encode(offset: int, entry: Mapping[str, Any]) -> bytes:
+    return (json.dumps({"offset": offset, **entry}) + "\n").encode()
+
+
+class Subscriber:
+    """One stream client: filters plus a bounded queue of pending lines."""
+
+    def __init__(
+        self,
+        lmgate_ids: Collection[str] = (),
+        providers: Collection[str] = (),
+        max_pending: int = 1000,
+    ) -> None:
+        self.lmgate_ids = frozenset(lmgate_ids)
+        self.providers = frozenset(providers)
+        self.max_pending = max_pending
+        self.pending: deque[bytes] = deque()
+        # Replayed history, sent before pending and not counted against it.
+        self.backlog: list[bytes] = []
+        self.overflowed = False
+        self.wakeup = asyncio.Event()
+
+    def matches(self, entry: Mapping[str, Any]) -> bool:
+        if self.lmgate_ids and entry.get("lmgate_id") not in self.lmgate_ids:
+            return False
+        return not self.providers or entry.get("provider") in self.providers
+
+    def offer(self, line: bytes) -> None:
+        if self.overflowed:
+            return
+        if len(self.pending) >= self.max_pending:
+            self.overflowed = True
+            self.pending.clear()
+        else:
+            self.pending.append(line)
+        self.wakeup.set()
+
+
+class StatsFeed:
+    """Fan-out of ingested records to stream subscribers, with history."""
+
+    def __init__(self, history_size: int = 10000, start: int | None = None) -> None:
+        self._history: deque[tuple[int, Mapping[str, Any]]] = deque(maxlen=history_size)
+        self._subscribers: set[Subscriber] = set()
+        # A per-process epoch rather than 0: an offset from an earlier process
+        # is below the oldest one here and gets a gap line, instead of
+        # silently matching unrelated records. Stays below 2**53 (JSON-safe).
+        self.last_offset = time.time_ns() // 1000 if start is None else start
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, entry: Mapping[str, Any]) -> None:
+        self.last_offset += 1
+        self._history.append((self.last_offset, entry))
+        line = None
+        for subscriber in self._subscribers:
+            if subscriber.matches(entry):
+                if line is None:
+                    line = _encode(self.last_offset, entry)
+                subscriber.offer(line)
+
+    def subscribe(self, subscriber: Subscriber, after: int | None = None) -> None:
+        """Register a subscriber, first queueing history after ``after``."""
+        if after is not None:
+            oldest = self._history[0][0] if self._history else self.last_offset + 1
+            if after + 1 < oldest or after > self.last_offset:
+                gap = {"gap": {"after": after, "next": oldest}}
+                subscriber.backlog.append((json.dumps(gap) + "\n").encode())
+            subscriber.backlog.extend(
+                _encode(offset, entry)
+                for offset, entry in self._history
+                if offset > after and subscriber.matches(entry)
+            )
+            if subscriber.backlog:
+                subscriber.wakeup.set()
+        self._subscribers.add(subscriber)
+        _SUBSCRIBERS.set(len(self._subscribers))
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+        _SUBSCRIBERS.set(len(self._subscribers))
+
+
+def _csv(value: str | None) -> list[str]:
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+
+async def stats_stream(request: web.Request) -> web.StreamResponse:
+    """Stream matching stats records (?lmgate_id=, ?provider=, ?after=)."""
+    config = request.app["config"]
+    stream_config = config["stats"]["stream"]
+    feed: StatsFeed = request.app["stats_feed"]
+    try:
+        after = int(request.query["after"]) if "after" in request.query else None
+    except ValueError:
+        return web.Response(status=400, text="invalid after")
+    if after is not None and config["server"]["workers"] > 1:
+        # Offsets are per process; a reconnect may land on another worker.
+        return web.Response(
+            status=400, text="after is not supported with server.workers > 1"
+        )
+    if feed.subscriber_count >= stream_config["max_subscribers"]:
+        return web.Response(status=503, text="too many subscribers")
+
+    subscriber = Subscriber(
+        _csv(request.query.get("lmgate_id")),
+        _csv(request.query.get("provider")),
+        stream_config["buffer_size"],
+    )
+    response = web.StreamResponse(
+        headers={"Content-Type": "application/x-ndjson", "Cache-Control": "no-cache"}
+    )
+    await response.prepare(request)
+    feed.subscribe(subscriber, after)
+    heartbeat = stream_config["heartbeat_seconds"]
+
+    async def send(data: bytes) -> None:
+        # A client that stops reading blocks the write; treat it as slow.
+        await asyncio.wait_for(response.write(data), heartbeat)
+
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.wakeup.wait(), heartbeat)
+            except TimeoutError:
+                # Blank line: keeps proxies from timing out, detects gone clients.
+                await send(b"\n")
+                continue
+            subscriber.wakeup.clear()
+            if subscriber.backlog:
+                chunk = b"".join(subscriber.backlog)
+                subscriber.backlog.clear()
+                await send(chunk)
+            if subscriber.overflowed:
+                _DISCONNECTS.inc()
+                await send(b'{"error": "slow_consumer"}\n')
+                break
+            if subscriber.pending:
+                chunk = b"".join(subscriber.pending)
+                subscriber.pending.clear()
+                await send(chunk)
+    except TimeoutError:
+        _DISCONNECTS.inc()
+    except ConnectionResetError:
+        pass
+    finally:
+        feed.unsubscribe(subscriber)
+    return response
@@ -0,0 +1,208 @@
+"""Multi-process mode: a supervisor forking N aiohttp workers on one port.
+
+Each worker binds the configured port with SO_REUSEPORT so the kernel
+spreads connections across workers. The supervisor owns the allow-list:
+it parses the CSV once per change and publishes a snapshot that workers
+load instead of re-parsing the CSV.
+
+All workers append to and follow the one stats file nginx writes (under a
+lock, see ``StatsWriter``), so every worker sees every completed request
+and counts budgets, routing scores and circuits for all of them. Files
+only one process may own are split per worker or left to worker 0:
+
+- budgets:     budgets.json -> budgets.w<N>.json (each with all usage)
+- rollups and stats sinks (with their spill rings) run in worker 0 only,
+  so they see each record once.
+
+In-flight slots are per process, and a worker cannot tell which of its
+peers admitted a completed request, so ``limits.max_in_flight_per_key`` is
+rejected with several workers.
+"""
+
+from __future__ import annotations
+
+import copy
+import logging
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from types import FrameType
+from typing import Any
+
+from lmgate.allowlist import AllowList, SnapshotAllowList
+from lmgate.eventloop import new_event_loop
+from lmgate.server import check_worker_config, create_app
+
+log = logging.getLogger(__name__)
+
+_SNAPSHOT_NAME = "allowlist.snapshot"
+# A worker exiting sooner than this after its start counts as a failed
+# start; consecutive failed starts are restarted with exponential backoff.
+_FAST_EXIT_SECONDS = 10.0
+_MAX_RESPAWN_DELAY_SECONDS = 60.0
+
+
+def worker_path(path: str | Path, index: int) -> Path:
+    """Per-worker variant of a file path: budgets.json -> budgets.w0.json."""
+    p = Path(path)
+    return p.with_name(f"{p.stem}.w{index}{p.suffix}")
+
+
+def _worker_config(config: dict[str, Any], index: int) -> dict[str, Any]:
+    worker_config = copy.deepcopy(config)
+    stats_path = Path(config["stats"]["output_path"])
+    budgets_path = config["budgets"]["checkpoint_path"] or stats_path.with_name(
+        "budgets.json"
+    )
+    worker_config["budgets"]["checkpoint_path"] = str(worker_path(budgets_path, index))
+    if index:
+        worker_config["rollups"]["enabled"] = False
+        worker_config["stats"]["sinks"] = []
+    return worker_config
+
+
+def _respawn_delay(fast_exits: int) -> float:
+    """Seconds to wait before restarting a worker: 0, then 1, 2, 4, ... 60."""
+    if fast_exits <= 0:
+        return 0.0
+    return min(2.0 ** (fast_exits - 1), _MAX_RESPAWN_DELAY_SECONDS)
+
+
+def _run_worker(config: dict[str, Any], index: int, snapshot: Path) -> None:
+    """Worker process entry point."""
+    from aiohttp import web
+
+    # Drop the supervisor's handlers; run_app installs its own.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    worker_config = _worker_config(config, index)
+    loop = new_event_loop(worker_config["server"]["event_loop"])
+    app = create_app(worker_config, allowlist=SnapshotAllowList(snapshot))
+    log.info("Worker %d started", index)
+    web.run_app(
+        app,
+        port=worker_config["server"]["port"],
+        reuse_port=True,
+        print=None,
+        loop=loop,
+    )
+
+
+class Supervisor:
+    """Fork workers, keep them alive, and publish allow-list snapshots."""
+
+    def __init__(self, config: dict[str, Any]) -> None:
+        self._config = config
+        self._workers: dict[int, BaseProcess] = {}
+        # Monotonic start time, consecutive fast exits and pending restart
+        # time per worker index.
+        self._started: dict[int, float] = {}
+        self._fast_exits: dict[int, int] = {}
+        self._respawn_at: dict[int, float] = {}
+        self._stopping = False
+        self._ctx = multiprocessing.get_context("fork")
+        self._runtime_dir = Path(tempfile.mkdtemp(prefix="lmgate-"))
+        self._snapshot = self._runtime_dir / _SNAPSHOT_NAME
+        self._allowlist = AllowList(Path(config["auth"]["allowlist_path"]))
+        # Self-pipe so a signal wakes the supervision wait immediately.
+        self._wakeup_r, self._wakeup_w = os.pipe()
+
+    def run(self) -> None:
+        """Start workers and supervise until SIGTERM/SIGINT."""
+        self._allowlist.load()
+        self._allowlist.save_snapshot(self._snapshot)
+
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+
+        for index in range(self._config["server"]["workers"]):
+            self._spawn(index)
+        log.info(
+            "Supervisor started %d workers on port %d",
+            len(self._workers),
+            self._config["server"]["port"],
+        )
+
+        interval = self._config["auth"]["poll_interval_seconds"]
+        while not self._stopping:
+            sentinels = [p.sentinel for p in self._workers.values()]
+            timeout = interval
+            if self._respawn_at:
+                next_respawn = min(self._respawn_at.values()) - time.monotonic()
+                timeout = min(interval, max(0.0, next_respawn))
+            wait([*sentinels, self._wakeup_r], timeout)
+            if self._stopping:
+                break
+            self._respawn_exited()
+            self._publish_allowlist()
+
+        self._shutdown()
+
+    def _spawn(self, index: int) -> None:
+        process = self._ctx.Process(
+            target=_run_worker,
+            args=(self._config, index, self._snapshot),
+            name=f"lmgate-worker-{index}",
+        )
+        process.start()
+        self._workers[index] = process
+        self._started[index] = time.monotonic()
+
+    def _respawn_exited(self) -> None:
+        """Schedule restarts of exited workers and start those that are due."""
+        now = time.monotonic()
+        for index, process in list(self._workers.items()):
+            if process.is_alive():
+                continue
+            del self._workers[index]
+            if now - self._started[index] < _FAST_EXIT_SECONDS:
+                self._fast_exits[index] = self._fast_exits.get(index, 0) + 1
+            else:
+                self._fast_exits[index] = 0
+            delay = _respawn_delay(self._fast_exits[index])
+            log.warning(
+                "Worker %d exited with code %s, restarting in %.0fs",
+                index,
+                process.exitcode,
+                delay,
+            )
+            self._respawn_at[index] = now + delay
+        for index, due in list(self._respawn_at.items()):
+            if due <= now:
+                del self._respawn_at[index]
+                self._spawn(index)
+
+    def _publish_allowlist(self) -> None:
+        try:
+            if self._allowlist.reload_if_changed():
+                self._allowlist.save_snapshot(self._snapshot)
+        except Exception:
+            log.warning("Allow-list reload failed", exc_info=True)
+
+    def _handle_signal(self, signum: int, frame: FrameType | None) -> None:
+        self._stopping = True
+        os.write(self._wakeup_w, b"\0")
+
+    def _shutdown(self) -> None:
+        log.info("Supervisor stopping %d workers", len(self._workers))
+        for process in self._workers.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._workers.values():
+            process.join()
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+        self._snapshot.unlink(missing_ok=True)
+        self._runtime_dir.rmdir()
+
+
+def run_workers(config: dict[str, Any]) -> None:
+    """Run lmgate as a supervisor with ``server.workers`` worker processes."""
+    check_worker_config(config)
+    Supervisor(config).run()
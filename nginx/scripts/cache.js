@@ -0,0 +1,94 @@
+// cache.js — Routing into the exact-match response cache.
+// Provider locations hand every authorized request to route() (js_content),
+// which redirects it to the internal /_cached/<provider>/ location (nginx
+// proxy_cache) or to /_direct/<provider>/ (plain proxy, no buffering).
+//
+// A request goes to the cache when /auth enabled caching for its key
+// ($lmgate_cache, from X-LMGate-Cache) and its body is a JSON object with
+// temperature 0 (top-level, or generationConfig.temperature for Google).
+// $lmgate_body_hash is the SHA-256 of the body with object keys sorted, so
+// key order and whitespace do not split the cache; nginx combines it with
+// the provider path and the key's tenant hash into the cache key.
+//
+// Singleflight: nginx's proxy_cache_lock makes identical cacheable requests
+// wait for the first one's response. route() records the first request's
+// key in the lmgate_inflight shared dict ($lmgate_inflight_key, removed by
+// stats.js when its response completes) and flags later identical requests
+// as followers ($lmgate_follower) so stats can mark them as coalesced.
+// route() runs before the cache lookup, so headers() removes the key again
+// when the first request turns out to be a HIT: only requests that fetch
+// from the upstream have followers. An identical request that arrives
+// during the lookup itself is still flagged.
+
+var crypto = require("crypto");
+
+function normalize(value) {
+    if (Array.isArray(value)) {
+        return "[" + value.map(normalize).join(",") + "]";
+    }
+    if (value !== null && typeof value === "object") {
+        var keys = Object.keys(value).sort();
+        var parts = [];
+        for (var i = 0; i < keys.length; i++) {
+            parts.push(JSON.stringify(keys[i]) + ":" + normalize(value[keys[i]]));
+        }
+        return "{" + parts.join(",") + "}";
+    }
+    return JSON.stringify(value);
+}
+
+function temperature(body) {
+    if (typeof body.temperature === "number") return body.temperature;
+    var config = body.generationConfig;
+    if (config && typeof config.temperature === "number") return config.temperature;
+    return null;
+}
+
+// Body hash for a cacheable request, "" otherwise.
+function body_hash(r) {
+    if (r.method !== "POST" || r.variables.lmgate_cache !== "1") return "";
+    // Undefined when the body did not fit in client_body_buffer_size.
+    var text = r.requestText;
+    if (!text) return "";
+    var body;
+    try {
+        body = JSON.parse(text);
+    } catch (e) {
+        return "";
+    }
+    if (!body || typeof body !== "object" || Array.isArray(body)) return "";
+    if (temperature(body) !== 0) return "";
+    return crypto.createHash("sha256").update(normalize(body)).digest("hex");
+}
+
+function route(r) {
+    var hash = "";
+    try {
+        hash = body_hash(r);
+    } catch (e) {
+        // Caching is best-effort; never fail the request over it.
+    }
+    r.variables.lmgate_body_hash = hash;
+    var path = r.uri;
+    if (r.variables.args) path += "?" + r.variables.args;
+    if (hash) {
+        var key = path + "|" + r.variables.lmgate_tenant + "|" + hash;
+        if (ngx.shared.lmgate_inflight.add(key, 1)) {
+            r.variables.lmgate_inflight_key = key;
+        } else {
+            r.variables.lmgate_follower = "1";
+        }
+    }
+    r.internalRedirect((hash ? "/_cached" : "/_direct") + path);
+}
+
+// js_header_filter of the /_cached locations.
+function headers(r) {
+    var key = r.variables.lmgate_inflight_key;
+    if (key && r.variables.upstream_cache_status === "HIT") {
+        ngx.shared.lmgate_inflight.delete(key);
+        r.variables.lmgate_inflight_key = "";
+    }
+}
+
+export default { route, headers };
@@ -0,0 +1,9 @@
+// Generated by `python -m lmgate render-nginx` from config/lmgate.yaml.
+// Do not edit; change the config and render again.
+
+// Upstream host -> provider name and response field paths (stats.js).
+export default {
+    "api.openai.com": {"name": "openai", "input": ["usage", "prompt_tokens"], "output": ["usage", "completion_tokens"], "model": ["model"], "streaming": ["sse"]},
+    "api.anthropic.com": {"name": "anthropic", "input": ["usage", "input_tokens"], "output": ["usage", "output_tokens"], "model": ["model"], "streaming": ["sse"]},
+    "aiplatform.googleapis.com": {"name": "google", "input": ["usageMetadata", "promptTokenCount"], "output": ["usageMetadata", "candidatesTokenCount"], "model": ["model"], "streaming": ["sse", "json-array"]}
+};
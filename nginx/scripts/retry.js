@@ -0,0 +1,76 @@
+// retry.js — Delayed retries of failed upstream attempts.
+// Providers with retry.backoff_seconds hand the failed responses of their
+// retry.on conditions to @lmgate_retry (error_page with
+// proxy_intercept_errors, so nothing has reached the client yet). again()
+// waits, then redirects the request back to the /_direct/ or /_cached/
+// location it came from, which sends the kept request body upstream again.
+//
+// The wait before attempt n + 1 is random between 0 and backoff * 2^(n-1),
+// capped at max_backoff ("full jitter": clients failing together do not
+// retry together). A Retry-After header of the failed response is waited
+// out instead; when it is longer than max_backoff, or the wait would end
+// after `timeout` seconds into the request, no further attempt is made.
+//
+// The settings come from $lmgate_retry, set by the proxy location:
+// "tries timeout backoff max_backoff".
+//
+// Giving up returns the last status with a JSON error, and its Retry-After.
+// The failed response bodies are discarded by nginx. Every attempt is one
+// entry of $upstream_status ("503 : 503 : 200"), so stats.js counts them.
+
+// Seconds to wait for a Retry-After value (seconds or HTTP date), or null.
+function retry_after(value) {
+    if (!value) return null;
+    if (/^\s*\d+\s*$/.test(value)) return parseInt(value, 10);
+    var date = Date.parse(value);
+    if (isNaN(date)) return null;
+    return Math.max(0, (date - Date.now()) / 1000);
+}
+
+function settings(value) {
+    var parts = String(value || "").trim().split(/\s+/).map(parseFloat);
+    if (parts.length !== 4 || parts.some(isNaN)) return null;
+    return {tries: parts[0], timeout: parts[1], backoff: parts[2], max_backoff: parts[3]};
+}
+
+function give_up(r, status, attempts) {
+    var wait = r.variables.upstream_http_retry_after;
+    if (wait) r.headersOut["Retry-After"] = wait;
+    r.headersOut["Content-Type"] = "application/json";
+    r.return(status, JSON.stringify({
+        error: "upstream_error",
+        status: status,
+        attempts: attempts
+    }));
+}
+
+function again(r) {
+    var statuses = String(r.variables.upstream_status || "").split(/[,:]/);
+    var attempts = statuses.length;
+    // 502 for connection failures, 504 for timeouts.
+    var status = parseInt(statuses[attempts - 1], 10) || 502;
+    var retry = settings(r.variables.lmgate_retry);
+    if (!retry || attempts >= retry.tries) {
+        give_up(r, status, attempts);
+        return;
+    }
+
+    var delay = retry_after(r.variables.upstream_http_retry_after);
+    if (delay === null) {
+        var cap = Math.min(retry.max_backoff, retry.backoff * Math.pow(2, attempts - 1));
+        delay = Math.random() * cap;
+    }
+    var elapsed = parseFloat(r.variables.request_time) || 0;
+    if (delay > retry.max_backoff || elapsed + delay > retry.timeout) {
+        give_up(r, status, attempts);
+        return;
+    }
+
+    var path = r.uri;
+    if (r.variables.args) path += "?" + r.variables.args;
+    setTimeout(function () {
+        r.internalRedirect(path);
+    }, delay * 1000);
+}
+
+export default { again };
@@ -5,29 +5,41 @@
 // Note: ngx.fetch() is async and NOT supported in js_body_filter.
 // We use synchronous fs.appendFileSync() instead.
 
+import providers from "providers.js";
+
 var fs = require("fs");
 
 var body_buffer = "";
 var MAX_BODY_SIZE = 2 * 1024 * 1024; // 2 MB cap
 var truncated = false;
+var response_bytes = 0;
 
 var STATS_PATH = "/data/stats.jsonl";
 
-var HOST_TO_PROVIDER = {
-    "api.openai.com": "openai",
-    "api.anthropic.com": "anthropic",
-    "aiplatform.googleapis.com": "google"
-};
+// Generated from the providers section of the LMGate config (render-nginx).
+var PROVIDERS = providers;
 
 function detect_provider(host) {
-    return HOST_TO_PROVIDER[host] || "unknown";
+    var spec = PROVIDERS[host];
+    return spec ? spec.name : "unknown";
 }
 
-function parse_json(body) {
+// Last SSE event (data: {...} line), or the last object of a JSON array
+// body for providers streaming in "json-array" format.
+function parse_json(body, spec) {
     if (!body) return null;
+    var streaming = spec ? spec.streaming : ["sse"];
     try {
-        return JSON.parse(body);
+        var parsed = JSON.parse(body);
+        if (Array.isArray(parsed) && streaming.indexOf("json-array") !== -1) {
+            for (var j = parsed.length - 1; j >= 0; j--) {
+                if (parsed[j] && typeof parsed[j] === "object") return parsed[j];
+            }
+            return null;
+        }
+        return parsed;
     } catch (e) {
+        if (streaming.indexOf("sse") === -1) return null;
         // Try SSE: find last data: {...} line
         var last = null;
         var lines = body.split("\n");
@@ -41,23 +53,23 @@ function parse_json(body) {
     }
 }
 
-function extract_tokens(provider, parsed) {
-    if (!parsed) return [null, null];
-    try {
-        if (provider === "openai") {
-            var u = parsed.usage;
-            return u ? [u.prompt_tokens || null, u.completion_tokens || null] : [null, null];
-        }
-        if (provider === "anthropic") {
-            var u = parsed.usage;
-            return u ? [u.input_tokens || null, u.output_tokens || null] : [null, null];
-        }
-        if (provider === "google") {
-            var m = parsed.usageMetadata;
-            return m ? [m.promptTokenCount || null, m.candidatesTokenCount || null] : [null, null];
-        }
-    } catch (e) {}
-    return [null, null];
+// Value at a field path (["usage", "prompt_tokens"]), null if absent.
+function get_path(obj, path) {
+    for (var i = 0; i < path.length; i++) {
+        if (!obj || typeof obj !== "object") return null;
+        obj = obj[path[i]];
+    }
+    return obj === undefined ? null : obj;
+}
+
+function extract_tokens(spec, parsed) {
+    if (!spec || !parsed) return [null, null];
+    return [get_path(parsed, spec.input) || null, get_path(parsed, spec.output) || null];
+}
+
+function extract_model(spec, parsed) {
+    if (!parsed) return null;
+    return get_path(parsed, spec ? spec.model : ["model"]) || null;
 }
 
 function mask_key(raw) {
@@ -75,6 +87,52 @@ function extract_raw_key(auth_header, x_api_key) {
     return x_api_key || "";
 }
 
+// nginx timing variables: seconds with ms resolution, one value per upstream
+// attempt ("0.120, 0.340"), "-" when unavailable. Attempts are summed.
+function parse_time(value) {
+    if (!value) return null;
+    var total = null;
+    var parts = String(value).replace(/:/g, ",").split(",");
+    for (var i = 0; i < parts.length; i++) {
+        var part = parts[i].trim();
+        if (!part || part === "-") continue;
+        var n = parseFloat(part);
+        if (isNaN(n)) return null;
+        total = (total || 0) + n;
+    }
+    return total === null ? null : Math.round(total * 1000) / 1000;
+}
+
+// Upstream attempts: one $upstream_status value per try ("502, 200").
+function count_attempts(value) {
+    if (!value) return null;
+    var parts = String(value).replace(/:/g, ",").split(",");
+    var n = 0;
+    for (var i = 0; i < parts.length; i++) {
+        if (parts[i].trim()) n++;
+    }
+    return n || null;
+}
+
+// Input tokens sent again to the provider by retries: the final input
+// tokens for each earlier attempt that connected (its $upstream_connect_time
+// is not "-"). null unless the request was retried.
+function wasted_input_tokens(input, connect_times) {
+    var parts = String(connect_times || "").replace(/:/g, ",").split(",");
+    if (!input || parts.length < 2) return null;
+    var reached = 0;
+    for (var i = 0; i < parts.length - 1; i++) {
+        var part = parts[i].trim();
+        if (part && part !== "-") reached++;
+    }
+    return input * reached;
+}
+
+function tokens_per_second(tokens, seconds) {
+    if (!tokens || !seconds) return null;
+    return Math.round(tokens / seconds * 100) / 100;
+}
+
 function accumulate(r, data, flags) {
     // Skip stats for non-proxied responses (e.g. 403 from auth_request).
     // The body filter fires for ALL responses including nginx error pages.
@@ -83,6 +141,7 @@ function accumulate(r, data, flags) {
         return;
     }
 
+    response_bytes += data.length;
     if (!truncated && body_buffer.length + data.length <= MAX_BODY_SIZE) {
         body_buffer += data;
     } else {
@@ -93,24 +152,51 @@ function accumulate(r, data, flags) {
         try {
             var host = r.variables.upstream_host || "";
             var provider = detect_provider(host);
+            var spec = PROVIDERS[host];
             var response_body = truncated ? "" : body_buffer;
-            var parsed = parse_json(response_body);
-            var tokens = extract_tokens(provider, parsed);
+            var parsed = parse_json(response_body, spec);
+            var tokens = extract_tokens(spec, parsed);
+            // HIT, MISS, BYPASS, ... in /_cached/ locations, empty otherwise.
+            var cache_status = r.variables.upstream_cache_status || null;
+            if (cache_status === "HIT") {
+                // Served from the response cache: no upstream tokens were used.
+                tokens = [0, 0];
+            }
             var auth_header = r.headersIn["Authorization"] || "";
             var x_api_key = r.headersIn["X-Api-Key"] || "";
             var raw_key = extract_raw_key(auth_header, x_api_key);
+            var upstream_response_time = parse_time(r.variables.upstream_response_time);
+            var content_type = r.headersOut["Content-Type"] || "";
 
             var entry = JSON.stringify({
                 timestamp: new Date().toISOString(),
                 lmgate_id: r.variables.lmgate_id || "",
                 provider: provider,
                 endpoint: r.variables.request_uri,
-                model: parsed ? (parsed.model || null) : null,
+                model: extract_model(spec, parsed),
                 status: r.status,
                 input_tokens: tokens[0],
                 output_tokens: tokens[1],
                 masked_key: mask_key(raw_key),
-                error_type: null
+                error_type: null,
+                upstream_connect_time: parse_time(r.variables.upstream_connect_time),
+                upstream_header_time: parse_time(r.variables.upstream_header_time),
+                upstream_response_time: upstream_response_time,
+                request_time: parse_time(r.variables.request_time),
+                output_tokens_per_second: tokens_per_second(tokens[1], upstream_response_time),
+                response_bytes: response_bytes,
+                streaming: content_type.indexOf("text/event-stream") === 0,
+                cache_status: cache_status,
+                // Waited for an identical in-flight request (singleflight).
+                coalesced: r.variables.lmgate_follower === "1" && cache_status === "HIT",
+                // Routed providers: the target picked by /auth.
+                target: r.variables.lmgate_target || null,
+                // More than 1 when nginx retried the upstream (provider retry).
+                attempts: count_attempts(r.variables.upstream_status),
+                wasted_input_tokens: wasted_input_tokens(
+                    tokens[0], r.variables.upstream_connect_time),
+                // Half-open circuit probe tag from /auth (X-LMGate-Probe).
+                probe: r.variables.lmgate_probe || null
             });
 
             fs.appendFileSync(STATS_PATH, entry + "\n");
@@ -118,8 +204,14 @@ function accumulate(r, data, flags) {
             // Stats failure must not affect proxying
         }
 
+        if (r.variables.lmgate_inflight_key) {
+            // Later identical requests are no longer followers of this one.
+            ngx.shared.lmgate_inflight.delete(r.variables.lmgate_inflight_key);
+        }
+
         body_buffer = "";
         truncated = false;
+        response_bytes = 0;
     }
 
     r.sendBuffer(data, flags);
@@ -1,14 +1,18 @@
 #!/usr/bin/env bash
-# Run all code quality checks: ruff (lint + format) and mypy (type check).
+# Run all code quality checks: ruff (lint + format), mypy (type check) and
+# generated nginx configs being up to date.
 set -euo pipefail
 
 echo "==> ruff: lint"
-uv run ruff check lmgate/ tests/
+uv run ruff check lmgate/ tests/ benchmarks/
 
 echo "==> ruff: format"
-uv run ruff format --check lmgate/ tests/
+uv run ruff format --check lmgate/ tests/ benchmarks/
 
 echo "==> mypy"
 uv run mypy lmgate/
 
+echo "==> generated nginx configs"
+"$(dirname "$0")/render-nginx.sh" --check
+
 echo "All checks passed."
@@ -0,0 +1,13 @@
+#!/usr/bin/env bash
+# Render the nginx configs and njs provider table from their LMGate configs.
+# Pass --check to verify the committed files are up to date instead.
+set -euo pipefail
+
+cd "$(dirname "$0")/.."
+
+uv run python -m lmgate render-nginx --config config/lmgate.yaml \
+    --output nginx/nginx.conf --providers-js nginx/scripts/providers.js "$@"
+uv run python -m lmgate render-nginx --config tests/e2e/lmgate.e2e.yaml \
+    --output tests/e2e/nginx.e2e-integration.conf "$@"
+uv run python -m lmgate render-nginx --config benchmarks/loadtest/nginx.loadtest.yaml \
+    --output benchmarks/loadtest/nginx.loadtest.conf "$@"
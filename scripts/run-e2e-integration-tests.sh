@@ -11,18 +11,26 @@ set -euo pipefail
 PROJECT_ROOT="$(cd "$(dirname "$0")/.." && pwd)"
 COMPOSE_FILES="-f ${PROJECT_ROOT}/docker-compose.yaml -f ${PROJECT_ROOT}/tests/e2e/docker-compose.e2e-integration.yaml"
 COMPOSE="docker compose ${COMPOSE_FILES}"
-STATS_PATH="${PROJECT_ROOT}/tests/e2e/data/stats.jsonl"
+DATA_DIR="${PROJECT_ROOT}/tests/e2e/data"
+STATS_PATH="${DATA_DIR}/stats.jsonl"
+
+# Everything lmgate and nginx leave behind, so each run starts from zero
+# (token budgets in particular).
+clean_data() {
+    rm -rf "${STATS_PATH}" "${STATS_PATH}".* "${DATA_DIR}"/*.spill \
+        "${DATA_DIR}/budgets.json" "${DATA_DIR}/rollups"
+}
 
 cleanup() {
     echo "--- Tearing down e2e integration stack ---"
     ${COMPOSE} down -v --remove-orphans 2>/dev/null || true
-    rm -f "${STATS_PATH}"
+    clean_data
 }
 
 trap cleanup EXIT
 
 echo "--- Cleaning previous state ---"
-rm -f "${STATS_PATH}"
+clean_data
 
 echo "--- Building and starting e2e integration stack ---"
 ${COMPOSE} up --build -d
@@ -0,0 +1,60 @@
+#!/usr/bin/env bash
+# Run the load test (nginx + lmgate + streaming mock upstream).
+#
+# Usage: ./scripts/run-load-tests.sh [loadtest-args...]
+#
+# Brings up the e2e integration stack with the load test overlay (all
+# providers routed to the mock, mock port exposed for the baseline), runs
+# benchmarks/loadtest.py, then tears everything down. Arguments are passed
+# to loadtest.py, e.g. --requests 20000 --concurrency 128 --json out.json
+
+set -euo pipefail
+
+PROJECT_ROOT="$(cd "$(dirname "$0")/.." && pwd)"
+COMPOSE_FILES="-f ${PROJECT_ROOT}/docker-compose.yaml -f ${PROJECT_ROOT}/tests/e2e/docker-compose.e2e-integration.yaml -f ${PROJECT_ROOT}/benchmarks/loadtest/docker-compose.loadtest.yaml"
+COMPOSE="docker compose ${COMPOSE_FILES}"
+STATS_PATH="${PROJECT_ROOT}/tests/e2e/data/stats.jsonl"
+
+cleanup() {
+    echo "--- Tearing down load test stack ---"
+    ${COMPOSE} down -v --remove-orphans 2>/dev/null || true
+    rm -f "${STATS_PATH}"
+}
+
+trap cleanup EXIT
+
+echo "--- Cleaning previous state ---"
+rm -f "${STATS_PATH}"
+
+echo "--- Building and starting load test stack ---"
+${COMPOSE} up --build -d
+
+echo "--- Waiting for stack to be healthy ---"
+MAX_WAIT=30
+for i in $(seq 1 ${MAX_WAIT}); do
+    if curl -sf http://localhost:8080/healthz > /dev/null 2>&1 \
+        && curl -sf http://localhost:8082/healthz > /dev/null 2>&1; then
+        echo "Stack healthy after ${i}s"
+        break
+    fi
+    if [ "$i" -eq "${MAX_WAIT}" ]; then
+        echo "ERROR: Stack did not become healthy within ${MAX_WAIT}s"
+        echo "--- Container logs ---"
+        ${COMPOSE} logs
+        exit 1
+    fi
+    sleep 1
+done
+
+echo "--- Running load test ---"
+set +e
+python "${PROJECT_ROOT}/benchmarks/loadtest.py" \
+    --gateway-url http://localhost:8080 \
+    --upstream-url http://localhost:8082 \
+    --stats-path "${STATS_PATH}" \
+    "$@"
+TEST_EXIT=$?
+set -e
+
+echo "--- Done (exit code: ${TEST_EXIT}) ---"
+exit ${TEST_EXIT}
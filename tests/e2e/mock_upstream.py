@@ -1,40 +1,270 @@
-"""Mock upstream LLM API server for e2e testing.
+"""Mock upstream LLM API server for e2e and load testing.
 
-Returns realistic OpenAI-style responses so the full
-nginx -> auth -> proxy -> njs stats pipeline can be exercised.
+Emulates the OpenAI, Anthropic and Google (Vertex AI) APIs so the full
+nginx -> auth -> proxy -> njs stats pipeline can be exercised without real
+provider calls.
+
+Streaming is selected the way each provider does it: `"stream": true` in the
+request body (OpenAI, Anthropic) or the `:streamGenerateContent` method
+(Google). Response shape is controlled with optional request headers:
+
+    X-Mock-Status          respond with this error status (e.g. 429, 500, 529)
+    X-Mock-Retry-After     Retry-After header of the error response
+    X-Mock-Latency-Ms      delay before response headers
+    X-Mock-Response-Bytes  pad the generated text to roughly this many bytes
+    X-Mock-Chunks          number of SSE content events when streaming
+    X-Mock-Chunk-Delay-Ms  delay between SSE events (slow trickle)
+
+Requests for a Host starting with "slow." (a routed provider target in
+lmgate.e2e.yaml) are answered SLOW_HOST_LATENCY_MS later.
+
+Without any X-Mock-* header a non-streaming OpenAI call returns the same
+small reply the e2e integration tests assert on.
 """
 
+from __future__ import annotations
+
+import asyncio
+import json
+
 from aiohttp import web
 
+PROMPT_TOKENS = 10
+DEFAULT_TEXT = "Hello from mock upstream"
+SLOW_HOST_LATENCY_MS = 500
+
+_ERROR_BODIES = {
+    "openai": lambda status: {
+        "error": {"message": f"mock error {status}", "type": "server_error"}
+    },
+    "anthropic": lambda status: {
+        "type": "error",
+        "error": {"type": "overloaded_error", "message": f"mock error {status}"},
+    },
+    "google": lambda status: {
+        "error": {"code": status, "message": f"mock error {status}"}
+    },
+}
+
+
+class MockOptions:
+    """Response shaping options parsed from X-Mock-* request headers."""
+
+    def __init__(self, request: web.Request) -> None:
+        headers = request.headers
+        self.status = int(headers.get("X-Mock-Status", "200"))
+        self.retry_after = headers.get("X-Mock-Retry-After")
+        latency_ms = int(headers.get("X-Mock-Latency-Ms", "0"))
+        if (request.host or "").startswith("slow."):
+            latency_ms += SLOW_HOST_LATENCY_MS
+        self.latency = latency_ms / 1000
+        self.response_bytes = int(headers.get("X-Mock-Response-Bytes", "0"))
+        self.chunks = max(1, int(headers.get("X-Mock-Chunks", "8")))
+        self.chunk_delay = int(headers.get("X-Mock-Chunk-Delay-Ms", "0")) / 1000
+
+    def text(self) -> str:
+        if self.response_bytes <= len(DEFAULT_TEXT):
+            return DEFAULT_TEXT
+        return (DEFAULT_TEXT + " ") * (self.response_bytes // (len(DEFAULT_TEXT) + 1))
+
+    def completion_tokens(self, text: str) -> int:
+        # Roughly 4 bytes per token; the fixed reply keeps the e2e counts.
+        return 5 if text == DEFAULT_TEXT else max(1, len(text) // 4)
+
+
+def _split(text: str, parts: int) -> list[str]:
+    size = max(1, -(-len(text) // parts))
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+async def _read_json(request: web.Request) -> dict:
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, ValueError):
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+async def _error(provider: str, opts: MockOptions) -> web.Response:
+    await asyncio.sleep(opts.latency)
+    headers = {"Retry-After": opts.retry_after} if opts.retry_after else None
+    return web.json_response(
+        _ERROR_BODIES[provider](opts.status), status=opts.status, headers=headers
+    )
+
+
+async def _stream(
+    request: web.Request, events: list[dict | str], opts: MockOptions
+) -> web.StreamResponse:
+    """Send SSE events (dicts are JSON-encoded) with the configured trickle."""
+    await asyncio.sleep(opts.latency)
+    resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await resp.prepare(request)
+    for event in events:
+        data = event if isinstance(event, str) else json.dumps(event)
+        await resp.write(f"data: {data}\n\n".encode())
+        if opts.chunk_delay:
+            await asyncio.sleep(opts.chunk_delay)
+    await resp.write_eof()
+    return resp
+
 
-async def chat_completions(request: web.Request) -> web.Response:
-    """Mimic POST /v1/chat/completions."""
-    body = {
-        "id": "chatcmpl-test-123",
-        "object": "chat.completion",
-        "model": "gpt-4",
-        "choices": [
+async def chat_completions(request: web.Request) -> web.StreamResponse:
+    """Mimic POST /v1/chat/completions (OpenAI)."""
+    opts = MockOptions(request)
+    if opts.status >= 400:
+        return await _error("openai", opts)
+    body = await _read_json(request)
+    model = body.get("model", "gpt-4")
+    text = opts.text()
+    usage = {
+        "prompt_tokens": PROMPT_TOKENS,
+        "completion_tokens": opts.completion_tokens(text),
+        "total_tokens": PROMPT_TOKENS + opts.completion_tokens(text),
+    }
+    if body.get("stream"):
+        events: list[dict | str] = [
+            {
+                "id": "chatcmpl-test-123",
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": part}}],
+            }
+            for part in _split(text, opts.chunks)
+        ]
+        # Final usage chunk (stream_options.include_usage) and terminator
+        events.append(
+            {
+                "id": "chatcmpl-test-123",
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [],
+                "usage": usage,
+            }
+        )
+        events.append("[DONE]")
+        return await _stream(request, events, opts)
+
+    await asyncio.sleep(opts.latency)
+    return web.json_response(
+        {
+            "id": "chatcmpl-test-123",
+            "object": "chat.completion",
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": usage,
+        }
+    )
+
+
+async def messages(request: web.Request) -> web.StreamResponse:
+    """Mimic POST /v1/messages (Anthropic)."""
+    opts = MockOptions(request)
+    if opts.status >= 400:
+        return await _error("anthropic", opts)
+    body = await _read_json(request)
+    model = body.get("model", "claude-sonnet-4-5-20250929")
+    text = opts.text()
+    output_tokens = opts.completion_tokens(text)
+    if body.get("stream"):
+        events: list[dict | str] = [
+            {
+                "type": "message_start",
+                "message": {
+                    "model": model,
+                    "usage": {"input_tokens": PROMPT_TOKENS, "output_tokens": 1},
+                },
+            }
+        ]
+        events.extend(
             {
+                "type": "content_block_delta",
                 "index": 0,
-                "message": {"role": "assistant", "content": "Hello from mock upstream"},
-                "finish_reason": "stop",
+                "delta": {"type": "text_delta", "text": part},
             }
-        ],
-        "usage": {
-            "prompt_tokens": 10,
-            "completion_tokens": 5,
-            "total_tokens": 15,
-        },
+            for part in _split(text, opts.chunks)
+        )
+        events.append(
+            {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn"},
+                "model": model,
+                "usage": {
+                    "input_tokens": PROMPT_TOKENS,
+                    "output_tokens": output_tokens,
+                },
+            }
+        )
+        events.append({"type": "message_stop"})
+        return await _stream(request, events, opts)
+
+    await asyncio.sleep(opts.latency)
+    return web.json_response(
+        {
+            "id": "msg_test_123",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": PROMPT_TOKENS, "output_tokens": output_tokens},
+        }
+    )
+
+
+async def generate_content(request: web.Request) -> web.StreamResponse:
+    """Mimic POST .../models/{model}:generateContent|streamGenerateContent."""
+    opts = MockOptions(request)
+    if opts.status >= 400:
+        return await _error("google", opts)
+    await _read_json(request)
+    path = request.match_info["tail"]
+    model, _, method = path.rpartition("/models/")[2].partition(":")
+    text = opts.text()
+    usage = {
+        "promptTokenCount": PROMPT_TOKENS,
+        "candidatesTokenCount": opts.completion_tokens(text),
+        "totalTokenCount": PROMPT_TOKENS + opts.completion_tokens(text),
     }
-    return web.json_response(body)
+
+    def candidate(part: str) -> dict:
+        return {"content": {"role": "model", "parts": [{"text": part}]}}
+
+    if method == "streamGenerateContent":
+        parts = _split(text, opts.chunks)
+        events: list[dict | str] = [
+            {"candidates": [candidate(part)], "modelVersion": model}
+            for part in parts[:-1]
+        ]
+        events.append(
+            {
+                "candidates": [candidate(parts[-1])],
+                "usageMetadata": usage,
+                "modelVersion": model,
+            }
+        )
+        return await _stream(request, events, opts)
+
+    await asyncio.sleep(opts.latency)
+    return web.json_response(
+        {"candidates": [candidate(text)], "usageMetadata": usage, "model": model}
+    )
 
 
 async def healthz(request: web.Request) -> web.Response:
     return web.Response(text="ok")
 
 
-app = web.Application()
+app = web.Application(client_max_size=64 * 1024 * 1024)
 app.router.add_post("/v1/chat/completions", chat_completions)
+app.router.add_post("/v1/messages", messages)
+app.router.add_post("/v1/projects/{tail:.*}", generate_content)
 app.router.add_get("/healthz", healthz)
 
 if __name__ == "__main__":
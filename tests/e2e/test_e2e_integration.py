@@ -14,6 +14,8 @@ import urllib.request
 NGINX_BASE = os.environ.get("E2E_NGINX_URL", "http://localhost:8080")
 VALID_KEY = "sk-test-valid-key-123456"
 INVALID_KEY = "sk-invalid-bogus-key"
+# Daily budget of 20 tokens (data/allowlist.csv); each mock reply uses 15.
+BUDGET_KEY = "sk-test-budget-key-20tok"
 STATS_PATH = os.environ.get(
     "E2E_STATS_PATH",
     os.path.join(os.path.dirname(__file__), "data", "stats.jsonl"),
@@ -132,3 +134,212 @@ class TestStatsRecording:
         assert entry["output_tokens"] == 5
         # last 6 chars of sk-test-valid-key-123456
         assert entry["masked_key"] == "123456"
+
+
+class TestConcurrencyLimit:
+    def test_sequential_requests_release_slots(self):
+        """Completed requests free their slot (limit 5, e2e compose file).
+
+        nginx appends stats records to the file; lmgate releases the slot
+        when it reads them back, so requests in a row never hit the limit.
+        """
+        for _ in range(6):
+            status, headers, _ = _chat_request(VALID_KEY)
+            assert status == 200, headers.get("X-LMGate-Reason")
+
+
+class TestTokenBudget:
+    def test_budget_exhausted_by_proxied_requests(self):
+        """Tokens of proxied requests count against the key's daily budget."""
+        status, _, _ = _chat_request(BUDGET_KEY)
+        assert status == 200
+        # Usage is read from the stats file nginx writes, a moment later.
+        for _ in range(10):
+            time.sleep(0.3)
+            status, headers, body = _chat_request(BUDGET_KEY)
+            if status != 200:
+                break
+        assert status == 429
+        assert json.loads(body)["reason"] == "token_budget_exhausted"
+        assert int(headers["Retry-After"]) > 0
+
+
+class TestRouting:
+    def test_traffic_shifts_to_faster_target(self):
+        """google has a fast and a slow target (lmgate.e2e.yaml).
+
+        /auth learns their latencies from the stats records nginx writes
+        and sends most requests to the fast one.
+        """
+        _clear_stats()
+        path = (
+            "/google/v1/projects/e2e/locations/us-central1"
+            "/publishers/google/models/gemini-pro:generateContent"
+        )
+        body = {"contents": [{"role": "user", "parts": [{"text": "hello"}]}]}
+        for _ in range(20):
+            status, _, _ = _request(
+                "POST", path, {"Authorization": f"Bearer {VALID_KEY}"}, body
+            )
+            assert status == 200
+            time.sleep(0.3)
+
+        targets = [e["target"] for e in _read_stats_entries()]
+        assert len(targets) == 20
+        assert set(targets) <= {"fast", "slow"}
+        assert targets[-10:].count("fast") >= 8
+
+
+class TestResponseCache:
+    def test_identical_deterministic_request_served_from_cache(self):
+        """A repeated temperature-0 request is a cache hit with zero tokens."""
+        _clear_stats()
+        body = {
+            "model": "gpt-4",
+            "temperature": 0,
+            "messages": [{"role": "user", "content": f"cache {time.time()}"}],
+        }
+        headers = {"Authorization": f"Bearer {VALID_KEY}"}
+        path = "/openai/v1/chat/completions"
+
+        status, first_headers, first_body = _request("POST", path, headers, body)
+        assert status == 200
+        assert first_headers.get("X-LMGate-Cache") == "MISS"
+        status, second_headers, second_body = _request("POST", path, headers, body)
+        assert status == 200
+        assert second_headers.get("X-LMGate-Cache") == "HIT"
+        assert second_body == first_body
+
+        status, bypass_headers, _ = _request(
+            "POST", path, {**headers, "X-LMGate-Cache-Bypass": "1"}, body
+        )
+        assert bypass_headers.get("X-LMGate-Cache") == "BYPASS"
+
+        entries = []
+        for _ in range(50):
+            entries = _read_stats_entries()
+            if len(entries) >= 3:
+                break
+            time.sleep(0.1)
+        assert [e["cache_status"] for e in entries] == ["MISS", "HIT", "BYPASS"]
+        assert entries[1]["input_tokens"] == 0
+        assert entries[1]["output_tokens"] == 0
+        assert entries[0]["input_tokens"] == 10
+
+    def test_concurrent_identical_requests_coalesced(self):
+        """Identical in-flight requests share one upstream call."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        _clear_stats()
+        body = {
+            "model": "gpt-4",
+            "temperature": 0,
+            "messages": [{"role": "user", "content": f"burst {time.time()}"}],
+        }
+        headers = {"Authorization": f"Bearer {VALID_KEY}", "X-Mock-Latency-Ms": "1000"}
+        path = "/openai/v1/chat/completions"
+        with ThreadPoolExecutor(5) as pool:
+            results = list(
+                pool.map(lambda _: _request("POST", path, headers, body), range(5))
+            )
+        assert {status for status, _, _ in results} == {200}
+        assert len({text for _, _, text in results}) == 1
+        statuses = sorted(h.get("X-LMGate-Cache") for _, h, _ in results)
+        assert statuses == ["HIT"] * 4 + ["MISS"]
+
+        entries = []
+        for _ in range(50):
+            entries = _read_stats_entries()
+            if len(entries) >= 5:
+                break
+            time.sleep(0.1)
+        assert sorted(e["coalesced"] for e in entries) == [False] + [True] * 4
+
+        # Once cached, identical requests are hits, not followers of each other.
+        with ThreadPoolExecutor(5) as pool:
+            results = list(
+                pool.map(lambda _: _request("POST", path, headers, body), range(5))
+            )
+        assert [h.get("X-LMGate-Cache") for _, h, _ in results] == ["HIT"] * 5
+        for _ in range(50):
+            entries = _read_stats_entries()
+            if len(entries) >= 10:
+                break
+            time.sleep(0.1)
+        assert [e["coalesced"] for e in entries[5:]] == [False] * 5
+
+
+class TestRetry:
+    def test_failed_attempt_retried(self):
+        """anthropic retries a 503 once (lmgate.e2e.yaml); attempts are recorded."""
+        _clear_stats()
+        status, _, _ = _request(
+            "POST",
+            "/anthropic/v1/messages",
+            headers={"X-Api-Key": VALID_KEY, "X-Mock-Status": "503"},
+            body={"model": "claude-3-haiku", "messages": []},
+        )
+        assert status == 503
+
+        entries = []
+        for _ in range(50):
+            entries = _read_stats_entries()
+            if entries:
+                break
+            time.sleep(0.1)
+        assert entries[-1]["status"] == 503
+        assert entries[-1]["attempts"] == 2
+
+    def test_rate_limited_attempt_retried_after_delay(self):
+        """openai retries a 429 once, after its Retry-After (lmgate.e2e.yaml)."""
+        _clear_stats()
+        started = time.monotonic()
+        status, headers, body = _request(
+            "POST",
+            "/openai/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {VALID_KEY}",
+                "X-Mock-Status": "429",
+                "X-Mock-Retry-After": "1",
+            },
+            body={"model": "gpt-4", "messages": []},
+        )
+        assert time.monotonic() - started >= 1
+        assert status == 429
+        assert headers.get("Retry-After") == "1"
+        assert json.loads(body)["attempts"] == 2
+
+        entries = []
+        for _ in range(50):
+            entries = _read_stats_entries()
+            if entries:
+                break
+            time.sleep(0.1)
+        assert (entries[-1]["status"], entries[-1]["attempts"]) == (429, 2)
+
+
+# Keep last: the open circuit sheds anthropic for circuit_breaker.open_seconds.
+class TestCircuitBreaker:
+    def test_upstream_errors_open_circuit(self):
+        """5xx results nginx records open the anthropic circuit (min_requests 5)."""
+
+        def messages(extra_headers=None):
+            return _request(
+                "POST",
+                "/anthropic/v1/messages",
+                headers={"X-Api-Key": VALID_KEY, **(extra_headers or {})},
+                body={"model": "claude-3-haiku", "messages": []},
+            )
+
+        for _ in range(20):
+            status, _, body = messages({"X-Mock-Status": "503"})
+            if "circuit_open" in body:
+                break
+            assert status == 503
+            time.sleep(0.3)
+        assert "circuit_open" in body
+
+        status, headers, body = messages()
+        assert status == 503
+        assert json.loads(body)["reason"] == "circuit_open"
+        assert int(headers["Retry-After"]) > 0
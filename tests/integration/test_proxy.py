@@ -6,7 +6,9 @@ Tests the combined auth + stats pipeline end-to-end:
 3. JSONL output verification
 """
 
+import asyncio
 import json
+import sqlite3
 from pathlib import Path
 
 import pytest
@@ -75,6 +77,141 @@ class TestAuthFlow:
         resp = await client.get("/auth")
         assert resp.status == 403
 
+    async def test_cache_headers_when_enabled(
+        self, aiohttp_client, app, allowlist_path: Path, tmp_path: Path
+    ) -> None:
+        client = await aiohttp_client(app)
+        resp = await client.get("/auth", headers={"x-api-key": "sk-anthropic-key99"})
+        assert "X-LMGate-Cache" not in resp.headers
+
+        config = {
+            "auth": {"allowlist_path": str(allowlist_path)},
+            "stats": {"output_path": str(tmp_path / "cached" / "stats.jsonl")},
+            "cache": {"enabled": True},
+        }
+        client = await aiohttp_client(create_app(config))
+        tenants = []
+        for key in ("sk-validkey123", "sk-anthropic-key99"):
+            resp = await client.get("/auth", headers={"x-api-key": key})
+            assert resp.headers["X-LMGate-Cache"] == "1"
+            tenants.append(resp.headers["X-LMGate-Tenant"])
+        # Keys of different owners never share cached responses.
+        assert tenants[0] != tenants[1] and len(tenants[0]) == 16
+
+    async def test_auth_routes_to_target(
+        self, aiohttp_client, allowlist_path: Path, tmp_path: Path
+    ) -> None:
+        targets = {
+            "us": {"host": "us-aiplatform.example"},
+            "eu": {"host": "eu-aiplatform.example"},
+        }
+        stats = tmp_path / "routed" / "stats.jsonl"
+        config = {
+            "auth": {"allowlist_path": str(allowlist_path)},
+            "stats": {"output_path": str(stats), "follow_interval_seconds": 0.01},
+            "providers": {"google": {"targets": targets}},
+            "routing": {"error_penalty": 100},
+        }
+        app = create_app(config)
+        client = await aiohttp_client(app)
+        headers = {"x-api-key": "sk-validkey123"}
+        resp = await client.get(
+            "/auth", headers={**headers, "X-Original-URI": "/openai/v1/models"}
+        )
+        assert "X-LMGate-Target" not in resp.headers
+
+        # eu fails every request, so nearly all traffic moves to us. The
+        # records are appended to the stats file, as nginx does.
+        with open(stats, "a") as f:
+            for target, status in (("us", 200), ("eu", 503)) * 40:
+                record = {
+                    "lmgate_id": "1",
+                    "provider": "google",
+                    "status": status,
+                    "upstream_header_time": 0.3,
+                    "target": target,
+                }
+                f.write(json.dumps(record) + "\n")
+        await asyncio.sleep(0.1)
+        picked = []
+        for _ in range(20):
+            resp = await client.get(
+                "/auth", headers={**headers, "X-Original-URI": "/google/v1/x"}
+            )
+            target = resp.headers["X-LMGate-Target"]
+            assert resp.headers["X-LMGate-Target-Host"] == targets[target]["host"]
+            picked.append(target)
+        assert picked.count("us") >= 17
+
+    async def test_open_circuit_sheds_provider(
+        self, aiohttp_client, allowlist_path: Path, tmp_path: Path
+    ) -> None:
+        stats = tmp_path / "breaker" / "stats.jsonl"
+        config = {
+            "auth": {"allowlist_path": str(allowlist_path)},
+            "stats": {"output_path": str(stats), "follow_interval_seconds": 0.01},
+            "circuit_breaker": {"enabled": True, "min_requests": 5},
+        }
+        app = create_app(config)
+        client = await aiohttp_client(app)
+        headers = {"x-api-key": "sk-validkey123"}
+        # Upstream failures as nginx records them in the stats file.
+        record = {"lmgate_id": "1", "provider": "google", "status": 503}
+        with open(stats, "a") as f:
+            f.write((json.dumps(record) + "\n") * 5)
+        await asyncio.sleep(0.1)
+        resp = await client.get(
+            "/auth", headers={**headers, "X-Original-URI": "/google/v1/x"}
+        )
+        assert resp.status == 503
+        assert resp.headers["X-LMGate-Reason"] == "circuit_open"
+        assert int(resp.headers["Retry-After"]) > 0
+
+        resp = await client.get(
+            "/auth", headers={**headers, "X-Original-URI": "/openai/v1/models"}
+        )
+        assert resp.status == 200
+
+    async def test_half_open_probe_closes_circuit(
+        self, aiohttp_client, allowlist_path: Path, tmp_path: Path
+    ) -> None:
+        stats = tmp_path / "probe" / "stats.jsonl"
+        config = {
+            "auth": {"allowlist_path": str(allowlist_path)},
+            "stats": {"output_path": str(stats), "follow_interval_seconds": 0.01},
+            "circuit_breaker": {
+                "enabled": True,
+                "min_requests": 5,
+                "open_seconds": 0.2,
+            },
+        }
+        app = create_app(config)
+        client = await aiohttp_client(app)
+        headers = {"x-api-key": "sk-validkey123", "X-Original-URI": "/google/v1/x"}
+        failed = {"lmgate_id": "1", "provider": "google", "status": 503}
+        with open(stats, "a") as f:
+            f.write((json.dumps(failed) + "\n") * 5)
+        await asyncio.sleep(0.3)
+        resp = await client.get("/auth", headers=headers)
+        assert resp.status == 200
+        probe = resp.headers["X-LMGate-Probe"]
+        resp = await client.get("/auth", headers=headers)
+        assert resp.status == 503
+
+        # Only the probe's own result closes the circuit.
+        succeeded = {**failed, "status": 200}
+        with open(stats, "a") as f:
+            f.write(json.dumps(succeeded) + "\n")
+        await asyncio.sleep(0.1)
+        resp = await client.get("/auth", headers=headers)
+        assert resp.status == 503
+        with open(stats, "a") as f:
+            f.write(json.dumps({**succeeded, "probe": probe}) + "\n")
+        await asyncio.sleep(0.1)
+        resp = await client.get("/auth", headers=headers)
+        assert resp.status == 200
+        assert "X-LMGate-Probe" not in resp.headers
+
 
 class TestStatsFlow:
     """End-to-end stats ingestion and JSONL output verification."""
@@ -295,8 +432,203 @@ class TestCombinedFlow:
         lines = stats_path.read_text().strip().split("\n")
         assert len(lines) == 3
 
+    async def test_failed_flush_retried_every_interval(
+        self, aiohttp_client, allowlist_path: Path, tmp_path: Path
+    ) -> None:
+        stats = tmp_path / "stats.jsonl"
+        config = {
+            "auth": {"allowlist_path": str(allowlist_path)},
+            "stats": {"output_path": str(stats), "flush_interval_seconds": 0.01},
+        }
+        client = await aiohttp_client(create_app(config))
+        stats.mkdir()  # not writable as a file
+        resp = await client.post(
+            "/stats",
+            json={
+                "uri": "/v1/chat/completions",
+                "host": "api.openai.com",
+                "status": 200,
+                "lmgate_internal_id": "1",
+                "response_body": json.dumps({"usage": {"prompt_tokens": 7}}),
+            },
+        )
+        assert resp.status == 200
+        stats.rmdir()
+        await asyncio.sleep(0.1)
+
+        # Written without waiting for another POST.
+        lines = stats.read_text().strip().split("\n")
+        assert [json.loads(line)["input_tokens"] for line in lines] == [7]
+
+    async def test_followed_records_are_measured(
+        self, aiohttp_client, allowlist_path: Path, tmp_path: Path
+    ) -> None:
+        stats = tmp_path / "stats.jsonl"
+        config = {
+            "auth": {"allowlist_path": str(allowlist_path)},
+            "stats": {"output_path": str(stats), "follow_interval_seconds": 0.01},
+        }
+        client = await aiohttp_client(create_app(config))
+
+        async def samples() -> dict[str, float]:
+            text = await (await client.get("/metrics")).text()
+            lines = (line.rsplit(" ", 1) for line in text.splitlines())
+            return {
+                name: float(value)
+                for name, value in lines
+                if name.startswith(
+                    (
+                        "lmgate_stats_ingest_duration_seconds_count",
+                        "lmgate_stats_response_bytes_bucket",
+                    )
+                )
+            }
+
+        before = await samples()
+        # Appended by nginx, never POSTed to /stats.
+        with open(stats, "a") as f:
+            for provider, size in (("mistral", 500), ("mistral", 300_000)):
+                record = {"lmgate_id": "1", "provider": provider}
+                f.write(json.dumps({**record, "response_bytes": size}) + "\n")
+            f.write(json.dumps({"lmgate_id": "1", "provider": "cohere"}) + "\n")
+        await asyncio.sleep(0.1)
+        after = await samples()
+
+        def added(name: str) -> float:
+            return after.get(name, 0) - before.get(name, 0)
+
+        ingest = "lmgate_stats_ingest_duration_seconds_count"
+        assert added(f'{ingest}{{provider="mistral"}}') == 2
+        assert added(f'{ingest}{{provider="cohere"}}') == 1
+        buckets = 'lmgate_stats_response_bytes_bucket{{provider="mistral",le="{}"}}'
+        assert added(buckets.format("1024")) == 1
+        assert added(buckets.format("262144")) == 1
+        assert added(buckets.format("2097152")) == 2
+        # No size recorded, no size observed.
+        assert added(buckets.format("+Inf").replace("mistral", "cohere")) == 0
+
     async def test_healthz_always_available(self, aiohttp_client, app) -> None:
         client = await aiohttp_client(app)
         resp = await client.get("/healthz")
         assert resp.status == 200
         assert await resp.text() == "ok"
+
+    async def test_stats_fan_out_to_sinks(
+        self, aiohttp_client, allowlist_path: Path, tmp_path: Path
+    ) -> None:
+        archive = tmp_path / "archive" / "stats.jsonl"
+        stats = tmp_path / "stats.jsonl"
+        config = {
+            "auth": {"allowlist_path": str(allowlist_path)},
+            "stats": {
+                "output_path": str(stats),
+                "follow_interval_seconds": 0.01,
+                "sinks": [
+                    {"type": "jsonl", "path": str(archive)},
+                    {"type": "sqlite"},
+                ],
+            },
+        }
+        client = await aiohttp_client(create_app(config))
+        resp = await client.post(
+            "/stats",
+            json={
+                "timestamp": "2025-06-15T10:30:00Z",
+                "uri": "/v1/chat/completions",
+                "host": "api.openai.com",
+                "status": 200,
+                "lmgate_internal_id": "1",
+                "response_body": json.dumps(
+                    {"model": "gpt-4", "usage": {"prompt_tokens": 7}}
+                ),
+            },
+        )
+        assert resp.status == 200
+        # A record appended by nginx reaches the sinks as well.
+        record = {
+            "timestamp": "2025-06-15T10:31:00Z",
+            "lmgate_id": "2",
+            "provider": "anthropic",
+            "input_tokens": 9,
+        }
+        with open(stats, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        await asyncio.sleep(0.1)
+        # Sinks are drained on shutdown.
+        await client.close()
+
+        archived = [json.loads(line) for line in archive.read_text().splitlines()]
+        assert [e["input_tokens"] for e in archived] == [7, 9]
+        conn = sqlite3.connect(tmp_path / "stats.db")
+        rows = conn.execute("SELECT lmgate_id, input_tokens FROM stats").fetchall()
+        conn.close()
+        assert sorted(rows) == [("1", 7), ("2", 9)]
+
+
+class TestStatsStream:
+    """Live NDJSON feed of ingested stats."""
+
+    @staticmethod
+    def _payload(lmgate_id: str, host: str = "api.openai.com") -> dict:
+        return {
+            "timestamp": "2025-06-15T10:30:00Z",
+            "uri": "/v1/chat/completions",
+            "host": host,
+            "status": 200,
+            "lmgate_internal_id": lmgate_id,
+            "response_body": json.dumps({"model": "gpt-4"}),
+        }
+
+    async def test_streams_filtered_records(self, aiohttp_client, app) -> None:
+        client = await aiohttp_client(app)
+        start = app["stats_feed"].last_offset
+        await client.post("/stats", json=self._payload("1"))
+        resp = await client.get(f"/stats/stream?lmgate_id=2&after={start}")
+        assert resp.status == 200
+        assert resp.headers["Content-Type"] == "application/x-ndjson"
+        await client.post("/stats", json=self._payload("1"))
+        await client.post("/stats", json=self._payload("2"))
+        line = json.loads(await resp.content.readline())
+        assert (line["offset"], line["lmgate_id"]) == (start + 3, "2")
+        resp.close()
+
+    async def test_resume_replays_history(self, aiohttp_client, app) -> None:
+        client = await aiohttp_client(app)
+        start = app["stats_feed"].last_offset
+        for lmgate_id in ("1", "2", "1"):
+            await client.post("/stats", json=self._payload(lmgate_id))
+        resp = await client.get(f"/stats/stream?after={start + 1}&provider=openai")
+        lines = [json.loads(await resp.content.readline()) for _ in range(2)]
+        assert [e["offset"] for e in lines] == [start + 2, start + 3]
+        resp.close()
+
+    async def test_streams_records_appended_by_nginx(
+        self, aiohttp_client, app, stats_path: Path
+    ) -> None:
+        client = await aiohttp_client(app)
+        start = app["stats_feed"].last_offset
+        resp = await client.get("/stats/stream")
+        with open(stats_path, "a") as f:
+            f.write(json.dumps({"lmgate_id": "2", "provider": "openai"}) + "\n")
+        # Read by the periodic follow task, not posted to /stats.
+        line = json.loads(await resp.content.readline())
+        assert (line["offset"], line["lmgate_id"]) == (start + 1, "2")
+        resp.close()
+
+    async def test_invalid_offset(self, aiohttp_client, app) -> None:
+        client = await aiohttp_client(app)
+        resp = await client.get("/stats/stream?after=abc")
+        assert resp.status == 400
+
+    async def test_resume_rejected_with_workers(
+        self, aiohttp_client, allowlist_path: Path, stats_path: Path
+    ) -> None:
+        config = {
+            "server": {"workers": 2},
+            "auth": {"allowlist_path": str(allowlist_path)},
+            "stats": {"output_path": str(stats_path)},
+        }
+        client = await aiohttp_client(create_app(config))
+        resp = await client.get("/stats/stream?after=5")
+        assert resp.status == 400
+        assert "server.workers" in await resp.text()
@@ -0,0 +1,169 @@
+"""Tests for lmgate.breaker — per provider/model circuit breaker."""
+
+from lmgate.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, uri_model
+
+GEMINI = "/google/v1/projects/p/locations/us/publishers/google/models/gemini-pro"
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _breaker(clock: FakeClock) -> CircuitBreaker:
+    return CircuitBreaker(
+        window_seconds=10,
+        min_requests=4,
+        error_rate_threshold=0.5,
+        open_seconds=5,
+        half_open_probes=1,
+        clock=clock,
+    )
+
+
+def _result(status: int, provider: str = "openai", endpoint: str = "/v1") -> dict:
+    return {"provider": provider, "status": status, "endpoint": endpoint}
+
+
+class TestCircuitBreaker:
+    def test_opens_at_threshold(self) -> None:
+        clock = FakeClock()
+        breaker = _breaker(clock)
+        for status in (200, 500, 200):
+            breaker.record(_result(status))
+        assert breaker.check("openai") == (None, None)  # below min_requests
+        breaker.record(_result(529))
+        assert breaker.state("openai") == OPEN
+        clock.now += 1.5
+        assert breaker.check("openai") == (4, None)
+        assert breaker.check("anthropic") == (None, None)
+
+    def test_old_results_leave_the_window(self) -> None:
+        clock = FakeClock()
+        breaker = _breaker(clock)
+        for _ in range(3):
+            breaker.record(_result(502))
+        clock.now += 11
+        breaker.record(_result(502))
+        assert breaker.state("openai") == CLOSED
+
+    def test_client_errors_do_not_count(self) -> None:
+        breaker = _breaker(FakeClock())
+        for _ in range(10):
+            breaker.record(_result(429))
+        assert breaker.state("openai") == CLOSED
+
+    def test_half_open_probe_closes(self) -> None:
+        clock = FakeClock()
+        breaker = _breaker(clock)
+        for _ in range(4):
+            breaker.record(_result(503))
+        clock.now += 5
+        retry_after, probe = breaker.check("openai")
+        assert retry_after is None and probe
+        assert breaker.state("openai") == HALF_OPEN
+        assert breaker.check("openai") == (1, None)  # probe slot taken
+        breaker.record({**_result(200), "probe": probe})
+        assert breaker.state("openai") == CLOSED
+        assert breaker.check("openai") == (None, None)
+
+    def test_half_open_probe_failure_reopens(self) -> None:
+        clock = FakeClock()
+        breaker = _breaker(clock)
+        for _ in range(4):
+            breaker.record(_result(503))
+        clock.now += 5
+        _, probe = breaker.check("openai")
+        breaker.record({**_result(504), "probe": probe})
+        assert breaker.state("openai") == OPEN
+        assert breaker.check("openai") == (5, None)
+
+    def test_half_open_ignores_results_of_other_requests(self) -> None:
+        clock = FakeClock()
+        breaker = _breaker(clock)
+        for _ in range(4):
+            breaker.record(_result(503))
+        clock.now += 5
+        _, probe = breaker.check("openai")
+        # Admitted before the circuit opened; its success arrives late.
+        breaker.record(_result(200))
+        breaker.record({**_result(502), "probe": "0123456789abcdef"})
+        assert breaker.state("openai") == HALF_OPEN
+        assert breaker.check("openai") == (1, None)
+        breaker.record({**_result(200), "probe": probe})
+        assert breaker.state("openai") == CLOSED
+
+    def test_lost_probe_slot_expires(self) -> None:
+        clock = FakeClock()
+        breaker = _breaker(clock)
+        for _ in range(4):
+            breaker.record(_result(503))
+        clock.now += 5
+        assert breaker.check("openai")[1]
+        clock.now += 5
+        assert breaker.check("openai")[1]
+
+    def test_released_probe_frees_its_slot(self) -> None:
+        clock = FakeClock()
+        breaker = _breaker(clock)
+        for _ in range(4):
+            breaker.record(_result(503))
+        clock.now += 5
+        _, probe = breaker.check("openai")
+        breaker.release(probe)
+        _, probe = breaker.check("openai")
+        # Served from the response cache: frees the slot, decides nothing.
+        breaker.record({**_result(200), "probe": probe, "cache_status": "HIT"})
+        assert breaker.state("openai") == HALF_OPEN
+        assert breaker.check("openai")[1]
+
+    def test_model_circuit_from_path(self) -> None:
+        breaker = _breaker(FakeClock())
+        failing = f"{GEMINI}:generateContent"
+        for status in (503, 200, 200, 200):
+            breaker.record(_result(status, "google", failing))
+        for _ in range(4):
+            breaker.record(
+                _result(503, "google", failing.replace("gemini-pro", "gemini-flash"))
+            )
+        # gemini-flash failed every request; google overall is at 5/8
+        assert breaker.state("google", "gemini-flash") == OPEN
+        assert breaker.state("google", "gemini-pro") == CLOSED
+        assert breaker.check("google", "gemini-pro")[0] is not None
+        assert breaker.state("google") == OPEN
+
+    def test_probe_rejected_by_model_circuit_frees_slot(self) -> None:
+        clock = FakeClock()
+        breaker = _breaker(clock)
+        for _ in range(4):
+            breaker.record(_result(503, "google", f"{GEMINI}:generateContent"))
+        clock.now += 3
+        flash = f"{GEMINI.replace('gemini-pro', 'gemini-flash')}:generateContent"
+        for _ in range(4):
+            breaker.record(_result(503, "google", flash))
+        clock.now += 2
+        # google is half-open, gemini-flash still open for 3 s.
+        assert breaker.check("google", "gemini-flash") == (3, None)
+        _, probe = breaker.check("google")
+        assert probe
+        # Successes of other requests do not close the provider circuit.
+        breaker.record(_result(200, "google", flash))
+        assert breaker.state("google") == HALF_OPEN
+        breaker.record({**_result(200, "google"), "probe": probe})
+        assert breaker.state("google") == CLOSED
+        assert breaker.state("google", "gemini-flash") == OPEN
+
+    def test_cache_hits_ignored(self) -> None:
+        breaker = _breaker(FakeClock())
+        for _ in range(4):
+            breaker.record({**_result(500), "cache_status": "HIT"})
+        assert breaker.state("openai") == CLOSED
+
+
+def test_uri_model() -> None:
+    assert uri_model(f"{GEMINI}:streamGenerateContent?alt=sse") == "gemini-pro"
+    assert uri_model("/openai/v1/chat/completions") is None
+    assert uri_model(None) is None
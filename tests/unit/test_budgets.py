@@ -0,0 +1,174 @@
+"""Tests for lmgate.budgets — token budget tracking, checkpoints, /auth checks."""
+
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+
+from lmgate.allowlist import AllowList, AllowListEntry
+from lmgate.budgets import BudgetTracker
+from lmgate.server import create_app
+
+
+def _entry(daily: int | None = None, monthly: int | None = None) -> AllowListEntry:
+    return AllowListEntry(
+        id="1",
+        api_key="sk-key",
+        owner="team",
+        added="2025-01-01",
+        daily_token_budget=daily,
+        monthly_token_budget=monthly,
+    )
+
+
+class TestBudgetTracker:
+    def test_within_budget(self, tmp_path: Path) -> None:
+        tracker = BudgetTracker(tmp_path / "budgets.json")
+        tracker.record("1", 50)
+        assert tracker.retry_after(_entry(daily=100)) is None
+
+    def test_daily_budget_exhausted(self, tmp_path: Path) -> None:
+        tracker = BudgetTracker(tmp_path / "budgets.json")
+        tracker.record("1", 100)
+        retry_after = tracker.retry_after(_entry(daily=100))
+        assert retry_after is not None
+        assert 0 < retry_after <= 86400
+
+    def test_monthly_budget_exhausted(self, tmp_path: Path) -> None:
+        tracker = BudgetTracker(tmp_path / "budgets.json")
+        tracker.record("1", 500)
+        assert tracker.retry_after(_entry(daily=1000, monthly=400)) is not None
+
+    def test_no_budget_is_unlimited(self, tmp_path: Path) -> None:
+        tracker = BudgetTracker(tmp_path / "budgets.json")
+        tracker.record("1", 10**9)
+        assert tracker.retry_after(_entry()) is None
+
+    def test_checkpoint_roundtrip(self, tmp_path: Path) -> None:
+        path = tmp_path / "budgets.json"
+        tracker = BudgetTracker(path)
+        tracker.record("1", 70)
+        tracker.record("2", 30)
+        tracker.checkpoint()
+
+        restored = BudgetTracker(path)
+        restored.load()
+        assert restored.usage("1") == (70, 70)
+        assert restored.usage("2") == (30, 30)
+
+    def test_checkpoint_skipped_when_clean(self, tmp_path: Path) -> None:
+        path = tmp_path / "budgets.json"
+        tracker = BudgetTracker(path)
+        tracker.checkpoint()
+        assert not path.exists()
+
+    def test_stale_period_discarded_on_load(self, tmp_path: Path) -> None:
+        path = tmp_path / "budgets.json"
+        path.write_text(
+            json.dumps(
+                {
+                    "day": "2000-01-01",
+                    "month": "2000-01",
+                    "daily": {"1": 5},
+                    "monthly": {"1": 5},
+                }
+            )
+        )
+        tracker = BudgetTracker(path)
+        tracker.load()
+        assert tracker.usage("1") == (0, 0)
+
+    def test_corrupt_checkpoint_ignored(self, tmp_path: Path) -> None:
+        path = tmp_path / "budgets.json"
+        path.write_text("{not json")
+        tracker = BudgetTracker(path)
+        tracker.load()
+        assert tracker.usage("1") == (0, 0)
+
+
+class TestAllowListBudgetColumns:
+    def test_budget_columns_parsed(self, tmp_path: Path) -> None:
+        path = tmp_path / "allowlist.csv"
+        path.write_text(
+            "id,api_key,owner,added,daily_token_budget,monthly_token_budget\n"
+            "1,sk-a,team,2025-01-01,1000,\n"
+        )
+        al = AllowList(path)
+        al.load()
+        entry = al.get("sk-a")
+        assert entry is not None
+        assert entry.daily_token_budget == 1000
+        assert entry.monthly_token_budget is None
+
+    def test_invalid_budget_raises(self, tmp_path: Path) -> None:
+        path = tmp_path / "allowlist.csv"
+        path.write_text(
+            "id,api_key,owner,added,daily_token_budget\n1,sk-a,team,2025-01-01,lots\n"
+        )
+        with pytest.raises(ValueError, match="daily_token_budget"):
+            AllowList(path).load()
+
+
+class TestBudgetEnforcement:
+    @pytest.fixture
+    def app(self, tmp_path: Path) -> web.Application:
+        allowlist = tmp_path / "allowlist.csv"
+        allowlist.write_text(
+            "id,api_key,owner,added,daily_token_budget\n1,sk-key,team,2025-01-01,100\n"
+        )
+        config = {
+            "auth": {"allowlist_path": str(allowlist), "poll_interval_seconds": 30},
+            "stats": {
+                "output_path": str(tmp_path / "stats.jsonl"),
+                "flush_interval_seconds": 10,
+                "follow_interval_seconds": 0.01,
+            },
+        }
+        return create_app(config)
+
+    async def test_exhausted_budget_returns_429(
+        self, aiohttp_client, app, tmp_path: Path
+    ) -> None:
+        client = await aiohttp_client(app)
+        headers = {"Authorization": "Bearer sk-key"}
+        assert (await client.get("/auth", headers=headers)).status == 200
+        await client.post(
+            "/stats",
+            json={
+                "timestamp": "2025-06-15T10:30:00Z",
+                "uri": "/v1/chat/completions",
+                "host": "api.openai.com",
+                "status": 200,
+                "auth_key_header": "Bearer sk-key",
+                "lmgate_internal_id": "1",
+                "response_body": json.dumps(
+                    {"usage": {"prompt_tokens": 60, "completion_tokens": 40}}
+                ),
+            },
+        )
+        resp = await client.get("/auth", headers=headers)
+        assert resp.status == 429
+        assert resp.headers["X-LMGate-Reason"] == "token_budget_exhausted"
+        assert int(resp.headers["Retry-After"]) > 0
+
+        await client.close()
+        # Counters are checkpointed next to the stats file on shutdown
+        saved = json.loads((tmp_path / "budgets.json").read_text())
+        assert saved["daily"]["1"] == 100
+
+    async def test_records_appended_by_nginx_count(
+        self, aiohttp_client, app, tmp_path: Path
+    ) -> None:
+        client = await aiohttp_client(app)
+        headers = {"Authorization": "Bearer sk-key"}
+        assert (await client.get("/auth", headers=headers)).status == 200
+        record = {"lmgate_id": "1", "input_tokens": 70, "output_tokens": 30}
+        with open(tmp_path / "stats.jsonl", "a") as f:
+            f.write(json.dumps(record) + "\n")
+        # Picked up by the periodic follow task, not by a POST.
+        await asyncio.sleep(0.1)
+        resp = await client.get("/auth", headers=headers)
+        assert resp.status == 429
+        assert resp.headers["X-LMGate-Reason"] == "token_budget_exhausted"
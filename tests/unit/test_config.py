@@ -12,6 +12,7 @@ class TestLoadConfig:
         assert config["auth"]["poll_interval_seconds"] == 30
         assert config["stats"]["flush_interval_seconds"] == 10
         assert config["logging"]["level"] == "INFO"
+        assert config["limits"]["max_in_flight_per_key"] == 0
 
     def test_yaml_overrides_defaults(self, tmp_path: Path) -> None:
         yaml_file = tmp_path / "config.yaml"
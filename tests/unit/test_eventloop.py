@@ -0,0 +1,43 @@
+"""Tests for lmgate.eventloop — server.event_loop selection."""
+
+import asyncio
+import sys
+
+import pytest
+
+from lmgate.eventloop import new_event_loop
+
+
+class TestNewEventLoop:
+    def test_asyncio(self) -> None:
+        loop = new_event_loop("asyncio")
+        try:
+            assert isinstance(loop, asyncio.AbstractEventLoop)
+            assert type(loop).__module__.startswith("asyncio")
+        finally:
+            loop.close()
+
+    def test_auto_falls_back_without_uvloop(self, monkeypatch) -> None:
+        monkeypatch.setitem(sys.modules, "uvloop", None)
+        loop = new_event_loop("auto")
+        try:
+            assert type(loop).__module__.startswith("asyncio")
+        finally:
+            loop.close()
+
+    def test_uvloop_required_but_missing(self, monkeypatch) -> None:
+        monkeypatch.setitem(sys.modules, "uvloop", None)
+        with pytest.raises(RuntimeError, match="uvloop is not installed"):
+            new_event_loop("uvloop")
+
+    def test_uvloop_when_installed(self) -> None:
+        uvloop = pytest.importorskip("uvloop")
+        loop = new_event_loop("uvloop")
+        try:
+            assert isinstance(loop, uvloop.Loop)
+        finally:
+            loop.close()
+
+    def test_invalid_setting(self) -> None:
+        with pytest.raises(ValueError, match="server.event_loop"):
+            new_event_loop("trio")
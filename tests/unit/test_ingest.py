@@ -0,0 +1,80 @@
+"""Tests for lmgate.ingest — following records appended to the stats file."""
+
+import json
+import os
+from pathlib import Path
+
+from lmgate.ingest import StatsFollower
+
+
+def _line(lmgate_id: str) -> str:
+    return json.dumps({"lmgate_id": lmgate_id, "status": 200}) + "\n"
+
+
+def _append(path: Path, *lines: str) -> None:
+    with open(path, "a") as f:
+        f.write("".join(lines))
+
+
+def _ids(records: list[dict]) -> list[str]:
+    return [r["lmgate_id"] for r in records]
+
+
+class TestStatsFollower:
+    def test_starts_at_end_of_file(self, tmp_path: Path) -> None:
+        stats = tmp_path / "stats.jsonl"
+        _append(stats, _line("old"))
+        follower = StatsFollower(stats)
+        follower.open()
+        assert follower.poll() == []
+        _append(stats, _line("1"), _line("2"))
+        assert _ids(follower.poll()) == ["1", "2"]
+        assert follower.poll() == []
+
+    def test_file_created_later_read_from_start(self, tmp_path: Path) -> None:
+        stats = tmp_path / "stats.jsonl"
+        follower = StatsFollower(stats)
+        follower.open()
+        assert follower.poll() == []
+        _append(stats, _line("1"))
+        assert _ids(follower.poll()) == ["1"]
+
+    def test_partial_line_kept_until_complete(self, tmp_path: Path) -> None:
+        stats = tmp_path / "stats.jsonl"
+        follower = StatsFollower(stats)
+        follower.open()
+        line = _line("1")
+        _append(stats, line[:10])
+        assert follower.poll() == []
+        _append(stats, line[10:], "not json\n")
+        assert _ids(follower.poll()) == ["1"]
+
+    def test_rotation_drains_old_file(self, tmp_path: Path) -> None:
+        stats = tmp_path / "stats.jsonl"
+        _append(stats, _line("old"))
+        follower = StatsFollower(stats)
+        follower.open()
+        _append(stats, _line("1"))
+        os.rename(stats, tmp_path / "stats.jsonl.20260301T100000Z")
+        _append(stats, _line("2"))
+        assert _ids(follower.poll()) == ["1", "2"]
+
+    def test_truncated_file_read_from_start(self, tmp_path: Path) -> None:
+        stats = tmp_path / "stats.jsonl"
+        _append(stats, _line("old"), _line("old"))
+        follower = StatsFollower(stats)
+        follower.open()
+        stats.write_text(_line("1"))
+        assert _ids(follower.poll()) == ["1"]
+
+    def test_removed_file(self, tmp_path: Path) -> None:
+        stats = tmp_path / "stats.jsonl"
+        _append(stats, _line("old"))
+        follower = StatsFollower(stats)
+        follower.open()
+        _append(stats, _line("1"))
+        stats.unlink()
+        assert _ids(follower.poll()) == ["1"]
+        assert follower.poll() == []
+        _append(stats, _line("2"))
+        assert _ids(follower.poll()) == ["2"]
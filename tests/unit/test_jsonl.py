@@ -0,0 +1,127 @@
+"""Tests for lmgate.jsonl — memory-mapped columnar reader with filter pushdown."""
+
+import gzip
+import json
+from pathlib import Path
+from typing import Any
+
+from lmgate.jsonl import read_columns
+
+
+def _collect(path: Path, fields: list[str], **kwargs: Any) -> dict[str, list]:
+    merged: dict[str, list] = {}
+    for batch in read_columns(path, fields, **kwargs):
+        for field, values in batch.items():
+            merged.setdefault(field, []).extend(values)
+    return merged
+
+
+def _line(compact: bool = False, **fields: object) -> str:
+    if compact:
+        return json.dumps(fields, separators=(",", ":"), ensure_ascii=False)
+    return json.dumps(fields)
+
+
+class TestReadColumns:
+    def test_decodes_requested_fields(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.jsonl"
+        path.write_text(
+            _line(lmgate_id="1", model="gpt-4", input_tokens=10, latency=0.5)
+            + "\n"
+            + _line(lmgate_id="2", model=None, input_tokens=None, ok=True)
+            + "\n"
+        )
+        cols = _collect(path, ["lmgate_id", "model", "input_tokens", "latency"])
+        assert cols == {
+            "lmgate_id": ["1", "2"],
+            "model": ["gpt-4", None],
+            "input_tokens": [10, None],
+            "latency": [0.5, None],
+        }
+
+    def test_string_escapes(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.jsonl"
+        endpoint = '/v1/x?q="a,b}"&p=\\'
+        path.write_text(_line(endpoint=endpoint, model="m") + "\n")
+        cols = _collect(path, ["endpoint", "model"])
+        assert cols == {"endpoint": [endpoint], "model": ["m"]}
+
+    def test_filter_matches_both_separators(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.jsonl"
+        path.write_text(
+            "\n".join(
+                [
+                    _line(lmgate_id="7", n=1),
+                    _line(compact=True, lmgate_id="7", n=2),
+                    _line(lmgate_id="17", n=3),
+                    _line(lmgate_id="70", n=4),
+                ]
+            )
+            + "\n"
+        )
+        assert _collect(path, ["n"], equals={"lmgate_id": ["7"]}) == {"n": [1, 2]}
+
+    def test_filters_are_exact_and_combined(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.jsonl"
+        path.write_text(
+            "\n".join(
+                [
+                    _line(model="gpt-4", status=200, n=1),
+                    _line(model="gpt-4o", status=200, n=2),
+                    _line(model="gpt-4", status=2000, n=3),
+                    _line(model="gpt-4", status=500, n=4),
+                    _line(model="claude", status=200, n=5),
+                ]
+            )
+            + "\n"
+        )
+        cols = _collect(
+            path, ["n"], equals={"model": ["gpt-4", "claude"], "status": [200]}
+        )
+        assert cols == {"n": [1, 5]}
+
+    def test_value_in_other_field_does_not_match(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.jsonl"
+        path.write_text(_line(endpoint='/x?"lmgate_id": "7"', lmgate_id="1") + "\n")
+        assert _collect(path, ["lmgate_id"], equals={"lmgate_id": ["7"]}) == {}
+
+    def test_non_ascii_filter(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.jsonl"
+        path.write_text(
+            _line(model="modèle", n=1) + "\n" + _line(True, model="modèle", n=2) + "\n"
+        )
+        assert _collect(path, ["n"], equals={"model": ["modèle"]}) == {"n": [1, 2]}
+
+    def test_skips_torn_and_blank_lines(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.jsonl"
+        path.write_text(_line(n=1) + "\n\nnot json\n" + _line(n=2) + '\n{"n": 3')
+        assert _collect(path, ["n"]) == {"n": [1, 2]}
+
+    def test_byte_ranges_partition_lines(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.jsonl"
+        path.write_text("".join(_line(n=i, lmgate_id="1") + "\n" for i in range(40)))
+        size = path.stat().st_size
+        for equals in (None, {"lmgate_id": ["1"]}):
+            seen = []
+            for start in range(0, size, 37):
+                cols = _collect(path, ["n"], equals=equals, start=start, end=start + 37)
+                seen.extend(cols.get("n", []))
+            assert seen == list(range(40))
+
+    def test_gzip_segment(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.jsonl.20260301000000.gz"
+        with gzip.open(path, "wt") as f:
+            f.write(_line(n=1, provider="openai") + "\n" + _line(n=2) + "\n")
+        cols = _collect(path, ["n"], equals={"provider": ["openai"]})
+        assert cols == {"n": [1]}
+
+    def test_batches(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.jsonl"
+        path.write_text("".join(_line(n=i) + "\n" for i in range(10)))
+        batches = list(read_columns(path, ["n"], batch_rows=4))
+        assert [len(b["n"]) for b in batches] == [4, 4, 2]
+
+    def test_empty_file(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.jsonl"
+        path.write_text("")
+        assert list(read_columns(path, ["n"])) == []
@@ -0,0 +1,113 @@
+"""Tests for lmgate.limits — per-key in-flight tracking and ceilings."""
+
+import json
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+
+from lmgate.limits import InFlightTracker
+from lmgate.server import create_app
+
+
+class TestInFlightTracker:
+    def test_acquire_under_ceiling(self) -> None:
+        tracker = InFlightTracker(max_in_flight=2, timeout_seconds=60)
+        assert tracker.acquire("1")
+        assert tracker.acquire("1")
+        assert tracker.in_flight("1") == 2
+
+    def test_acquire_over_ceiling_rejected(self) -> None:
+        tracker = InFlightTracker(max_in_flight=1, timeout_seconds=60)
+        assert tracker.acquire("1")
+        assert not tracker.acquire("1")
+        # Other keys are unaffected
+        assert tracker.acquire("2")
+
+    def test_release_frees_slot(self) -> None:
+        tracker = InFlightTracker(max_in_flight=1, timeout_seconds=60)
+        tracker.acquire("1")
+        tracker.release("1")
+        assert tracker.in_flight("1") == 0
+        assert tracker.acquire("1")
+
+    def test_release_unknown_id_is_noop(self) -> None:
+        tracker = InFlightTracker(max_in_flight=1, timeout_seconds=60)
+        tracker.release("missing")
+        tracker.release(None)
+        tracker.release("")
+        assert tracker.in_flight("missing") == 0
+
+    def test_zero_ceiling_is_unlimited(self) -> None:
+        tracker = InFlightTracker(max_in_flight=0, timeout_seconds=60)
+        for _ in range(100):
+            assert tracker.acquire("1")
+        assert tracker.in_flight("1") == 100
+
+    def test_stale_slots_reclaimed(self, monkeypatch) -> None:
+        now = [1000.0]
+        monkeypatch.setattr("lmgate.limits.time.monotonic", lambda: now[0])
+        tracker = InFlightTracker(max_in_flight=1, timeout_seconds=30)
+        assert tracker.acquire("1")
+        now[0] += 31
+        assert tracker.acquire("1")
+        assert tracker.in_flight("1") == 1
+
+
+class TestConcurrencyLimitEndpoint:
+    @pytest.fixture
+    def app(self, tmp_path: Path) -> web.Application:
+        allowlist = tmp_path / "allowlist.csv"
+        allowlist.write_text("id,api_key,owner,added\n1,sk-key,team,2025-01-01\n")
+        config = {
+            "server": {"port": 8081},
+            "auth": {"allowlist_path": str(allowlist), "poll_interval_seconds": 30},
+            "stats": {
+                "output_path": str(tmp_path / "stats.jsonl"),
+                "flush_interval_seconds": 10,
+            },
+            "limits": {"max_in_flight_per_key": 1, "in_flight_timeout_seconds": 60},
+            "logging": {"level": "INFO"},
+        }
+        return create_app(config)
+
+    async def test_over_ceiling_returns_429(self, aiohttp_client, app) -> None:
+        client = await aiohttp_client(app)
+        headers = {"Authorization": "Bearer sk-key"}
+        first = await client.get("/auth", headers=headers)
+        assert first.status == 200
+        second = await client.get("/auth", headers=headers)
+        assert second.status == 429
+        assert second.headers["X-LMGate-Reason"] == "concurrency_limit"
+        assert "Retry-After" in second.headers
+
+    async def test_stats_ingest_releases_slot(self, aiohttp_client, app) -> None:
+        client = await aiohttp_client(app)
+        headers = {"Authorization": "Bearer sk-key"}
+        assert (await client.get("/auth", headers=headers)).status == 200
+        resp = await client.post(
+            "/stats",
+            json={
+                "timestamp": "2025-06-15T10:30:00Z",
+                "uri": "/v1/chat/completions",
+                "host": "api.openai.com",
+                "status": 200,
+                "auth_key_header": "Bearer sk-key",
+                "lmgate_internal_id": "1",
+                "response_body": json.dumps({"model": "gpt-4"}),
+            },
+        )
+        assert resp.status == 200
+        assert (await client.get("/auth", headers=headers)).status == 200
+
+    async def test_record_appended_by_nginx_releases_slot(
+        self, aiohttp_client, app, tmp_path: Path
+    ) -> None:
+        """nginx appends records to the stats file; lmgate never sees a POST."""
+        client = await aiohttp_client(app)
+        headers = {"Authorization": "Bearer sk-key"}
+        assert (await client.get("/auth", headers=headers)).status == 200
+        with open(tmp_path / "stats.jsonl", "a") as f:
+            f.write(json.dumps({"lmgate_id": "1", "status": 200}) + "\n")
+        assert (await client.get("/auth", headers=headers)).status == 200
+        assert (await client.get("/auth", headers=headers)).status == 429
@@ -0,0 +1,43 @@
+"""Tests for lmgate.looplag — loop lag sampling and blocked-loop stacks."""
+
+import asyncio
+import logging
+import time
+
+from lmgate.looplag import LoopLagMonitor
+
+
+def _block_loop_for(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+class TestLoopLagMonitor:
+    async def test_records_lag_samples(self) -> None:
+        monitor = LoopLagMonitor(interval=0.01, warn_threshold=1.0)
+        task = monitor.start()
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            task.cancel()
+            monitor.stop()
+        assert monitor.percentile(0.5) >= 0.0
+        assert monitor.percentile(0.99) < 1.0
+
+    async def test_blocked_loop_logs_stack(self, caplog) -> None:
+        monitor = LoopLagMonitor(interval=0.01, warn_threshold=0.05)
+        task = monitor.start()
+        try:
+            await asyncio.sleep(0.03)
+            with caplog.at_level(logging.WARNING, logger="lmgate.looplag"):
+                _block_loop_for(0.3)
+                await asyncio.sleep(0.03)
+        finally:
+            task.cancel()
+            monitor.stop()
+
+        blocked = [r for r in caplog.records if "blocked" in r.getMessage()]
+        assert blocked, "watchdog should report the blocked loop"
+        assert "_block_loop_for" in blocked[0].getMessage()
+        lag = [r for r in caplog.records if "Event loop lag" in r.getMessage()]
+        assert lag, "sampler should report the late wake-up"
+        assert monitor.percentile(0.99) >= 0.2
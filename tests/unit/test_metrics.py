@@ -0,0 +1,95 @@
+"""Tests for lmgate.metrics — counters, histograms, /metrics exposition."""
+
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+
+from lmgate.metrics import Registry
+from lmgate.server import create_app
+
+
+class TestRegistry:
+    def test_counter_render(self) -> None:
+        registry = Registry()
+        counter = registry.counter("requests_total", "Requests", ("result",))
+        counter.inc("allowed")
+        counter.inc("allowed")
+        counter.inc("forbidden")
+        text = registry.render()
+        assert "# TYPE requests_total counter" in text
+        assert 'requests_total{result="allowed"} 2' in text
+        assert 'requests_total{result="forbidden"} 1' in text
+
+    def test_gauge_set(self) -> None:
+        registry = Registry()
+        gauge = registry.gauge("depth", "Depth")
+        gauge.set(5)
+        gauge.set(3)
+        assert "depth 3\n" in registry.render()
+
+    def test_histogram_buckets_cumulative(self) -> None:
+        registry = Registry()
+        hist = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        hist.observe(0.05)
+        hist.observe(0.5)
+        hist.observe(5.0)
+        text = registry.render()
+        assert 'latency_seconds_bucket{le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{le="1"} 2' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+        assert "latency_seconds_count 3" in text
+        assert "latency_seconds_sum 5.55" in text
+        assert hist.count() == 3
+
+    def test_label_values_escaped(self) -> None:
+        registry = Registry()
+        counter = registry.counter("c", "C", ("model",))
+        counter.inc('a"b')
+        assert 'c{model="a\\"b"} 1' in registry.render()
+
+    def test_duplicate_name_rejected(self) -> None:
+        registry = Registry()
+        registry.counter("c", "C")
+        with pytest.raises(ValueError, match="already registered"):
+            registry.gauge("c", "C")
+
+
+class TestMetricsEndpoint:
+    @pytest.fixture
+    def app(self, tmp_path: Path) -> web.Application:
+        allowlist = tmp_path / "allowlist.csv"
+        allowlist.write_text("id,api_key,owner,added\n1,sk-key,team,2025-01-01\n")
+        config = {
+            "auth": {"allowlist_path": str(allowlist), "poll_interval_seconds": 30},
+            "stats": {
+                "output_path": str(tmp_path / "stats.jsonl"),
+                "flush_interval_seconds": 10,
+            },
+        }
+        return create_app(config)
+
+    async def test_metrics_exposes_hot_path(self, aiohttp_client, app) -> None:
+        client = await aiohttp_client(app)
+        await client.get("/auth", headers={"Authorization": "Bearer sk-key"})
+        await client.get("/auth", headers={"Authorization": "Bearer sk-nope"})
+        await client.post(
+            "/stats",
+            json={"host": "api.openai.com", "response_body": "{}"},
+        )
+
+        resp = await client.get("/metrics")
+        assert resp.status == 200
+        assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        text = await resp.text()
+        assert 'lmgate_auth_requests_total{result="allowed"}' in text
+        assert 'lmgate_auth_requests_total{result="forbidden"}' in text
+        assert "lmgate_auth_duration_seconds_count" in text
+        assert (
+            'lmgate_stats_parse_duration_seconds_count{provider="openai",'
+            'body_size="1KB"}' in text
+        )
+        assert 'lmgate_stats_ingest_duration_seconds_count{provider="openai"}' in text
+        assert "lmgate_stats_writer_flush_duration_seconds_count" in text
+        assert "lmgate_allowlist_entries 1" in text
+        assert "lmgate_allowlist_reload_duration_seconds_count" in text
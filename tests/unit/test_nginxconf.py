@@ -0,0 +1,133 @@
+"""Tests for lmgate.nginxconf — generated nginx config and provider table."""
+
+from pathlib import Path
+
+import pytest
+import yaml
+
+from lmgate.config import apply_defaults
+from lmgate.nginxconf import main, render_nginx, render_providers_js
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# (config, nginx.conf) pairs kept in sync by scripts/render-nginx.sh
+RENDERED = [
+    ("config/lmgate.yaml", "nginx/nginx.conf"),
+    ("tests/e2e/lmgate.e2e.yaml", "tests/e2e/nginx.e2e-integration.conf"),
+    (
+        "benchmarks/loadtest/nginx.loadtest.yaml",
+        "benchmarks/loadtest/nginx.loadtest.conf",
+    ),
+]
+
+
+def _config(path: str) -> dict:
+    return apply_defaults(yaml.safe_load((ROOT / path).read_text()) or {})
+
+
+class TestRenderedFiles:
+    @pytest.mark.parametrize(("source", "target"), RENDERED)
+    def test_nginx_conf_up_to_date(self, source: str, target: str) -> None:
+        rendered = render_nginx(_config(source), source)
+        assert (ROOT / target).read_text() == rendered, "run scripts/render-nginx.sh"
+
+    def test_providers_js_up_to_date(self) -> None:
+        rendered = render_providers_js(_config("config/lmgate.yaml"))
+        assert (ROOT / "nginx/scripts/providers.js").read_text() == rendered
+
+
+class TestRenderNginx:
+    def test_provider_blocks(self) -> None:
+        config = apply_defaults(
+            {
+                "providers": {
+                    "openai": {"pool": {"keepalive": 0}},
+                    "local": {
+                        "host": "llm.internal",
+                        "prefix": "/local/",
+                        "usage": {"input": "usage.in", "output": "usage.out"},
+                        "servers": ["10.0.0.1:8000", "10.0.0.2:8000"],
+                        "tls": False,
+                    },
+                }
+            }
+        )
+        conf = render_nginx(config)
+        assert "    upstream local {\n        server 10.0.0.1:8000;\n" in conf
+        assert "        server 10.0.0.2:8000;\n        keepalive 32;\n" in conf
+        assert "location /_cached/local/ {" in conf
+        assert "proxy_pass http://local/;" in conf
+        assert "proxy_ssl_name api.anthropic.com;" in conf
+        openai = conf[conf.index("upstream openai {") :]
+        assert openai[: openai.index("}")].count("keepalive") == 0
+        assert "js_content cache.route;" in conf
+        cached = conf[conf.index("location /_cached/local/ {") :]
+        assert "js_header_filter cache.headers;" in cached[: cached.index("}")]
+
+    def test_routed_provider(self) -> None:
+        targets = {"us": {"host": "us.example"}, "eu": {"host": "eu.example"}}
+        config = apply_defaults({"providers": {"google": {"targets": targets}}})
+        conf = render_nginx(config)
+        assert "upstream google {" not in conf
+        assert "    upstream google__eu {\n        server eu.example:443;\n" in conf
+        direct = conf[conf.index("location /_direct/google/ {") :]
+        direct = direct[: direct.index("}")]
+        assert "rewrite ^/_direct/google/(.*)$ /$1 break;" in direct
+        assert "proxy_pass https://google__$lmgate_target;" in direct
+        assert "proxy_set_header Host $lmgate_target_host;" in direct
+
+    def test_retry(self) -> None:
+        retry = {"tries": 3, "on": "error,http_503", "timeout_seconds": 20}
+        config = apply_defaults({"providers": {"anthropic": {"retry": retry}}})
+        conf = render_nginx(config)
+        upstream = conf[conf.index("upstream anthropic {") :]
+        upstream = upstream[: upstream.index("}")]
+        assert upstream.count("server api.anthropic.com:443 max_fails=0;") == 3
+        direct = conf[conf.index("location /_direct/anthropic/ {") :]
+        direct = direct[: direct.index("}")]
+        assert "proxy_next_upstream error http_503 non_idempotent;" in direct
+        assert "proxy_next_upstream_tries 3;" in direct
+        assert "proxy_next_upstream_timeout 20s;" in direct
+        # Providers without retry settings keep nginx's defaults.
+        assert conf.count("proxy_next_upstream ") == 2
+        assert "max_fails" not in conf[: conf.index("upstream anthropic {")]
+
+    def test_delayed_retry(self) -> None:
+        retry = {"tries": 3, "on": "error,http_429", "backoff_seconds": 0.5}
+        targets = {"us": {"host": "us.example"}}
+        config = apply_defaults(
+            {
+                "providers": {
+                    "openai": {"retry": retry},
+                    "google": {"retry": retry, "targets": targets},
+                }
+            }
+        )
+        conf = render_nginx(config)
+        assert "js_import retry from scripts/retry.js;" in conf
+        assert "location @lmgate_retry {" in conf
+        # Each attempt picks a server again; no listing for nginx retries.
+        assert "max_fails" not in conf
+        for location in ("/_direct/openai/", "/_cached/openai/", "/_direct/google/"):
+            block = conf[conf.index(f"location {location} {{") :]
+            block = block[: block.index("}")]
+            assert 'set $lmgate_retry "3 30 0.5 10";' in block
+            assert "proxy_intercept_errors on;" in block
+            assert "error_page 429 502 = @lmgate_retry;" in block
+            assert "proxy_next_upstream" not in block
+        # Before the rewrite, which ends `set` processing.
+        google = conf[conf.index("location /_direct/google/ {") :]
+        assert google.index("set $lmgate_retry") < google.index("rewrite ")
+        # Immediate retries only: no retry location.
+        conf = render_nginx(apply_defaults({}))
+        assert "@lmgate_retry" not in conf and "retry.js" not in conf
+
+    def test_check(self, tmp_path: Path) -> None:
+        config = tmp_path / "lmgate.yaml"
+        config.write_text("nginx:\n  worker_connections: 64\n")
+        out = tmp_path / "nginx.conf"
+        args = ["--config", str(config), "--output", str(out)]
+        assert main([*args, "--check"]) == 1
+        assert main(args) == 0
+        assert "worker_connections 64;" in out.read_text()
+        assert main([*args, "--check"]) == 0
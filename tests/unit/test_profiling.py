@@ -0,0 +1,77 @@
+"""Tests for lmgate.profiling — on-demand profiling endpoint."""
+
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+
+from lmgate.server import create_app
+
+ADMIN_TOKEN = "admin-secret"
+
+
+def _config(tmp_path: Path, **admin: object) -> dict:
+    allowlist = tmp_path / "allowlist.csv"
+    allowlist.write_text("id,api_key,owner,added\n1,sk-key,team,2025-01-01\n")
+    return {
+        "auth": {"allowlist_path": str(allowlist), "poll_interval_seconds": 30},
+        "stats": {
+            "output_path": str(tmp_path / "stats.jsonl"),
+            "flush_interval_seconds": 10,
+        },
+        "admin": admin,
+    }
+
+
+class TestProfileEndpoint:
+    @pytest.fixture
+    def app(self, tmp_path: Path) -> web.Application:
+        return create_app(_config(tmp_path, profiling_enabled=True, token=ADMIN_TOKEN))
+
+    async def test_disabled_by_default(self, aiohttp_client, tmp_path: Path) -> None:
+        client = await aiohttp_client(create_app(_config(tmp_path)))
+        resp = await client.post("/admin/profile?seconds=0.1")
+        assert resp.status == 404
+
+    def test_enabled_requires_token(self, tmp_path: Path) -> None:
+        with pytest.raises(ValueError, match="admin.token"):
+            create_app(_config(tmp_path, profiling_enabled=True))
+
+    async def test_wrong_token_forbidden(self, aiohttp_client, app) -> None:
+        client = await aiohttp_client(app)
+        resp = await client.post(
+            "/admin/profile?seconds=0.1", headers={"X-LMGate-Admin-Token": "nope"}
+        )
+        assert resp.status == 403
+
+    async def test_invalid_seconds(self, aiohttp_client, app) -> None:
+        client = await aiohttp_client(app)
+        headers = {"X-LMGate-Admin-Token": ADMIN_TOKEN}
+        assert (
+            await client.post("/admin/profile?seconds=abc", headers=headers)
+        ).status == 400
+        assert (
+            await client.post("/admin/profile?seconds=3600", headers=headers)
+        ).status == 400
+
+    async def test_sampling_returns_collapsed_stacks(self, aiohttp_client, app) -> None:
+        client = await aiohttp_client(app)
+        resp = await client.post(
+            "/admin/profile?seconds=0.2&mode=sampling",
+            headers={"X-LMGate-Admin-Token": ADMIN_TOKEN},
+        )
+        assert resp.status == 200
+        lines = (await resp.text()).strip().split("\n")
+        assert lines
+        stack, count = lines[0].rsplit(" ", 1)
+        assert ";" in stack
+        assert int(count) > 0
+
+    async def test_deterministic_returns_pstats(self, aiohttp_client, app) -> None:
+        client = await aiohttp_client(app)
+        resp = await client.post(
+            "/admin/profile?seconds=0.1&mode=deterministic",
+            headers={"X-LMGate-Admin-Token": ADMIN_TOKEN},
+        )
+        assert resp.status == 200
+        assert "function calls" in await resp.text()
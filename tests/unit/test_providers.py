@@ -2,7 +2,17 @@
 
 import json
 
-from lmgate.providers import detect_provider, extract_model, extract_tokens
+import pytest
+import yaml
+
+from lmgate.config import apply_defaults
+from lmgate.providers import (
+    configure,
+    detect_provider,
+    extract_model,
+    extract_tokens,
+    load_providers,
+)
 
 
 class TestDetectProvider:
@@ -108,3 +118,107 @@ class TestExtractModel:
 
     def test_non_json(self) -> None:
         assert extract_model("not json") is None
+
+    def test_google_json_array_stream(self) -> None:
+        body = json.dumps(
+            [
+                {"candidates": []},
+                {
+                    "modelVersion": "gemini-2.5-pro",
+                    "usageMetadata": {
+                        "promptTokenCount": 12,
+                        "candidatesTokenCount": 7,
+                    },
+                },
+            ]
+        )
+        assert extract_tokens("google", body) == (12, 7)
+        assert extract_model(body, "google") is None
+        assert extract_model(body) is None
+
+
+class TestRegistry:
+    @pytest.fixture(autouse=True)
+    def _restore(self):
+        yield
+        configure(load_providers(apply_defaults({})))
+
+    def test_defaults(self) -> None:
+        providers = load_providers(apply_defaults({}))
+        assert [p.name for p in providers] == ["openai", "anthropic", "google"]
+        openai = providers[0]
+        assert openai.servers == ("api.openai.com:443",)
+        assert openai.pool["keepalive"] == 32
+        # Immediate retries of rate-limited requests are opt-in.
+        assert openai.retry["on"] == ["error", "http_502", "http_503"]
+
+    def test_added_provider(self) -> None:
+        config = apply_defaults(
+            {
+                "providers": {
+                    "google": None,
+                    "mistral": {
+                        "host": "api.mistral.ai",
+                        "usage": {
+                            "input": "usage.prompt_tokens",
+                            "output": "usage.completion_tokens",
+                        },
+                        "servers": "a:443, b:443",
+                        "pool": {"keepalive": 8},
+                    },
+                }
+            }
+        )
+        providers = load_providers(config)
+        assert [p.name for p in providers] == ["openai", "anthropic", "mistral"]
+        mistral = providers[-1]
+        assert (mistral.prefix, mistral.servers) == ("/mistral/", ("a:443", "b:443"))
+        assert mistral.pool["keepalive"] == 8
+        assert mistral.pool["read_timeout_seconds"] == 600
+
+        configure(providers)
+        body = json.dumps({"usage": {"prompt_tokens": 3, "completion_tokens": 2}})
+        assert detect_provider("api.mistral.ai") == "mistral"
+        assert detect_provider("aiplatform.googleapis.com") == "unknown"
+        assert extract_tokens("mistral", body) == (3, 2)
+
+    def test_retry_on_from_yaml(self) -> None:
+        raw = yaml.safe_load("retry:\n  tries: 2\n  on: [http_429]\n")
+        config = apply_defaults({"providers": {"openai": raw}})
+        openai = load_providers(config)[0]
+        assert openai.retry["on"] == ["http_429"]
+        assert True not in openai.retry
+
+    @pytest.mark.parametrize(
+        "spec",
+        [
+            {"prefix": "/x/"},
+            {"host": "h", "prefix": "x", "usage": {"input": "a", "output": "b"}},
+            {"host": "h", "usage": {"input": "a"}},
+            {"host": "h", "usage": {"input": "a", "output": "b"}, "streaming": ["ws"]},
+            {"host": "api.openai.com", "usage": {"input": "a", "output": "b"}},
+            {
+                "host": "h",
+                "usage": {"input": "a", "output": "b"},
+                "retry": {"tries": 0},
+            },
+            {
+                "host": "h",
+                "usage": {"input": "a", "output": "b"},
+                "retry": {"on": "5xx"},
+            },
+            {
+                "host": "h",
+                "usage": {"input": "a", "output": "b"},
+                "retry": {"backoff_seconds": 20},
+            },
+            {
+                "host": "h",
+                "usage": {"input": "a", "output": "b"},
+                "retry": {"tries": 6, "backoff_seconds": 0.5},
+            },
+        ],
+    )
+    def test_invalid(self, spec: dict) -> None:
+        with pytest.raises(ValueError):
+            load_providers(apply_defaults({"providers": {"extra": spec}}))
@@ -0,0 +1,166 @@
+"""Tests for lmgate.query — stats query CLI, segment skipping, parallel scan."""
+
+import gzip
+import io
+import json
+from pathlib import Path
+
+from lmgate.query import Query, Task, main, parse_time, plan, run_query, scan
+
+
+def _entry(ts: str, **fields: object) -> dict:
+    entry = {
+        "timestamp": ts,
+        "lmgate_id": "1",
+        "provider": "openai",
+        "model": "gpt-4",
+        "status": 200,
+        "input_tokens": 10,
+        "output_tokens": 5,
+    }
+    entry.update(fields)
+    return entry
+
+
+def _write(path: Path, entries: list[dict]) -> Path:
+    data = "".join(json.dumps(e) + "\n" for e in entries)
+    if path.suffix == ".gz":
+        with gzip.open(path, "wt") as f:
+            f.write(data)
+    else:
+        path.write_text(data)
+    return path
+
+
+def _run(*argv: str) -> list[dict]:
+    out = io.StringIO()
+    assert main([*argv, "--format", "json", "--jobs", "1"], out=out) == 0
+    return json.loads(out.getvalue())
+
+
+class TestQuery:
+    def test_totals(self, tmp_path: Path) -> None:
+        path = _write(
+            tmp_path / "stats.jsonl",
+            [
+                _entry("2026-03-01T10:00:00.000Z"),
+                _entry("2026-03-01T11:00:00.000Z", status=500, output_tokens=None),
+            ],
+        )
+        assert _run(str(path)) == [
+            {"requests": 2, "input_tokens": 20, "output_tokens": 5, "errors": 1}
+        ]
+
+    def test_filters_and_group_by(self, tmp_path: Path) -> None:
+        path = _write(
+            tmp_path / "stats.jsonl",
+            [
+                _entry("2026-03-01T10:00:00.000Z"),
+                _entry("2026-03-01T10:30:00.000Z", lmgate_id="2"),
+                _entry("2026-03-02T09:00:00.000Z", model="gpt-4o"),
+                _entry("2026-03-02T09:00:00.000Z", provider="anthropic"),
+            ],
+        )
+        rows = _run(str(path), "--provider", "openai", "--group-by", "day,model")
+        assert [(r["day"], r["model"], r["requests"]) for r in rows] == [
+            ("2026-03-01", "gpt-4", 2),
+            ("2026-03-02", "gpt-4o", 1),
+        ]
+        rows = _run(str(path), "--id", "2", "--group-by", "lmgate_id")
+        assert rows == [
+            {
+                "lmgate_id": "2",
+                "requests": 1,
+                "input_tokens": 10,
+                "output_tokens": 5,
+                "errors": 0,
+            }
+        ]
+
+    def test_time_range(self, tmp_path: Path) -> None:
+        path = _write(
+            tmp_path / "stats.jsonl",
+            [
+                _entry("2026-02-28T23:59:59.000Z"),
+                _entry("2026-03-01T00:00:00.000Z"),
+                _entry("2026-03-31T23:59:59.999Z"),
+                _entry("2026-04-01T00:00:00.000Z"),
+            ],
+        )
+        rows = _run(str(path), "--since", "2026-03-01", "--until", "2026-04-01")
+        assert rows[0]["requests"] == 2
+
+    def test_reads_compressed_segments(self, tmp_path: Path) -> None:
+        _write(tmp_path / "stats.jsonl", [_entry("2026-03-02T00:00:00Z")])
+        _write(
+            tmp_path / "stats.jsonl.20260301000000.gz",
+            [_entry("2026-02-28T00:00:00Z"), _entry("2026-02-28T01:00:00Z")],
+        )
+        rows = _run(
+            str(tmp_path / "stats.jsonl"),
+            str(tmp_path / "stats.jsonl.20260301000000.gz"),
+            "--group-by",
+            "month",
+        )
+        assert [(r["month"], r["requests"]) for r in rows] == [
+            ("2026-02", 2),
+            ("2026-03", 1),
+        ]
+
+
+class TestPlan:
+    def test_skips_segments_outside_range(self, tmp_path: Path) -> None:
+        old = _write(
+            tmp_path / "stats.jsonl.20260201000000",
+            [_entry("2026-01-15T00:00:00Z"), _entry("2026-01-31T23:00:00Z")],
+        )
+        old_gz = _write(
+            tmp_path / "stats.jsonl.20260101000000.gz",
+            [_entry("2025-12-01T00:00:00Z")],
+        )
+        current = _write(
+            tmp_path / "stats.jsonl",
+            [_entry("2026-02-01T00:00:00Z"), _entry("2026-03-05T00:00:00Z")],
+        )
+        query = Query(since=parse_time("2026-03-01"))
+        work = plan([old, old_gz, current], query)
+        assert work.scanned == [current]
+        assert work.skipped == [old, old_gz]
+
+        query = Query(until=parse_time("2026-01-01"))
+        assert plan([old, old_gz, current], query).scanned == [old_gz]
+
+    def test_no_time_range_scans_everything(self, tmp_path: Path) -> None:
+        path = _write(tmp_path / "stats.jsonl", [_entry("2026-03-01T00:00:00Z")])
+        work = plan([path], Query())
+        assert work.tasks == [Task(str(path))]
+        assert work.skipped == []
+
+    def test_byte_ranges_cover_each_line_once(self, tmp_path: Path) -> None:
+        entries = [
+            _entry(f"2026-03-01T00:00:{i:02d}Z", input_tokens=i) for i in range(50)
+        ]
+        path = _write(tmp_path / "stats.jsonl", entries)
+        work = plan([path], Query(), chunk_bytes=97)
+        assert len(work.tasks) > 10
+        totals = run_query(work.tasks, Query(), jobs=1)
+        assert totals[()] == [50, sum(range(50)), 250, 0]
+
+    def test_parallel_matches_serial(self, tmp_path: Path) -> None:
+        segments = [
+            _write(
+                tmp_path / f"stats.w{w}.jsonl",
+                [_entry(f"2026-03-0{d}T00:00:00Z", lmgate_id=str(w)) for d in (1, 2)],
+            )
+            for w in range(3)
+        ]
+        query = Query(group_by=("lmgate_id",))
+        tasks = plan(segments, query, chunk_bytes=150).tasks
+        assert run_query(tasks, query, jobs=2) == run_query(tasks, query, jobs=1)
+
+    def test_scan_ignores_malformed_lines(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.jsonl"
+        path.write_text(
+            json.dumps(_entry("2026-03-01T00:00:00Z")) + "\nnot json\n[1]\n{\n"
+        )
+        assert scan(Task(str(path)), Query()) == {(): [1, 10, 5, 0]}
@@ -0,0 +1,100 @@
+"""Tests for lmgate.records — compact slotted stats records."""
+
+import json
+import pickle
+
+import pytest
+
+from lmgate import records
+from lmgate.records import FIELDS, StatsRecord, to_json_line
+
+
+def _record(**fields: object) -> StatsRecord:
+    values = {
+        "timestamp": "2026-03-01T10:00:00.123Z",
+        "lmgate_id": "3",
+        "provider": "openai",
+        "endpoint": "/v1/chat/completions",
+        "model": "gpt-4o",
+        "status": 200,
+        "input_tokens": 12,
+        "output_tokens": None,
+        "upstream_response_time": 0.512,
+        "streaming": True,
+    }
+    values.update(fields)
+    return StatsRecord(**values)
+
+
+class TestStatsRecord:
+    def test_mapping_access(self) -> None:
+        record = _record()
+        assert record["model"] == "gpt-4o"
+        assert record.get("error_type") is None
+        assert record.get("nope", 1) == 1
+        assert list(record) == list(FIELDS)
+        assert dict(record)["status"] == 200
+        assert {**record}["streaming"] is True
+        assert record == dict(record)
+        with pytest.raises(KeyError):
+            record["nope"]
+
+    def test_read_only_and_slotted(self) -> None:
+        record = _record()
+        with pytest.raises(AttributeError):
+            record.model = "x"
+        assert not hasattr(record, "__dict__")
+        with pytest.raises(TypeError):
+            StatsRecord(nope=1)
+
+    @pytest.mark.parametrize(
+        "fields",
+        [
+            {},
+            {"model": 'modèle "quoted"\n', "status": "200"},
+            {"request_time": float("nan"), "output_tokens_per_second": 1e-7},
+            {"status": True, "input_tokens": 10**20, "endpoint": None},
+        ],
+    )
+    def test_json_bytes_match_json_dumps(self, fields: dict) -> None:
+        record = _record(**fields)
+        assert record.to_json_bytes() == json.dumps(dict(record)).encode()
+        assert to_json_line(record) == to_json_line(dict(record))
+
+    def test_interns_low_cardinality_fields(self) -> None:
+        a = _record(model="".join(["gpt-", "4o-mini"]))
+        b = _record(model="".join(["gpt-", "4o-mini"]))
+        assert a.model is b.model
+        ts_a = _record(timestamp="".join(["2026-", "03"]))
+        ts_b = _record(timestamp="".join(["2026-", "03"]))
+        assert ts_a.timestamp is not ts_b.timestamp
+
+    @pytest.mark.parametrize(
+        "endpoint",
+        [
+            "/openai/v1/files/file-AbC123xYz456DeF789gHi",
+            "/openai/v1/responses/resp_67cb71b351908190a308f3859487620d",
+            "/anthropic/v1/messages/batches/0b9e2a44-8f2c-4f0e-9d6a-2c1b7a8e5f3d",
+            "/google/v1beta/models/gemini-2.5-pro:streamGenerateContent?alt=sse",
+        ],
+    )
+    def test_unique_endpoints_not_interned(self, endpoint: str) -> None:
+        value = "".join([endpoint[:5], endpoint[5:]])
+        assert _record(endpoint=value).endpoint is value
+        assert value not in records._interned
+
+    def test_endpoint_templates_interned(self) -> None:
+        path = "/google/v1/projects/123456789012/locations/us-central1/publishers"
+        a = _record(endpoint="".join([path, "/google/models/gemini-2.5-pro"]))
+        b = _record(endpoint="".join([path, "/google/models/gemini-2.5-pro"]))
+        assert a.endpoint is b.endpoint
+
+    def test_intern_table_is_bounded(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(records, "INTERN_LIMIT", len(records._interned))
+        value = "".join(["model-", "beyond-limit"])
+        assert _record(model=value).model is value
+        assert value not in records._interned
+
+    def test_pickle(self) -> None:
+        record = _record()
+        assert pickle.loads(pickle.dumps(record)) == record
@@ -0,0 +1,174 @@
+"""Tests for lmgate.rollups — incremental minute/hour stats rollups."""
+
+import io
+import json
+import os
+from pathlib import Path
+
+from lmgate.query import main
+from lmgate.rollups import Rollup, rollup_path, status_class
+
+
+def _line(ts: str, **fields: object) -> str:
+    entry = {
+        "timestamp": ts,
+        "lmgate_id": "1",
+        "provider": "openai",
+        "model": "gpt-4",
+        "status": 200,
+        "input_tokens": 10,
+        "output_tokens": 5,
+    }
+    entry.update(fields)
+    return json.dumps(entry) + "\n"
+
+
+def _append(path: Path, *lines: str) -> None:
+    with open(path, "a") as f:
+        f.write("".join(lines))
+
+
+def _rows(stats: Path, resolution: str) -> list[dict]:
+    path = rollup_path(stats, resolution)
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestRollup:
+    def test_status_class(self) -> None:
+        assert status_class(200) == "2xx"
+        assert status_class(529) == "5xx"
+        assert status_class(None) == "unknown"
+
+    def test_closes_buckets_after_grace(self, tmp_path: Path) -> None:
+        stats = tmp_path / "stats.jsonl"
+        _append(
+            stats,
+            _line("2026-03-01T10:00:05Z"),
+            _line("2026-03-01T10:00:40Z", status=500, output_tokens=None),
+            _line("2026-03-01T10:00:50Z", model="gpt-4o"),
+        )
+        rollup = Rollup(stats, grace_seconds=30)
+        assert rollup.run_once() == 3
+        assert _rows(stats, "1m") == []
+
+        _append(stats, _line("2026-03-01T10:01:30Z"))
+        assert rollup.run_once() == 1
+        assert _rows(stats, "1m") == [
+            {
+                "bucket": "2026-03-01T10:00:00Z",
+                "lmgate_id": "1",
+                "provider": "openai",
+                "model": "gpt-4",
+                "status_class": "2xx",
+                "requests": 1,
+                "input_tokens": 10,
+                "output_tokens": 5,
+            },
+            {
+                "bucket": "2026-03-01T10:00:00Z",
+                "lmgate_id": "1",
+                "provider": "openai",
+                "model": "gpt-4",
+                "status_class": "5xx",
+                "requests": 1,
+                "input_tokens": 10,
+                "output_tokens": 0,
+            },
+            {
+                "bucket": "2026-03-01T10:00:00Z",
+                "lmgate_id": "1",
+                "provider": "openai",
+                "model": "gpt-4o",
+                "status_class": "2xx",
+                "requests": 1,
+                "input_tokens": 10,
+                "output_tokens": 5,
+            },
+        ]
+        # The hour bucket is still open.
+        assert _rows(stats, "1h") == []
+
+        _append(stats, _line("2026-03-01T11:05:00Z"))
+        rollup.run_once()
+        hourly = _rows(stats, "1h")
+        assert sum(r["requests"] for r in hourly) == 4
+        assert {r["bucket"] for r in hourly} == {"2026-03-01T10:00:00Z"}
+
+    def test_incremental_and_partial_lines(self, tmp_path: Path) -> None:
+        stats = tmp_path / "stats.jsonl"
+        line = _line("2026-03-01T10:00:05Z")
+        _append(stats, line, line[:20])
+        rollup = Rollup(stats, grace_seconds=0)
+        assert rollup.run_once() == 1
+        assert rollup.run_once() == 0
+        _append(stats, line[20:], _line("2026-03-01T10:05:00Z"))
+        assert rollup.run_once() == 2
+        assert _rows(stats, "1m")[0]["requests"] == 2
+
+    def test_checkpoint_restore(self, tmp_path: Path) -> None:
+        stats = tmp_path / "stats.jsonl"
+        _append(stats, _line("2026-03-01T10:00:05Z"))
+        Rollup(stats, grace_seconds=0).run_once()
+
+        _append(stats, _line("2026-03-01T10:00:30Z"), _line("2026-03-01T10:02:00Z"))
+        restored = Rollup(stats, grace_seconds=0)
+        restored.load()
+        assert restored.run_once() == 2
+        assert _rows(stats, "1m")[0]["requests"] == 2
+
+    def test_follows_rotation(self, tmp_path: Path) -> None:
+        stats = tmp_path / "stats.jsonl"
+        _append(stats, _line("2026-03-01T10:00:05Z"))
+        rollup = Rollup(stats, grace_seconds=0)
+        rollup.run_once()
+
+        # Lines written just before rotation are read from the rotated file.
+        _append(stats, _line("2026-03-01T10:00:10Z"))
+        os.rename(stats, tmp_path / "stats.jsonl.20260301100100")
+        _append(stats, _line("2026-03-01T10:01:30Z"))
+        assert rollup.run_once() == 2
+        assert _rows(stats, "1m")[0]["requests"] == 2
+
+    def test_truncation_restarts(self, tmp_path: Path) -> None:
+        stats = tmp_path / "stats.jsonl"
+        _append(stats, _line("2026-03-01T10:00:05Z"), _line("2026-03-01T10:00:06Z"))
+        rollup = Rollup(stats, grace_seconds=0)
+        rollup.run_once()
+        with open(stats, "w") as f:
+            f.write(_line("2026-03-01T10:02:00Z"))
+        assert rollup.run_once() == 1
+
+    def test_query_reads_rollups(self, tmp_path: Path) -> None:
+        stats = tmp_path / "stats.jsonl"
+        _append(
+            stats,
+            _line("2026-03-01T10:00:05Z"),
+            _line("2026-03-01T10:00:06Z", status=429),
+            _line("2026-03-01T10:30:00Z", lmgate_id="2"),
+            _line("2026-03-01T12:00:00Z"),
+        )
+        Rollup(stats, grace_seconds=0).run_once()
+        out = io.StringIO()
+        argv = [str(rollup_path(stats, "1m")), "--rollup", "1m", "--format", "json"]
+        argv += ["--until", "2026-03-01T11:00", "--group-by", "lmgate_id,hour"]
+        assert main([*argv, "--jobs", "1"], out=out) == 0
+        assert json.loads(out.getvalue()) == [
+            {
+                "lmgate_id": "1",
+                "hour": "2026-03-01T10",
+                "requests": 2,
+                "input_tokens": 20,
+                "output_tokens": 10,
+                "errors": 1,
+            },
+            {
+                "lmgate_id": "2",
+                "hour": "2026-03-01T10",
+                "requests": 1,
+                "input_tokens": 10,
+                "output_tokens": 5,
+                "errors": 0,
+            },
+        ]
@@ -0,0 +1,88 @@
+"""Tests for lmgate.routing — target scores and weighted selection."""
+
+import random
+from collections import Counter
+
+from lmgate.config import apply_defaults
+from lmgate.providers import load_providers
+from lmgate.routing import Router, is_upstream_error
+
+
+def _router(**targets: dict) -> Router:
+    config = apply_defaults({"providers": {"google": {"targets": targets}}})
+    return Router(load_providers(config), rng=random.Random(7))
+
+
+def _entry(target: str, status: int = 200, ttfb: float | None = 0.2) -> dict:
+    return {
+        "provider": "google",
+        "target": target,
+        "status": status,
+        "upstream_header_time": ttfb,
+    }
+
+
+def _shares(router: Router, n: int = 2000) -> Counter:
+    picks = Counter()
+    for _ in range(n):
+        choice = router.choose("/google/v1/projects/p/models/m:generateContent")
+        assert choice is not None
+        picks[choice[1].name] += 1
+    return picks
+
+
+class TestRouter:
+    def test_unrouted_provider(self) -> None:
+        router = _router()
+        assert not router
+        assert router.choose("/google/v1/x") is None
+
+    def test_prefix_match(self) -> None:
+        router = _router(us={"host": "us.example"})
+        assert router.choose("/openai/v1/chat/completions") is None
+        provider, target = router.choose("/google/v1/x")
+        assert (provider, target.name, target.host) == ("google", "us", "us.example")
+
+    def test_unmeasured_targets_split_by_weight(self) -> None:
+        router = _router(
+            us={"host": "us.example"}, eu={"host": "eu.example", "weight": 3}
+        )
+        picks = _shares(router)
+        assert 0.2 < picks["us"] / 2000 < 0.3
+
+    def test_slow_target_gets_less_traffic(self) -> None:
+        router = _router(us={"host": "us.example"}, eu={"host": "eu.example"})
+        for _ in range(50):
+            router.record(_entry("us", ttfb=0.2))
+            router.record(_entry("eu", ttfb=0.8))
+        picks = _shares(router)
+        assert 0.75 < picks["us"] / 2000 < 0.85
+
+    def test_failing_target_is_drained(self) -> None:
+        router = _router(us={"host": "us.example"}, eu={"host": "eu.example"})
+        for _ in range(50):
+            router.record(_entry("us"))
+            router.record(_entry("eu", status=503, ttfb=None))
+        scores = router.scores()["google"]
+        assert scores["eu"]["error_rate"] > 0.99
+        assert scores["eu"]["latency"] is None
+        picks = _shares(router)
+        assert 0 < picks["eu"] < 0.15 * 2000
+
+    def test_cache_hits_and_other_providers_ignored(self) -> None:
+        router = _router(us={"host": "us.example"})
+        router.record({**_entry("us", ttfb=5.0), "cache_status": "HIT"})
+        router.record({**_entry("us", ttfb=5.0), "provider": "openai"})
+        router.record(_entry("nope"))
+        assert router.scores()["google"]["us"]["latency"] is None
+
+
+def test_is_upstream_error() -> None:
+    assert [is_upstream_error(s) for s in (200, 404, 429, 502, 529, None)] == [
+        False,
+        False,
+        True,
+        True,
+        True,
+        False,
+    ]
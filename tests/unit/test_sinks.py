@@ -0,0 +1,249 @@
+"""Tests for lmgate.sinks — fan-out stats sinks with bounded queues."""
+
+import json
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from lmgate.config import apply_defaults
+from lmgate.sinks import (
+    _DROPPED,
+    JsonlSink,
+    Sink,
+    SocketSink,
+    StatsdSink,
+    build_sinks,
+)
+from lmgate.statsdb import SQLiteStatsSink
+
+
+class _Recording(Sink):
+    def __init__(self, fail: int = 0, **kwargs: Any) -> None:
+        kwargs.setdefault("name", "recording")
+        kwargs.setdefault("flush_interval", 0.01)
+        super().__init__(**kwargs)
+        self.batches: list[list[dict]] = []
+        self.fail = fail
+        self.release = threading.Event()
+        self.release.set()
+
+    def send(self, batch: list[dict[str, Any]]) -> None:
+        self.release.wait()
+        if self.fail:
+            self.fail -= 1
+            raise OSError("collector unavailable")
+        self.batches.append(batch)
+
+
+def _entry(**fields: object) -> dict:
+    entry = {"timestamp": "2026-03-01T10:00:00.000Z", "provider": "openai"}
+    entry.update(fields)
+    return entry
+
+
+class TestSink:
+    def test_send_is_abstract(self) -> None:
+        class _NoSend(Sink):
+            pass
+
+        with pytest.raises(TypeError):
+            _NoSend(name="incomplete")  # type: ignore[abstract]
+
+    def test_batches_and_shares_entries(self) -> None:
+        sink = _Recording(batch_size=2)
+        sink.start()
+        entries = [_entry(n=i) for i in range(5)]
+        for entry in entries:
+            assert sink.submit(entry)
+        sink.close()
+        sent = [e for batch in sink.batches for e in batch]
+        assert all(a is b for a, b in zip(sent, entries)) and len(sent) == 5
+        assert max(len(b) for b in sink.batches) <= 2
+
+    def test_full_queue_drops_without_blocking(self) -> None:
+        sink = _Recording(name="slow", queue_size=3, batch_size=1)
+        sink.release.clear()
+        sink.start()
+        results = [sink.submit(_entry(n=i)) for i in range(10)]
+        # At most one entry is in flight; the rest filled the queue.
+        assert results.count(True) <= 4
+        assert _DROPPED.value("slow", "queue_full") == results.count(False)
+        sink.release.set()
+        sink.close()
+
+    def test_failed_batch_is_retried(self) -> None:
+        sink = _Recording(fail=2, batch_size=10)
+        sink.start()
+        sink.submit(_entry(n=1))
+        sink.submit(_entry(n=2))
+        deadline = time.monotonic() + 5
+        while not sink.batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+        sink.close()
+        assert [[e["n"] for e in b] for b in sink.batches] == [[1, 2]]
+
+    def test_failure_at_shutdown_drops(self) -> None:
+        sink = _Recording(name="down", fail=100, flush_interval=60)
+        sink.start()
+        sink.submit(_entry())
+        sink.close()
+        assert sink.batches == []
+        assert _DROPPED.value("down", "error") == 1
+
+    def test_spill_requeues_unsent_entries(self, tmp_path: Path) -> None:
+        spill = tmp_path / "stats.archive.spill"
+        sink = _Recording(
+            name="spilled", batch_size=2, flush_interval=60, spill_path=spill
+        )
+        sink.start()
+        for i in range(2):
+            sink.submit(_entry(n=i))
+        deadline = time.monotonic() + 5
+        while not sink.batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # The last batch fails at shutdown.
+        sink.release.clear()
+        sink.fail = 1
+        sink.submit(_entry(n=2))
+        sink.submit(_entry(n=3))
+        closer = threading.Thread(target=sink.close)
+        closer.start()
+        while not sink._stopping:
+            time.sleep(0.01)
+        sink.release.set()
+        closer.join()
+        assert [e["n"] for b in sink.batches for e in b] == [0, 1]
+        assert _DROPPED.value("spilled", "error") == 0
+
+        restarted = _Recording(name="spilled", batch_size=10, spill_path=spill)
+        restarted.start()
+        restarted.submit(_entry(n=4))
+        restarted.close()
+        assert [e["n"] for b in restarted.batches for e in b] == [2, 3, 4]
+
+        again = _Recording(name="spilled", spill_path=spill)
+        again.start()
+        again.close()
+        assert again.batches == []
+
+
+class TestSinkTypes:
+    def test_jsonl(self, tmp_path: Path) -> None:
+        path = tmp_path / "copy" / "stats.jsonl"
+        sink = JsonlSink(path, name="copy")
+        sink.start()
+        sink.submit(_entry(n=1))
+        sink.close()
+        assert [json.loads(line)["n"] for line in path.read_text().splitlines()] == [1]
+
+    def test_statsd_lines_and_packets(self) -> None:
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(("127.0.0.1", 0))
+        server.settimeout(2)
+        port = server.getsockname()[1]
+        sink = StatsdSink("127.0.0.1", port, max_packet=100, name="statsd")
+        entry = _entry(
+            provider="openai",
+            status=503,
+            input_tokens=10,
+            output_tokens=None,
+            request_time=0.25,
+        )
+        assert sink.lines(entry) == [
+            "lmgate.requests.openai.5xx:1|c",
+            "lmgate.input_tokens.openai:10|c",
+            "lmgate.request_time.openai:250|ms",
+        ]
+        sink.open()
+        sink.send([entry, entry])
+        sink.shutdown()
+        packets = [server.recv(2048) for _ in range(2)]
+        server.close()
+        assert all(len(p) <= 100 for p in packets)
+        assert b"\n".join(packets).split(b"\n") == [
+            line.encode() for line in sink.lines(entry) * 2
+        ]
+
+    def test_socket_reconnects(self, tmp_path: Path) -> None:
+        path = tmp_path / "collector.sock"
+        sink = SocketSink(f"unix:{path}", name="socket")
+        with pytest.raises(OSError):
+            sink.send([_entry(n=1)])
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(path))
+        server.listen(1)
+        sink.send([_entry(n=2), _entry(n=3)])
+        conn, _ = server.accept()
+        sink.shutdown()
+        data = b""
+        while chunk := conn.recv(4096):
+            data += chunk
+        conn.close()
+        server.close()
+        assert [json.loads(line)["n"] for line in data.splitlines()] == [2, 3]
+
+    def test_socket_address_validation(self) -> None:
+        with pytest.raises(ValueError):
+            SocketSink("udp:127.0.0.1:9000", name="socket")
+
+
+class TestBuildSinks:
+    def test_builds_from_config(self, tmp_path: Path) -> None:
+        config = apply_defaults(
+            {
+                "stats": {
+                    "output_path": str(tmp_path / "stats.jsonl"),
+                    "sinks": [
+                        {"type": "sqlite", "retention_months": 12},
+                        {"type": "statsd", "port": 9125, "batch_size": 50},
+                        {"type": "jsonl", "name": "archive", "path": "/tmp/a.jsonl"},
+                    ],
+                }
+            }
+        )
+        sinks = build_sinks(config)
+        assert [s.name for s in sinks] == ["sqlite", "statsd", "archive"]
+        assert isinstance(sinks[0], SQLiteStatsSink)
+        assert sinks[0]._path == tmp_path / "stats.db"
+
+    def test_spill_path(self, tmp_path: Path) -> None:
+        config = apply_defaults(
+            {
+                "stats": {
+                    "output_path": str(tmp_path / "stats.jsonl"),
+                    "sinks": [
+                        {"type": "statsd", "spill": True},
+                        {
+                            "type": "statsd",
+                            "name": "s2",
+                            "spill": True,
+                            "spill_path": str(tmp_path / "ring"),
+                        },
+                        {"type": "statsd", "name": "plain"},
+                    ],
+                }
+            }
+        )
+        sinks = build_sinks(config)
+        assert (tmp_path / "stats.statsd.spill").exists()
+        assert (tmp_path / "ring").exists()
+        assert sinks[2]._spill is None
+        for sink in sinks:
+            sink.close()
+
+    @pytest.mark.parametrize(
+        "sinks",
+        [
+            [{"type": "kafka"}],
+            [{"type": "jsonl"}],
+            [{"type": "statsd"}, {"type": "statsd"}],
+        ],
+    )
+    def test_rejects_invalid(self, sinks: list[dict]) -> None:
+        with pytest.raises(ValueError):
+            build_sinks(apply_defaults({"stats": {"sinks": sinks}}))
@@ -0,0 +1,71 @@
+"""Tests for lmgate.spill — memory-mapped write-ahead ring."""
+
+from pathlib import Path
+
+from lmgate.spill import HEADER_SIZE, SpillRing
+
+
+class TestSpillRing:
+    def test_append_commit_and_reopen(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.spill"
+        ring = SpillRing(path, 1024)
+        assert ring.append(b"one\n") and ring.append(b"two\n")
+        records = ring.pending()
+        assert [data for data, _ in records] == [b"one\n", b"two\n"]
+        ring.commit(records[0][1])
+        assert [data for data, _ in ring.pending()] == [b"two\n"]
+        ring.commit(ring.tail)
+        ring.append(b"three\n")
+        ring.close()
+
+        reopened = SpillRing(path, 1024)
+        assert [data for data, _ in reopened.pending()] == [b"three\n"]
+
+    def test_wraps_around_the_end(self, tmp_path: Path) -> None:
+        ring = SpillRing(tmp_path / "stats.spill", 64)
+        for i in range(20):
+            data = f"record-{i:02d}-{'x' * 20}\n".encode()
+            assert ring.append(data)
+            assert ring.pending() == [(data, ring.tail)]
+            ring.commit(ring.tail)
+
+    def test_full_ring_rejects(self, tmp_path: Path) -> None:
+        ring = SpillRing(tmp_path / "stats.spill", 32)
+        assert ring.append(b"x" * 20)
+        assert not ring.append(b"y" * 10)
+        assert [data for data, _ in ring.pending()] == [b"x" * 20]
+
+    def test_corrupt_record_ends_replay(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.spill"
+        ring = SpillRing(path, 1024)
+        ring.append(b"good\n")
+        ring.append(b"torn\n")
+        ring.close()
+        data = bytearray(path.read_bytes())
+        data[HEADER_SIZE + 8 + 5 + 8] ^= 0xFF
+        path.write_bytes(bytes(data))
+
+        reopened = SpillRing(path, 1024)
+        records = reopened.pending()
+        assert [data for data, _ in records] == [b"good\n"]
+        reopened.commit(reopened.tail)
+        assert reopened.used == 0
+
+    def test_resize_waits_until_drained(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.spill"
+        ring = SpillRing(path, 1024)
+        ring.append(b"pending\n")
+        ring.close()
+
+        kept = SpillRing(path, 4096)
+        assert kept.capacity == 1024
+        kept.commit(kept.tail)
+        kept.close()
+        assert SpillRing(path, 4096).capacity == 4096
+
+    def test_unreadable_file_is_reset(self, tmp_path: Path) -> None:
+        path = tmp_path / "stats.spill"
+        path.write_bytes(b"not a spill file")
+        ring = SpillRing(path, 256)
+        assert ring.pending() == []
+        assert path.stat().st_size == HEADER_SIZE + 256
@@ -1,6 +1,8 @@
 """Tests for lmgate.stats — stats ingestion, JSONL writes, rotation."""
 
+import errno
 import json
+import os
 from pathlib import Path
 
 import pytest
@@ -89,6 +91,119 @@ class TestBuildStatsEntry:
         entry = build_stats_entry(payload)
         assert entry["masked_key"] == "123456"
 
+    def test_upstream_timing_fields(self) -> None:
+        payload = {
+            "host": "api.openai.com",
+            "status": 200,
+            "upstream_connect_time": "0.012",
+            "upstream_header_time": "0.450",
+            "upstream_response_time": "2.000",
+            "request_time": "2.010",
+            "response_body": json.dumps(
+                {"usage": {"prompt_tokens": 10, "completion_tokens": 100}}
+            ),
+        }
+        entry = build_stats_entry(payload)
+        assert entry["upstream_connect_time"] == 0.012
+        assert entry["upstream_header_time"] == 0.45
+        assert entry["upstream_response_time"] == 2.0
+        assert entry["request_time"] == 2.01
+        assert entry["output_tokens_per_second"] == 50.0
+
+    def test_upstream_timing_multiple_attempts_summed(self) -> None:
+        payload = {
+            "host": "api.openai.com",
+            "upstream_response_time": "0.100, 0.250 : 0.050",
+        }
+        entry = build_stats_entry(payload)
+        assert entry["upstream_response_time"] == 0.4
+
+    def test_upstream_timing_missing(self) -> None:
+        payload = {
+            "host": "api.openai.com",
+            "upstream_connect_time": "-",
+            "response_body": json.dumps({"usage": {"completion_tokens": 5}}),
+        }
+        entry = build_stats_entry(payload)
+        assert entry["upstream_connect_time"] is None
+        assert entry["upstream_response_time"] is None
+        assert entry["output_tokens_per_second"] is None
+
+    def test_response_shape_from_njs(self) -> None:
+        payload = {
+            "host": "api.anthropic.com",
+            "response_bytes": 3145728,
+            "content_type": "text/event-stream; charset=utf-8",
+            "response_body": "",
+        }
+        entry = build_stats_entry(payload)
+        assert entry["response_bytes"] == 3145728
+        assert entry["streaming"] is True
+
+    def test_response_shape_from_body(self) -> None:
+        sse = 'data: {"usage": {"prompt_tokens": 1}}\n\ndata: [DONE]\n\n'
+        entry = build_stats_entry({"host": "api.openai.com", "response_body": sse})
+        assert entry["response_bytes"] == len(sse)
+        assert entry["streaming"] is True
+
+        entry = build_stats_entry({"host": "api.openai.com", "response_body": "{}"})
+        assert entry["response_bytes"] == 2
+        assert entry["streaming"] is False
+
+        entry = build_stats_entry({"host": "api.openai.com"})
+        assert entry["response_bytes"] is None
+        assert entry["streaming"] is False
+
+    def test_cache_hit_has_zero_tokens(self) -> None:
+        body = json.dumps(
+            {"model": "gpt-4", "usage": {"prompt_tokens": 9, "completion_tokens": 4}}
+        )
+        payload = {"host": "api.openai.com", "response_body": body}
+        hit = build_stats_entry({**payload, "cache_status": "HIT"})
+        assert (hit["cache_status"], hit["input_tokens"], hit["output_tokens"]) == (
+            "HIT",
+            0,
+            0,
+        )
+        assert hit["output_tokens_per_second"] is None
+        miss = build_stats_entry({**payload, "cache_status": "MISS"})
+        assert (miss["input_tokens"], miss["output_tokens"]) == (9, 4)
+        assert (
+            build_stats_entry({**payload, "cache_status": ""})["cache_status"] is None
+        )
+
+    def test_coalesced_follower(self) -> None:
+        payload = {"host": "api.openai.com", "cache_status": "HIT"}
+        assert build_stats_entry({**payload, "coalesced": True})["coalesced"] is True
+        assert build_stats_entry(payload)["coalesced"] is False
+
+    def test_routed_target(self) -> None:
+        payload = {"host": "aiplatform.googleapis.com", "target": "eu"}
+        assert build_stats_entry(payload)["target"] == "eu"
+        assert build_stats_entry({**payload, "target": ""})["target"] is None
+
+    def test_retry_attempts(self) -> None:
+        payload = {"host": "api.anthropic.com", "attempts": "503, 502 : 200"}
+        assert build_stats_entry(payload)["attempts"] == 3
+        assert build_stats_entry({**payload, "attempts": 2})["attempts"] == 2
+        assert build_stats_entry({**payload, "attempts": ""})["attempts"] is None
+
+    def test_circuit_probe(self) -> None:
+        payload = {"host": "api.openai.com", "probe": "4f1c2a9e0b7d3e56"}
+        assert build_stats_entry(payload)["probe"] == "4f1c2a9e0b7d3e56"
+        assert build_stats_entry({**payload, "probe": ""})["probe"] is None
+
+    def test_wasted_input_tokens(self) -> None:
+        payload = {
+            "host": "api.anthropic.com",
+            "response_body": json.dumps({"usage": {"input_tokens": 100}}),
+            # The first attempt never connected, the second was answered 503.
+            "upstream_connect_time": "-, 0.010 : 0.012",
+        }
+        assert build_stats_entry(payload)["wasted_input_tokens"] == 100
+        single = {**payload, "upstream_connect_time": "0.010"}
+        assert build_stats_entry(single)["wasted_input_tokens"] is None
+
 
 class TestStatsWriter:
     def test_write_single_entry(self, tmp_path: Path) -> None:
@@ -140,6 +255,66 @@ class TestStatsWriter:
         rotated = list(tmp_path.glob("stats.jsonl.*"))
         assert len(rotated) >= 1
 
+    def test_shared_file_between_writers(self, tmp_path: Path) -> None:
+        output = tmp_path / "stats.jsonl"
+        writers = [StatsWriter(str(output), shared=True) for _ in range(2)]
+        for i in range(10):
+            writers[i % 2].write({"index": i})
+            writers[i % 2].flush()
+
+        lines = output.read_text().strip().split("\n")
+        assert [json.loads(line)["index"] for line in lines] == list(range(10))
+        # The lock file does not look like a stats segment.
+        assert (tmp_path / ".stats.jsonl.lock").exists()
+        assert list(tmp_path.glob("stats*")) == [output]
+
+    def test_failed_flush_keeps_bounded_buffer(self, tmp_path: Path) -> None:
+        output = tmp_path / "stats.jsonl"
+        output.mkdir()  # not writable as a file
+        writer = StatsWriter(str(output), max_buffered=3)
+        for i in range(5):
+            writer.write({"index": i})
+            writer.flush()
+        output.rmdir()
+        writer.flush()
+
+        lines = output.read_text().strip().split("\n")
+        assert [json.loads(line)["index"] for line in lines] == [2, 3, 4]
+
+    def test_failed_write_is_not_cut_back(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        output = tmp_path / "stats.jsonl"
+        writer = StatsWriter(str(output))
+        for i in range(3):
+            writer.write({"index": i})
+        real_write = os.write
+        calls = []
+
+        def full_disk(fd: int, data: bytes) -> int:
+            calls.append(len(data))
+            if len(calls) > 1:
+                raise OSError(errno.ENOSPC, "No space left on device")
+            # nginx appends meanwhile, then the disk fills up in line 1.
+            with open(output, "ab") as f:
+                f.write(b'{"index": "nginx"}\n')
+            return real_write(fd, bytes(data[:23]))
+
+        monkeypatch.setattr(os, "write", full_disk)
+        writer.flush()
+        monkeypatch.setattr(os, "write", real_write)
+        writer.flush()
+
+        lines = output.read_text().split("\n")
+        assert lines[2] == '{"index": '  # torn line, ended by the next flush
+        parsed = []
+        for line in lines:
+            try:
+                parsed.append(json.loads(line)["index"])
+            except ValueError:
+                continue
+        assert parsed == ["nginx", 0, 1, 2]
+
 
 class TestStatsEndpoint:
     @pytest.fixture
@@ -0,0 +1,147 @@
+"""Tests for lmgate.statsdb — SQLite stats sink with monthly tables."""
+
+import io
+import json
+import sqlite3
+from datetime import UTC, datetime
+from pathlib import Path
+
+import pytest
+
+from lmgate.query import Query, main, parse_time, run_sql_query
+from lmgate.statsdb import SQLiteStatsSink, connect, month_tables, table_name
+
+
+def _entry(ts: str, **fields: object) -> dict:
+    entry = {
+        "timestamp": ts,
+        "lmgate_id": "1",
+        "provider": "openai",
+        "endpoint": "/v1/chat/completions",
+        "model": "gpt-4",
+        "status": 200,
+        "input_tokens": 10,
+        "output_tokens": 5,
+        "streaming": False,
+    }
+    entry.update(fields)
+    return entry
+
+
+def _sink(path: Path, **kwargs: int) -> SQLiteStatsSink:
+    sink = SQLiteStatsSink(path, flush_interval=60, **kwargs)
+    sink.start()
+    return sink
+
+
+def _fill(sink: SQLiteStatsSink, *entries: dict) -> None:
+    for entry in entries:
+        assert sink.submit(entry)
+    sink.close()
+
+
+class TestSQLiteStatsSink:
+    def test_table_name(self) -> None:
+        assert table_name(parse_time("2026-03-31T23:59:59Z")) == "stats_202603"
+
+    def test_flush_partitions_by_month(self, tmp_path: Path) -> None:
+        db = tmp_path / "stats.db"
+        _fill(
+            _sink(db),
+            _entry("2026-02-28T23:59:59.000Z"),
+            _entry("2026-03-01T00:00:00.000Z", lmgate_id="2"),
+            _entry("2026-03-02T00:00:00.000Z", streaming=True),
+        )
+
+        conn = connect(db)
+        assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        assert month_tables(conn) == ["stats_202602", "stats_202603"]
+        assert conn.execute("SELECT COUNT(*) FROM stats_202603").fetchone() == (2,)
+        rows = conn.execute(
+            "SELECT lmgate_id, streaming FROM stats ORDER BY ts"
+        ).fetchall()
+        assert rows == [("1", 0), ("2", 0), ("1", 1)]
+        indexes = {
+            name
+            for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+        }
+        assert {"stats_202603_ts", "stats_202603_id_ts"} <= indexes
+
+    def test_batches_until_close(self, tmp_path: Path) -> None:
+        db = tmp_path / "stats.db"
+        sink = _sink(db, batch_size=30)
+        _fill(sink, *(_entry(f"2026-03-01T00:00:{i % 60:02d}Z") for i in range(100)))
+        count = connect(db).execute("SELECT COUNT(*) FROM stats").fetchone()
+        assert count == (100,)
+
+    def test_locked_database_raises(self, tmp_path: Path) -> None:
+        db = tmp_path / "stats.db"
+        sink = SQLiteStatsSink(db)
+        sink.open()
+        blocker = sqlite3.connect(db)
+        blocker.execute("BEGIN EXCLUSIVE")
+        sink._conn.execute("PRAGMA busy_timeout = 0")  # type: ignore[union-attr]
+        with pytest.raises(sqlite3.OperationalError):
+            sink.send([_entry("2026-03-01T00:00:00Z")])
+        blocker.rollback()
+        sink.send([_entry("2026-03-01T00:00:00Z")])
+        sink.shutdown()
+        count = connect(db).execute("SELECT COUNT(*) FROM stats").fetchone()
+        assert count == (1,)
+
+    def test_adds_new_columns_to_old_tables(self, tmp_path: Path) -> None:
+        db = tmp_path / "stats.db"
+        conn = connect(db)
+        conn.execute("CREATE TABLE stats_202602 (ts REAL, timestamp TEXT)")
+        conn.execute("INSERT INTO stats_202602 VALUES (1, 'old')")
+        conn.commit()
+        _fill(_sink(db), _entry("2026-03-01T00:00:00Z", cache_status="HIT"))
+
+        rows = conn.execute(
+            "SELECT timestamp, cache_status FROM stats ORDER BY ts"
+        ).fetchall()
+        assert rows == [("old", None), ("2026-03-01T00:00:00Z", "HIT")]
+
+    def test_retention_drops_old_months(self, tmp_path: Path) -> None:
+        db = tmp_path / "stats.db"
+        now = datetime.now(UTC).isoformat()
+        _fill(
+            _sink(db, retention_months=2), _entry("2020-01-15T00:00:00Z"), _entry(now)
+        )
+        conn = connect(db)
+        assert month_tables(conn) == [table_name(parse_time(now))]
+        assert conn.execute("SELECT COUNT(*) FROM stats").fetchone() == (1,)
+
+
+class TestSQLQuery:
+    def test_matches_file_query(self, tmp_path: Path) -> None:
+        entries = [
+            _entry("2026-02-28T10:00:00.000Z"),
+            _entry("2026-03-01T10:00:00.000Z", status=500, output_tokens=None),
+            _entry("2026-03-01T11:00:00.000Z", lmgate_id="2", model="gpt-4o"),
+            _entry("2026-04-01T00:00:00.000Z"),
+        ]
+        db = tmp_path / "stats.db"
+        _fill(_sink(db), *entries)
+        stats = tmp_path / "stats.jsonl"
+        stats.write_text("".join(json.dumps(e) + "\n" for e in entries))
+
+        argv = ["--since", "2026-03-01", "--until", "2026-04-01"]
+        argv += ["--group-by", "day,lmgate_id", "--format", "json", "--jobs", "1"]
+        from_db, from_file = io.StringIO(), io.StringIO()
+        assert main(["--db", str(db), *argv], out=from_db) == 0
+        assert main([str(stats), *argv], out=from_file) == 0
+        assert json.loads(from_db.getvalue()) == json.loads(from_file.getvalue())
+        assert len(json.loads(from_db.getvalue())) == 2
+
+    def test_filters(self, tmp_path: Path) -> None:
+        db = tmp_path / "stats.db"
+        _fill(
+            _sink(db),
+            _entry("2026-03-01T10:00:00Z"),
+            _entry("2026-03-01T10:00:00Z", lmgate_id="2", provider="google"),
+        )
+        query = Query(lmgate_ids=frozenset({"2"}), group_by=("provider",))
+        assert run_sql_query(db, query) == {("google",): [1, 10, 5, 0]}
@@ -0,0 +1,93 @@
+"""Tests for lmgate.tail — live stats feed with filters and resume."""
+
+import json
+
+from lmgate.tail import StatsFeed, Subscriber
+
+
+def _entry(**fields: object) -> dict:
+    entry = {"lmgate_id": "1", "provider": "openai", "input_tokens": 10}
+    entry.update(fields)
+    return entry
+
+
+def _lines(subscriber: Subscriber) -> list[dict]:
+    lines = [*subscriber.backlog, *subscriber.pending]
+    return [json.loads(line) for line in lines]
+
+
+class TestStatsFeed:
+    def test_filters(self) -> None:
+        feed = StatsFeed(start=0)
+        by_id = Subscriber(lmgate_ids=["2"])
+        by_provider = Subscriber(providers=["anthropic", "google"])
+        everything = Subscriber()
+        for s in (by_id, by_provider, everything):
+            feed.subscribe(s)
+        feed.publish(_entry())
+        feed.publish(_entry(lmgate_id="2"))
+        feed.publish(_entry(provider="google"))
+        assert [e["offset"] for e in _lines(by_id)] == [2]
+        assert [e["offset"] for e in _lines(by_provider)] == [3]
+        assert [e["offset"] for e in _lines(everything)] == [1, 2, 3]
+        assert _lines(everything)[0] == {"offset": 1, **_entry()}
+
+    def test_resume_from_history(self) -> None:
+        feed = StatsFeed(history_size=10, start=0)
+        for i in range(5):
+            feed.publish(_entry(n=i))
+        subscriber = Subscriber()
+        feed.subscribe(subscriber, after=3)
+        feed.publish(_entry(n=5))
+        assert [e["offset"] for e in _lines(subscriber)] == [4, 5, 6]
+
+    def test_resume_reports_gap(self) -> None:
+        feed = StatsFeed(history_size=3, start=0)
+        for i in range(6):
+            feed.publish(_entry(n=i))
+        subscriber = Subscriber()
+        feed.subscribe(subscriber, after=1)
+        lines = _lines(subscriber)
+        assert lines[0] == {"gap": {"after": 1, "next": 4}}
+        assert [e["offset"] for e in lines[1:]] == [4, 5, 6]
+
+        # An offset this process never handed out.
+        ahead = Subscriber()
+        feed.subscribe(ahead, after=100)
+        assert _lines(ahead) == [{"gap": {"after": 100, "next": 4}}]
+
+    def test_resume_after_restart_reports_gap(self) -> None:
+        before = StatsFeed()
+        for i in range(5):
+            before.publish(_entry(n=i))
+        seen = before.last_offset - 2
+        after_restart = StatsFeed()
+        for i in range(5):
+            after_restart.publish(_entry(n=i))
+        subscriber = Subscriber()
+        after_restart.subscribe(subscriber, after=seen)
+        lines = _lines(subscriber)
+        oldest = after_restart.last_offset - 4
+        assert oldest > before.last_offset
+        assert lines[0] == {"gap": {"after": seen, "next": oldest}}
+        assert [e["n"] for e in lines[1:]] == [0, 1, 2, 3, 4]
+
+    def test_slow_subscriber_overflows(self) -> None:
+        feed = StatsFeed(start=0)
+        slow = Subscriber(max_pending=2)
+        feed.subscribe(slow)
+        for _ in range(3):
+            feed.publish(_entry())
+        assert slow.overflowed and not slow.pending
+        feed.unsubscribe(slow)
+        assert feed.subscriber_count == 0
+
+    def test_replay_does_not_count_against_buffer(self) -> None:
+        feed = StatsFeed(start=0)
+        for _ in range(3):
+            feed.publish(_entry())
+        replay = Subscriber(max_pending=2)
+        feed.subscribe(replay, after=0)
+        feed.publish(_entry())
+        assert not replay.overflowed
+        assert [e["offset"] for e in _lines(replay)] == [1, 2, 3, 4]
@@ -0,0 +1,176 @@
+"""Tests for lmgate.workers — per-worker config, allow-list snapshots, restarts."""
+
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from lmgate.allowlist import AllowList, SnapshotAllowList
+from lmgate.config import apply_defaults
+from lmgate.server import create_app
+from lmgate.workers import (
+    Supervisor,
+    _respawn_delay,
+    _worker_config,
+    run_workers,
+    worker_path,
+)
+
+
+class TestWorkerPaths:
+    def test_worker_path(self) -> None:
+        assert worker_path("/data/stats.jsonl", 3) == Path("/data/stats.w3.jsonl")
+
+    def test_worker_config_splits_files(self) -> None:
+        config = apply_defaults({"stats": {"output_path": "/data/stats.jsonl"}})
+        worker = _worker_config(config, 1)
+        # All workers share the stats file nginx writes.
+        assert worker["stats"]["output_path"] == "/data/stats.jsonl"
+        assert worker["budgets"]["checkpoint_path"] == "/data/budgets.w1.json"
+        config["budgets"]["checkpoint_path"] = "/data/usage.json"
+        worker = _worker_config(config, 1)
+        assert worker["budgets"]["checkpoint_path"] == "/data/usage.w1.json"
+        # Original config is untouched
+        assert config["budgets"]["checkpoint_path"] == "/data/usage.json"
+
+    def test_rollups_and_sinks_in_first_worker_only(self) -> None:
+        config = apply_defaults(
+            {"rollups": {"enabled": True}, "stats": {"sinks": [{"type": "sqlite"}]}}
+        )
+        first = _worker_config(config, 0)
+        assert first["rollups"]["enabled"] and first["stats"]["sinks"]
+        other = _worker_config(config, 2)
+        assert not other["rollups"]["enabled"] and not other["stats"]["sinks"]
+
+    def test_in_flight_limit_rejected(self, tmp_path: Path) -> None:
+        config = {
+            "server": {"workers": 2},
+            "auth": {"allowlist_path": str(tmp_path / "allowlist.csv")},
+            "limits": {"max_in_flight_per_key": 4},
+        }
+        with pytest.raises(ValueError, match="max_in_flight_per_key"):
+            run_workers(apply_defaults(config))
+        with pytest.raises(ValueError, match="max_in_flight_per_key"):
+            create_app(config)
+
+
+class TestSharedStatsFile:
+    async def test_every_worker_sees_every_record(
+        self, aiohttp_client, tmp_path: Path
+    ) -> None:
+        allowlist = tmp_path / "allowlist.csv"
+        allowlist.write_text(
+            "id,api_key,owner,added,daily_token_budget\n1,sk-key,team,2025-01-01,50\n"
+        )
+        stats = tmp_path / "stats.jsonl"
+        config = apply_defaults(
+            {
+                "server": {"workers": 2},
+                "auth": {"allowlist_path": str(allowlist)},
+                "stats": {"output_path": str(stats), "follow_interval_seconds": 0.01},
+                "rollups": {"enabled": True},
+            }
+        )
+        apps = [create_app(_worker_config(config, i)) for i in range(2)]
+        clients = [await aiohttp_client(app) for app in apps]
+        assert "rollup" in apps[0] and "rollup" not in apps[1]
+
+        # Admitted by one worker, recorded by nginx in the shared file.
+        with open(stats, "a") as f:
+            f.write(json.dumps({"lmgate_id": "1", "input_tokens": 60}) + "\n")
+        await asyncio.sleep(0.1)
+        for client in clients:
+            resp = await client.get("/auth", headers={"x-api-key": "sk-key"})
+            assert resp.headers["X-LMGate-Reason"] == "token_budget_exhausted"
+
+
+class TestAllowListSnapshot:
+    def test_snapshot_roundtrip(self, tmp_path: Path) -> None:
+        csv_path = tmp_path / "allowlist.csv"
+        csv_path.write_text(
+            "id,api_key,owner,added,daily_token_budget\n"
+            "1,sk-abc,team-alpha,2025-01-15,500\n"
+        )
+        source = AllowList(csv_path)
+        source.load()
+        snapshot = tmp_path / "allowlist.snapshot"
+        source.save_snapshot(snapshot)
+
+        worker = SnapshotAllowList(snapshot)
+        worker.load()
+        entry = worker.get("sk-abc")
+        assert entry is not None
+        assert entry == source.get("sk-abc")
+        assert entry.daily_token_budget == 500
+        assert len(worker) == 1
+
+    def test_snapshot_reload_on_publish(self, tmp_path: Path) -> None:
+        csv_path = tmp_path / "allowlist.csv"
+        csv_path.write_text("id,api_key,owner,added\n1,sk-old,team,2025-01-01\n")
+        source = AllowList(csv_path)
+        source.load()
+        snapshot = tmp_path / "allowlist.snapshot"
+        source.save_snapshot(snapshot)
+        worker = SnapshotAllowList(snapshot)
+        worker.load()
+
+        time.sleep(0.05)
+        csv_path.write_text("id,api_key,owner,added\n2,sk-new,team,2025-01-01\n")
+        assert source.reload_if_changed()
+        source.save_snapshot(snapshot)
+
+        assert worker.reload_if_changed()
+        assert worker.get("sk-new") is not None
+        assert worker.get("sk-old") is None
+
+
+class _ExitedProcess:
+    exitcode = 1
+
+    def is_alive(self) -> bool:
+        return False
+
+
+class TestRespawn:
+    def test_respawn_delay(self) -> None:
+        assert [_respawn_delay(n) for n in range(4)] == [0, 1, 2, 4]
+        assert _respawn_delay(20) == 60
+
+    def test_fast_exits_back_off(self, tmp_path: Path, monkeypatch) -> None:
+        now = [1000.0]
+        monkeypatch.setattr("lmgate.workers.time.monotonic", lambda: now[0])
+        config = apply_defaults({"auth": {"allowlist_path": str(tmp_path / "a")}})
+        supervisor = Supervisor(config)
+        spawned: list[int] = []
+
+        def spawn(index: int) -> None:
+            spawned.append(index)
+            supervisor._workers[index] = _ExitedProcess()  # type: ignore[assignment]
+            supervisor._started[index] = now[0]
+
+        monkeypatch.setattr(supervisor, "_spawn", spawn)
+        spawn(0)
+        supervisor._respawn_exited()
+        # Exited right after starting: restarted after 1 s, then 2 s.
+        assert spawned == [0]
+        now[0] += 1
+        supervisor._respawn_exited()
+        assert spawned == [0, 0]
+        supervisor._respawn_exited()
+        now[0] += 1
+        supervisor._respawn_exited()
+        assert spawned == [0, 0]
+        now[0] += 1
+        supervisor._respawn_exited()
+        assert spawned == [0, 0, 0]
+
+        # A worker that ran for a while is restarted at once.
+        now[0] += 30
+        supervisor._respawn_exited()
+        assert spawned == [0, 0, 0, 0]
+        os.close(supervisor._wakeup_r)
+        os.close(supervisor._wakeup_w)
+        supervisor._runtime_dir.rmdir()